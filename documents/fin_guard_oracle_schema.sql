@@ -473,6 +473,10 @@ CREATE SEQUENCE fg_alerts_seq
   
  ALTER TABLE fg_transactions 
 ADD (DEVICE_ID VARCHAR2(50));
+
+-- Amended decisions (async LLM lane): revision > 0 rows supersede the decision_id (as published) in revision_of
+ALTER TABLE fg_decisions
+ADD (REVISION NUMBER DEFAULT 0, REVISION_OF VARCHAR2(64));
  
 
 -- =====================================================================
@@ -483,6 +487,7 @@ ADD (DEVICE_ID VARCHAR2(50));
 -- CREATE INDEX idx_fg_notif_alert ON fg_notifications(alert_id);
 -- CREATE INDEX idx_fg_rule_hits_txn ON fg_rule_hits(txn_id);
 -- CREATE INDEX idx_fg_feedback_txn ON fg_feedback(txn_id);
+-- CREATE INDEX idx_fg_txn_event_ts ON fg_transactions(event_ts, event_id);  -- dashboard keyset paging
 
 -- =====================================================================
 -- Housekeeping jobs (pseudo – create DBMS_SCHEDULER jobs in ops scripts)
@@ -5,6 +5,9 @@ from ..utils.schemas import DecisionOutcome, Alert
 from ..utils.kafka_bus import KafkaBus
 from ..config import settings as config
 from ..utils import dao
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
 
 def to_alerts(decision: DecisionOutcome) -> List[Alert]:
     alerts = []
@@ -15,20 +18,38 @@ def to_alerts(decision: DecisionOutcome) -> List[Alert]:
             severity=sev,
             title=f"Decision: {decision.action} (risk={decision.risk_score})",
             description="; ".join(decision.reasons),
-            risk_score=decision.risk_score
+            risk_score=decision.risk_score,
+            channel=decision.channel,
          ))
     return alerts
 
-def dispatch(decision: DecisionOutcome, bus: KafkaBus):
+def publish_outcome(decision: DecisionOutcome, alerts: List[Alert], bus: KafkaBus) -> list:
+    # Not awaited here: the caller flushes at its boundary and may check the returned send futures
+    futures = [bus.publish(config.DECISIONS_TOPIC, value=decision.dict(), key=decision.event_id)]
+    for alert in alerts:
+        futures.append(bus.publish(config.ALERTS_TOPIC, value=alert.dict(), key=alert.event_id))
+    return futures
+
+def dispatch(decision: DecisionOutcome, bus: KafkaBus) -> List[Alert]:
     # Persist decision
     dao.insert_decision(decision)
-    # Publish decisions
-    # bus.publish(config.DECISIONS_TOPIC, value=decision.dict(), key=decision.event_id)
-    # Alerts: persist and publish
+    dao.insert_rule_hits(decision)
+    # Alerts: persist
+    alerts = to_alerts(decision)
+    if alerts:
+        dao.insert_alerts(alerts)
+    # Publish decision and alerts
+    publish_outcome(decision, alerts, bus)
+    log.debug("dispatched", extra={"event_id": decision.event_id, "action": decision.action,
+                                   "risk_score": decision.risk_score, "alerts": len(alerts)})
+    return alerts
+
+def dispatch_revision(decision: DecisionOutcome, bus: KafkaBus):
+    """Persist and publish an amended decision (revision_of links it to the original)."""
+    dao.insert_decision_revision(decision)
     alerts = to_alerts(decision)
     if alerts:
         dao.insert_alerts(alerts)
-    print(f"dispatch: decision {decision.event_id} action={decision.action} risk={decision.risk_score} alerts={len(alerts)}")    
-"""        for alert in alerts:
-            bus.publish(config.ALERTS_TOPIC, value=alert.dict(), key=alert.alert_id)
-"""
\ No newline at end of file
+    publish_outcome(decision, alerts, bus)
+    log.info("dispatched revision", extra={"event_id": decision.event_id, "revision": decision.revision,
+                                           "action": decision.action, "revision_of": decision.revision_of})
@@ -1,41 +1,395 @@
 import json
+import threading
+import time
 from datetime import datetime
-from .utils.kafka_bus import KafkaBus
-from .memory.oracle_store import OracleMemoryStore as MemoryStore
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+from .utils.kafka_bus import KafkaBus, _route
+from .utils.retry import RetryRouter, RetryScheduler
+from .utils.workers import KeyedWorkerPool
+from .utils.persistence import PersistenceWriter, WriteUnit
+from .utils import dao, db
+from .memory.oracle_store import OracleMemoryStore as MemoryStore, BatchMemoryStore
+from .memory.velocity import VELOCITY_SCOPES, VelocityStore
+from .memory.device_cache import KnownDeviceCache
+from .memory.blacklist import BlacklistSnapshot
+from .memory.context import LookupContext
 from .perception.features import perceive
 from .decision.rules import decide
+from .decision.llm_lane import review_later, drain_llm_lane
+from .tools.ml_model_tool import score_batch
+from .tools.model_runtime import model_features
 from .utils.schemas import TransactionEvent
 from .config import settings as config
+from .utils import metrics
+from .utils.metrics import span
+from .utils.log import get_logger
 
-def handle_event(payload: dict, memory: MemoryStore, bus: KafkaBus):
-    print("handle_event: payload", payload.get("event_id") or "no-id");
-    evt = TransactionEvent(**payload)
-    print("handle_event: evt", evt.event_id);
-    # Perception (needs a view of past data)
-    p = perceive(evt, memory)
-    print("handle_event: evt after perceive :", evt.event_id);
+log = get_logger(__name__)
+
+def _e2e_ms(payloads: List[dict]) -> List[float]:
+    """Send-to-decision latency of events that carry extra.sent_at (load generator traffic); also fed to finguard_e2e_seconds."""
+    now = time.time()
+    out = []
+    for payload in payloads:
+        sent = (payload.get("extra") or {}).get("sent_at")
+        if isinstance(sent, (int, float)):
+            out.append((now - sent) * 1000.0)
+            metrics.E2E_SECONDS.observe(now - sent)
+    return out
+
+def _count_outcome(outcome, alerts):
+    metrics.EVENTS.inc("decided")
+    metrics.DECISIONS.inc(outcome.action)
+    for a in alerts:
+        metrics.ALERTS.inc(a.severity)
 
+def handle_event(payload: dict, memory: MemoryStore, bus: KafkaBus, writer: Optional[PersistenceWriter] = None) -> Optional[Future]:
+    try:
+        return _handle_event(payload, memory, bus, writer)
+    except Exception:
+        metrics.EVENTS.inc("failed")
+        raise
+
+def _handle_event(payload: dict, memory: MemoryStore, bus: KafkaBus, writer: Optional[PersistenceWriter]) -> Optional[Future]:
+    with span("parse"):
+        evt = TransactionEvent(**payload)
+    if writer is not None:
+        return _handle_write_behind(evt, memory, bus, writer)
+    # one memo of lookups shared by perceive, decide and the tools for this event
+    memory = LookupContext.for_event(evt, memory)
+    # Perception (needs a view of past data)
+    with span("perceive"):
+        p = perceive(evt, memory)
     # Update memory (persist in Oracle)
-    print ("handle_event: adding to memory :", evt.event_id);
-    memory.add_event(evt)
-    print ("handle_event: added to memory :", evt.event_id);
+    with span("add_event"):
+        memory.add_event(evt)
     # Decision
-    print ("handle_event: deciding :", evt.event_id);
-    outcome = decide(p, memory)
-    print ("handle_event: decided :", evt.event_id, " outcome:", outcome.action if outcome else "no outcome");
+    with span("decide"):
+        outcome = decide(p, memory)
     # Action → persist + Kafka
     from .action.dispatcher import dispatch
-    print ("handle_event: dispatching outcome :", evt.event_id);
-    dispatch(outcome, bus)
-    print ("handle_event: dispatched outcome :", evt.event_id);
+    with span("dispatch"):
+        alerts = dispatch(outcome, bus)
+    review_later(p, outcome)
+    _count_outcome(outcome, alerts)
+    _e2e_ms([payload])
+    log.debug("event handled", extra={"event_id": evt.event_id, "action": outcome.action,
+                                      "risk_score": outcome.risk_score, "lookups": memory.stats()})
+
+def _handle_write_behind(evt: TransactionEvent, memory: MemoryStore, bus: KafkaBus, writer: PersistenceWriter) -> Future:
+    """
+    handle_event with every write for the event handed to `writer` as one
+    unit. Returns the unit's Future; the decision and alerts are published
+    once it is durable.
+    """
+    from .action.dispatcher import to_alerts, publish_outcome
+    overlay = BatchMemoryStore(memory)
+    ctx = LookupContext.for_event(evt, overlay)
+    with span("perceive"):
+        p = perceive(evt, ctx)
+    ctx.add_event(evt)
+    with span("decide"):
+        outcome = decide(p, ctx)
+    alerts = to_alerts(outcome)
+    fut = writer.submit(WriteUnit(events=overlay.pending, devices=overlay.pending_devices,
+                                  decisions=[outcome], alerts=alerts))
+
+    def _published(f: Future):
+        if f.exception() is None:
+            publish_outcome(outcome, alerts, bus)
+            review_later(p, outcome)
+            _count_outcome(outcome, alerts)
+        else:
+            metrics.EVENTS.inc("failed")
+    fut.add_done_callback(_published)
+    return fut
+
+def handle_batch(payloads: List[dict], memory: MemoryStore, bus: KafkaBus,
+                 offsets: Optional[List[tuple]] = None,
+                 on_failed: Optional[Callable[[dict, Exception, Optional[dict]], Any]] = None):
+    """
+    Run perceive/decide over a micro-batch, optionally model-score it in one
+    vectorized call, persist every transaction, device sighting, decision,
+    alert and model score in one Oracle transaction, then
+    publish decisions and alerts and flush once. Decisions that were
+    committed but not delivered are logged by event id (they are in
+    FG_DECISIONS) rather than raised, which would re-deliver the batch.
+    Malformed or failing events are skipped; a failed commit raises so the
+    batch is re-delivered.
+    With `offsets` (exactly-once, see KafkaBus.consume_transactional) the
+    partition offsets are committed in the same transaction, and decisions
+    are published before it so a crash in between re-publishes them
+    (consumers dedupe on event_id) rather than losing them.
+    Events that failed are handed to `on_failed(payload, exc, source)` (e.g.
+    RetryRouter.fail) before anything is committed, and each send is
+    awaited; if one cannot be routed the batch raises and is re-delivered,
+    since committing its offsets would lose that event. A re-delivered batch
+    may route an event twice, which the idempotent transaction insert absorbs.
+    """
+    from .action.dispatcher import to_alerts, publish_outcome
+    overlay = BatchMemoryStore(memory)
+    decisions = []
+    alerts = []
+    model_inputs = []
+    reviews = []
+    seen = set()
+    failed = []
+    for payload in payloads:
+        try:
+            with span("parse"):
+                evt = TransactionEvent(**payload)
+            if evt.event_id in seen:
+                # producer retry inside the same batch; the first copy wins
+                metrics.EVENTS.inc("skipped")
+                continue
+            seen.add(evt.event_id)
+            ctx = LookupContext.for_event(evt, overlay)
+            with span("perceive"):
+                p = perceive(evt, ctx)
+            with span("decide"):
+                outcome = decide(p, ctx)
+        except Exception as e:
+            metrics.EVENTS.inc("failed")
+            log.warning("skipping event", extra={"event_id": payload.get("event_id"), "error": str(e)})
+            failed.append((payload, e))
+            continue
+        overlay.add_event(evt)
+        decisions.append(outcome)
+        reviews.append((p, outcome))
+        alerts.extend(to_alerts(outcome))
+        model_inputs.append((evt.event_id, model_features(p.features, evt.extra)))
+    scores = []
+    if config.BATCH_MODEL_SCORING and model_inputs:
+        # one vectorized call for the batch; rows are written in the batch transaction
+        with span("model_score"):
+            res = score_batch(model_inputs, persist=False)
+        scores = res["rows"]
+        by_txn = {r[0]: r[2] for r in scores}
+        for outcome in decisions:
+            outcome.model_score = by_txn.get(outcome.event_id)
+    by_event: dict = {}
+    for a in alerts:
+        by_event.setdefault(a.event_id, []).append(a)
+
+    def _persist():
+        with span("persist"):
+            dao.persist_batch(overlay.pending, decisions, alerts, devices=overlay.pending_devices, scores=scores,
+                              offsets=offsets)
+
+    def _route_failed():
+        if on_failed is None:
+            return
+        unrouted = [payload.get("event_id") for payload, e in failed if not _route(on_failed, payload, e, None)]
+        if unrouted:
+            # nothing is committed yet, so the batch is re-delivered and routed again
+            raise RuntimeError(f"{len(unrouted)} failed events not routed to a retry tier; batch not committed")
+
+    def _publish() -> List[str]:
+        # returns the event ids whose decision or alerts were not delivered; never raises
+        sent = []
+        undelivered = set()
+        with span("publish"):
+            for outcome in decisions:
+                try:
+                    sent.extend((outcome.event_id, f) for f in
+                                publish_outcome(outcome, by_event.get(outcome.event_id, []), bus))
+                except Exception as e:
+                    log.warning("publish failed", extra={"event_id": outcome.event_id, "error": str(e)})
+                    undelivered.add(outcome.event_id)
+            # batch boundary: deliver before the caller commits offsets
+            bus.flush()
+        for event_id, fut in sent:
+            try:
+                fut.get(timeout=config.KAFKA_PUBLISH_TIMEOUT_SEC)
+            except Exception:
+                undelivered.add(event_id)
+        return sorted(undelivered)
+
+    _route_failed()
+    if offsets is None:
+        _persist()
+        # committed: re-delivering the batch for a delivery error would decide and publish it twice
+        undelivered = _publish()
+    else:
+        undelivered = _publish()
+        if undelivered:
+            # nothing is committed yet, so the batch is re-delivered and re-published
+            raise RuntimeError(f"{len(undelivered)} decisions not delivered; batch not committed")
+        _persist()
+    if undelivered:
+        log.error("decisions committed but not delivered", extra={"count": len(undelivered),
+                                                                  "event_ids": undelivered[:50]})
+    for p, outcome in reviews:
+        review_later(p, outcome)
+        _count_outcome(outcome, by_event.get(outcome.event_id, []))
+    e2e = sorted(_e2e_ms(payloads))
+    log.debug("batch handled", extra={"received": len(payloads), "decided": len(decisions), "alerts": len(alerts),
+                                      "scored": len(scores), "e2e_p50_ms": round(e2e[len(e2e) // 2], 1) if e2e else None,
+                                      "e2e_max_ms": round(e2e[-1], 1) if e2e else None})
+
+# Per-worker state for parallel mode. Each worker process builds its own
+# memory store and Kafka producer; thread lanes share one set.
+_worker_memory = None
+_worker_bus = None
+_worker_writer = None
+_worker_lock = threading.Lock()
+
+def _build_memory(bus: KafkaBus, writer: Optional[PersistenceWriter] = None,
+                  velocity_scopes: Optional[Tuple[str, ...]] = None, checkpoint: bool = True) -> MemoryStore:
+    """
+    Warm memory caches for one consumer (or /decide). `velocity_scopes`
+    limits the velocity windows to scopes this process sees in full;
+    `checkpoint=False` keeps a store that does not own its windows from
+    overwriting fg_velocity_counters.
+    """
+    velocity = None
+    if config.VELOCITY_STORE_ENABLED:
+        velocity = VelocityStore({s: VELOCITY_SCOPES[s] for s in velocity_scopes} if velocity_scopes else None)
+        velocity.warm()
+        if checkpoint:
+            velocity.start_checkpointing(config.VELOCITY_CHECKPOINT_SEC)
+    devices = None
+    if config.DEVICE_CACHE_ENABLED:
+        devices = KnownDeviceCache(config.DEVICE_CACHE_MAX_ENTRIES, config.DEVICE_WINDOW_DAYS,
+                                   config.DEVICE_TOUCH_INTERVAL_SEC, writer=writer,
+                                   complete_ttl_sec=config.DEVICE_CACHE_COMPLETE_TTL_SEC)
+        devices.warm()
+    blacklist = None
+    if config.BLACKLIST_SNAPSHOT_ENABLED:
+        blacklist = BlacklistSnapshot(config.BLACKLIST_REFRESH_SEC, config.BLACKLIST_FULL_REFRESH_SEC)
+        blacklist.load()
+        blacklist.start_refreshing()
+        bus.follow([config.BLACKLIST_TOPIC], lambda topic, msg: blacklist.apply_message(msg),
+                   name="finguard-blacklist-follow")
+    return MemoryStore(velocity=velocity, devices=devices, blacklist=blacklist)
+
+def _init_worker(memory: MemoryStore = None, writer: Optional[PersistenceWriter] = None):
+    global _worker_memory, _worker_bus, _worker_writer
+    with _worker_lock:
+        if _worker_memory is None:
+            _worker_bus = KafkaBus()
+            _worker_writer = writer
+            if memory is None:
+                # process lane: a pool for one lane, not the parent's WORKER_COUNT-sized one
+                db.set_role("worker")
+            # a process lane sees all events of its accounts but only a share of every other key
+            _worker_memory = memory or _build_memory(_worker_bus, velocity_scopes=("ACCOUNT",))
+
+def _worker_handle(payload: dict):
+    _init_worker()
+    return handle_event(payload, _worker_memory, _worker_bus, _worker_writer)
+
+def _new_writer() -> PersistenceWriter:
+    return PersistenceWriter(config.WRITER_MAX_RECORDS, config.WRITER_FLUSH_MS, config.WRITER_MAX_QUEUE)
+
+def _durable(task: Future) -> Future:
+    """Resolve once the worker task has run and the write unit it returned is committed."""
+    done: Future = Future()
+
+    def _settle(f: Future):
+        if f.exception() is not None:
+            done.set_exception(f.exception())
+        else:
+            done.set_result(None)
+
+    def _ran(f: Future):
+        if f.exception() is not None or f.result() is None:
+            _settle(f)
+        else:
+            f.result().add_done_callback(_settle)
+    task.add_done_callback(_ran)
+    return done
 
 def run():
-    memory = MemoryStore()
     bus = KafkaBus()
-    print(f"[FinGuard] Consuming from {config.TRANSACTIONS_TOPIC} @ {config.BOOTSTRAP_SERVERS}")
+    try:
+        _run(bus)
+    finally:
+        drain_llm_lane(config.LLM_TIMEOUT_MS / 1000.0 * 2)
+        bus.close()
+
+def _start_retries(bus: KafkaBus, handle: Callable[[dict], Any]):
+    """Start the retry-tier scheduler re-running failed events with `handle`; returns the failure router, if enabled."""
+    if not config.RETRY_ENABLED:
+        return None
+    router = RetryRouter(bus)
+    RetryScheduler(bus, handle, router).start()
+    log.info("retry tiers", extra={"topics": router.topics, "dlq": config.DLQ_TOPIC})
+    return router.fail
+
+def _run(bus: KafkaBus):
+    log.info("consuming", extra={"topic": config.TRANSACTIONS_TOPIC, "bootstrap": config.BOOTSTRAP_SERVERS,
+                                 "mode": config.CONSUMER_MODE})
+    if config.METRICS_PORT:
+        metrics.serve(config.METRICS_PORT)
+        log.info("metrics sidecar listening", extra={"port": config.METRICS_PORT})
+    if not (config.CONSUMER_MODE == "parallel" and config.WORKER_KIND == "process"):
+        # open the pool's min connections before the first poll; process lanes each build a small pool
+        db.warm_pool()
+    if config.CONSUMER_MODE == "parallel":
+        if config.EXACTLY_ONCE:
+            log.warning("FINGUARD_EXACTLY_ONCE applies to single and batch modes only; parallel mode is at-least-once")
+        if config.WORKER_KIND == "thread":
+            # thread lanes share one warmed memory store (and writer); process lanes build their own
+            writer = _new_writer() if config.WRITE_BEHIND_ENABLED else None
+            _init_worker(_build_memory(bus, writer), writer)
+        else:
+            if config.VELOCITY_STORE_ENABLED:
+                log.warning("process workers keep ACCOUNT velocity windows only; DEVICE, IP, MERCHANT, CUSTOMER "
+                            "and CARD windows need thread workers")
+            if config.WRITE_BEHIND_ENABLED:
+                log.warning("FINGUARD_WRITE_BEHIND applies to thread workers only; process workers write directly")
+            if config.METRICS_PORT and not metrics.MULTIPROCESS:
+                log.warning("process workers' metrics are missing from the sidecar; set PROMETHEUS_MULTIPROC_DIR "
+                            "to aggregate them")
+        pool = KeyedWorkerPool(config.WORKER_COUNT, kind=config.WORKER_KIND, initializer=_init_worker)
+        log.info("parallel mode", extra={"workers": config.WORKER_COUNT, "worker_kind": config.WORKER_KIND})
+        # retries go through the same account lanes as live events
+        on_error = _start_retries(bus, lambda msg: _durable(pool.submit(msg.get("account_id"), _worker_handle, msg)))
+        try:
+            bus.consume_parallel(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP,
+                                 submit=lambda key, msg: _durable(pool.submit(key, _worker_handle, msg)),
+                                 max_inflight=config.WORKER_MAX_INFLIGHT,
+                                 commit_interval_ms=config.WORKER_COMMIT_INTERVAL_MS, on_error=on_error)
+        finally:
+            pool.shutdown()
+        return
+    if config.EXACTLY_ONCE:
+        memory = _build_memory(bus)
+        on_failed = _start_retries(bus, lambda msg: handle_event(msg, memory, bus))
+        def _txn_handler(msgs: List[dict], offsets: List[tuple]):
+            handle_batch(msgs, memory, bus, offsets=offsets, on_failed=on_failed)
+        log.info("exactly-once mode", extra={"offsets_table": config.TBL_STREAM_OFFSETS})
+        bus.consume_transactional(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP, handler=_txn_handler,
+                                  load_offsets=dao.load_stream_offsets, max_records=config.BATCH_MAX_RECORDS,
+                                  max_wait_ms=config.BATCH_MAX_WAIT_MS)
+        return
+    writer = _new_writer() if config.WRITE_BEHIND_ENABLED and config.CONSUMER_MODE != "batch" else None
+    memory = _build_memory(bus, writer)
+    on_error = _start_retries(bus, lambda msg: handle_event(msg, memory, bus, writer))
+    if writer is not None:
+        # poll and decide on this thread; offsets advance as write units commit
+        def _submit(key: Optional[str], msg: dict) -> Future:
+            try:
+                return handle_event(msg, memory, bus, writer)
+            except Exception as e:
+                failed: Future = Future()
+                failed.set_exception(e)
+                return failed
+        bus.consume_parallel(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP, submit=_submit,
+                             max_inflight=config.WORKER_MAX_INFLIGHT,
+                             commit_interval_ms=config.WORKER_COMMIT_INTERVAL_MS, on_error=on_error)
+        return
+    if config.CONSUMER_MODE == "batch":
+        def _batch_handler(msgs: List[dict]):
+            handle_batch(msgs, memory, bus, on_failed=on_error)
+        bus.consume_batches(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP, handler=_batch_handler,
+                            max_records=config.BATCH_MAX_RECORDS, max_wait_ms=config.BATCH_MAX_WAIT_MS)
+        return
     def _handler(msg: dict):
         handle_event(msg, memory, bus)
-    bus.consume(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP, handler=_handler)
+    bus.consume(config.TRANSACTIONS_TOPIC, group_id=config.CONSUMER_GROUP, handler=_handler, on_error=on_error)
 
 if __name__ == "__main__":
     run()
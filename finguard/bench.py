@@ -0,0 +1,259 @@
+"""
+Per-stage and end-to-end benchmark of the decision pipeline without Oracle or Kafka.
+
+    python -m finguard.bench --events 5000 --out bench.json
+    python -m finguard.bench --payloads recorded.jsonl --llm stub --llm-latency-ms 20 --history bench-history.jsonl
+
+The `dao` functions are swapped for a dict-backed MemoryDAO and the bus is a
+LocalBus, so the memory stores, rule engine, LLM path, dispatcher and
+persistence calls run unchanged in one process. Payloads are read from a
+JSONL file of recorded events (one event dict per line, or a Kafka record
+with the event under "value"; other lines are skipped) or generated with the
+load generator's TrafficGenerator.
+
+The stage pass times parse (pydantic), perceive, add_event, score_rules,
+llm_adjustment, plan_workflow, decide and dispatch for every event; decide
+reuses the memoized rule score, so it measures the LLM fold and outcome
+build. The end-to-end pass measures handle_event and handle_batch on fresh
+state. Results are one JSON document (commit, config, per-stage
+percentiles in microseconds, events/sec); `--history` appends it as one line
+so runs can be compared per commit. Logging is raised to WARNING while
+timing unless --verbose.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import settings as config
+
+STAGES = ("parse", "perceive", "add_event", "score_rules", "llm_adjustment", "plan_workflow", "decide", "dispatch")
+
+def load_payloads(path: str, limit: Optional[int] = None) -> Tuple[List[dict], int]:
+    """Event payloads from a JSONL file, and the number of lines skipped."""
+    out: List[dict] = []
+    skipped = 0
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if isinstance(rec, dict) and isinstance(rec.get("value"), dict):
+                rec = rec["value"]
+            if not isinstance(rec, dict) or not all(k in rec for k in ("event_id", "account_id", "amount")):
+                skipped += 1
+                continue
+            out.append(rec)
+            if limit and len(out) >= limit:
+                break
+    return out, skipped
+
+def generate_payloads(n: int, seed: int = 42, fraud_rate: float = 0.05, accounts: int = 2_000) -> List[dict]:
+    from .producers.load_generator import TrafficGenerator
+    gen = TrafficGenerator(accounts=accounts, fraud_rate=fraud_rate, seed=seed, prefix="bench")
+    out: List[dict] = []
+    while len(out) < n:
+        out.extend(gen.next_events())
+    return out[:n]
+
+def _pct(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+def summarize(samples_ns: List[int]) -> Dict[str, Any]:
+    """count, mean/p50/p95/p99/max in microseconds and total in milliseconds."""
+    vals = sorted(s / 1000.0 for s in samples_ns)
+    total = sum(vals)
+    return {
+        "count": len(vals),
+        "mean_us": round(total / len(vals), 2) if vals else 0.0,
+        "p50_us": round(_pct(vals, 0.50), 2),
+        "p95_us": round(_pct(vals, 0.95), 2),
+        "p99_us": round(_pct(vals, 0.99), 2),
+        "max_us": round(vals[-1], 2) if vals else 0.0,
+        "total_ms": round(total / 1000.0, 3),
+    }
+
+def _configure(llm: str, llm_latency_ms: int, rules: Optional[str], model_scoring: bool):
+    """Pin the settings that would otherwise reach for a network service; runs before any client is built."""
+    from .decision.engine import RuleEngine, set_rule_engine
+    config.LLM_ENABLED = llm != "off"
+    config.LLM_PROVIDER = llm if llm == "stub" else "mock"
+    config.LLM_STUB_LATENCY_MS = llm_latency_ms
+    # time the inline LLM path; the async lane would move it off the measured thread
+    config.LLM_ASYNC = False
+    config.BATCH_MODEL_SCORING = model_scoring
+    if rules:
+        engine = RuleEngine()
+        engine.load_csv(rules)
+        set_rule_engine(engine)
+    else:
+        config.RULE_ENGINE_ENABLED = False
+
+class _Timer:
+    def __init__(self):
+        self.samples: Dict[str, List[int]] = {s: [] for s in STAGES}
+
+    def run(self, stage: str, fn: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter_ns()
+        out = fn()
+        self.samples[stage].append(time.perf_counter_ns() - t0)
+        return out
+
+def stage_pass(payloads: List[dict], blacklist: List[Tuple[str, str]]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Time each stage of handle_event for every payload; returns (stage summaries, store counts)."""
+    from .app import _build_memory
+    from .action.dispatcher import dispatch
+    from .decision.rules import rule_score, decide
+    from .llm.service import llm_adjustment_async
+    from .llm.planner import plan_workflow_async
+    from .memory.context import LookupContext
+    from .perception.features import perceive
+    from .utils.local_bus import LocalBus
+    from .utils.memory_dao import MemoryDAO
+    from .utils.schemas import TransactionEvent
+    timer = _Timer()
+    bus = LocalBus(keep=False)
+    store = MemoryDAO(blacklist=blacklist)
+    with store.installed():
+        memory = _build_memory(bus)
+        for payload in payloads:
+            evt = timer.run("parse", lambda: TransactionEvent(**payload))
+            ctx = LookupContext.for_event(evt, memory)
+            p = timer.run("perceive", lambda: perceive(evt, ctx))
+            timer.run("add_event", lambda: ctx.add_event(evt))
+            score = timer.run("score_rules", lambda: rule_score(p, ctx))[0]
+            timer.run("llm_adjustment", lambda: llm_adjustment_async(p, score).result())
+            timer.run("plan_workflow", lambda: plan_workflow_async(p, score).result())
+            outcome = timer.run("decide", lambda: decide(p, ctx))
+            timer.run("dispatch", lambda: dispatch(outcome, bus))
+    bus.close()
+    return {s: summarize(timer.samples[s]) for s in STAGES}, store.counts()
+
+def end_to_end(payloads: List[dict], blacklist: List[Tuple[str, str]], batch_size: int) -> Dict[str, Any]:
+    """handle_event per event and handle_batch in `batch_size` slices, each on fresh state."""
+    from .app import _build_memory, handle_event, handle_batch
+    from .utils.local_bus import LocalBus
+    from .utils.memory_dao import MemoryDAO
+    out: Dict[str, Any] = {}
+
+    bus = LocalBus(keep=False)
+    with MemoryDAO(blacklist=blacklist).installed():
+        memory = _build_memory(bus)
+        samples: List[int] = []
+        t0 = time.perf_counter()
+        for payload in payloads:
+            s = time.perf_counter_ns()
+            handle_event(payload, memory, bus)
+            samples.append(time.perf_counter_ns() - s)
+        elapsed = time.perf_counter() - t0
+    bus.close()
+    out["handle_event"] = {"events": len(payloads), "elapsed_sec": round(elapsed, 4),
+                           "events_per_sec": round(len(payloads) / elapsed, 1) if elapsed else 0.0,
+                           **summarize(samples)}
+
+    bus = LocalBus(keep=False)
+    with MemoryDAO(blacklist=blacklist).installed():
+        memory = _build_memory(bus)
+        samples = []
+        t0 = time.perf_counter()
+        for i in range(0, len(payloads), batch_size):
+            s = time.perf_counter_ns()
+            handle_batch(payloads[i:i + batch_size], memory, bus)
+            samples.append(time.perf_counter_ns() - s)
+        elapsed = time.perf_counter() - t0
+    bus.close()
+    out["handle_batch"] = {"events": len(payloads), "batch_size": batch_size, "elapsed_sec": round(elapsed, 4),
+                           "events_per_sec": round(len(payloads) / elapsed, 1) if elapsed else 0.0,
+                           "per_batch": summarize(samples)}
+    return out
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(payloads: List[dict], blacklist: Optional[List[Tuple[str, str]]] = None, batch_size: int = 500,
+        warmup: int = 100, verbose: bool = False, **opts) -> Dict[str, Any]:
+    from .utils.log import set_level
+    from .utils.memory_dao import MemoryDAO
+    _configure(opts.get("llm", "mock"), opts.get("llm_latency_ms", 0), opts.get("rules"), opts.get("model_scoring", False))
+    blacklist = list(blacklist or [])
+    set_level("DEBUG" if verbose else "WARNING")
+    # catch-all for background flushes (device write-behind, checkpoints) that outlive a pass
+    with MemoryDAO().installed():
+        if warmup:
+            # imports, the rule engine and pydantic validators; state is discarded
+            stage_pass(payloads[:warmup], blacklist)
+        stages, counts = stage_pass(payloads, blacklist)
+        e2e = end_to_end(payloads, blacklist, max(1, batch_size))
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "benchmark": "finguard.bench",
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "events": len(payloads), "source": opts.get("source"), "batch_size": batch_size, "warmup": warmup,
+            "llm": opts.get("llm", "mock"), "llm_latency_ms": opts.get("llm_latency_ms", 0),
+            "rules": opts.get("rules") or "built-in", "batch_model_scoring": config.BATCH_MODEL_SCORING,
+            "velocity_store": config.VELOCITY_STORE_ENABLED, "device_cache": config.DEVICE_CACHE_ENABLED,
+            "blacklist_snapshot": config.BLACKLIST_SNAPSHOT_ENABLED,
+        },
+        "stages": stages,
+        "end_to_end": e2e,
+        "store": counts,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    from .backtest import _blacklist
+    ap = argparse.ArgumentParser(description="Benchmark the FinGuard pipeline with in-process Oracle and Kafka stand-ins")
+    ap.add_argument("--payloads", help="JSONL of recorded event payloads (default: generated traffic)")
+    ap.add_argument("--events", type=int, default=2000, help="events to generate, or cap on --payloads")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--fraud-rate", type=float, default=0.05, help="injected scenarios in generated traffic")
+    ap.add_argument("--batch-size", type=int, default=500, help="micro-batch size for the handle_batch pass")
+    ap.add_argument("--warmup", type=int, default=100, help="events run once on throwaway state before timing")
+    ap.add_argument("--llm", choices=("off", "mock", "stub"), default="mock",
+                    help="off, local heuristic (mock) or canned responses through the LLM client (stub)")
+    ap.add_argument("--llm-latency-ms", type=int, default=0, help="simulated provider latency with --llm stub")
+    ap.add_argument("--rules", help="rule catalog CSV for the rule engine (default: built-in rules)")
+    ap.add_argument("--model-scoring", action="store_true", help="score each micro-batch with the model in handle_batch")
+    ap.add_argument("--blacklist", help="CSV of TYPE,VALUE blacklist entries (default: MERCHANT,MBL001)")
+    ap.add_argument("--out", help="write the JSON result here")
+    ap.add_argument("--history", help="append the result as one JSON line here")
+    ap.add_argument("--verbose", action="store_true", help="keep the pipeline's per-event output")
+    args = ap.parse_args(argv)
+    if args.payloads:
+        payloads, skipped = load_payloads(args.payloads, args.events)
+        if not payloads:
+            ap.error(f"no event payloads in {args.payloads} ({skipped} lines skipped)")
+        source = args.payloads
+    else:
+        payloads = generate_payloads(args.events, args.seed, args.fraud_rate)
+        source = f"generated(seed={args.seed}, fraud_rate={args.fraud_rate})"
+    blacklist = _blacklist(args.blacklist) if args.blacklist else [("MERCHANT", "MBL001")]
+    result = run(payloads, blacklist=blacklist, batch_size=args.batch_size, warmup=args.warmup,
+                 verbose=args.verbose, llm=args.llm, llm_latency_ms=args.llm_latency_ms, rules=args.rules,
+                 model_scoring=args.model_scoring, source=source)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(result, separators=(",", ":")) + "\n")
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
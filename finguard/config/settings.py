@@ -33,7 +33,85 @@ BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
 TRANSACTIONS_TOPIC = os.getenv("KAFKA_TRANSACTIONS_TOPIC", "finguard.transactions")
 DECISIONS_TOPIC = os.getenv("KAFKA_DECISIONS_TOPIC", "finguard.decisions")
 ALERTS_TOPIC = os.getenv("KAFKA_ALERTS_TOPIC", "finguard.alerts")
+BLACKLIST_TOPIC = os.getenv("KAFKA_BLACKLIST_TOPIC", "finguard.blacklist")
+# Notification status changes ({"notification_id", "status", "previous_status"}) from the notifier
+NOTIFICATIONS_TOPIC = os.getenv("KAFKA_NOTIFICATIONS_TOPIC", "finguard.notifications")
 CONSUMER_GROUP = os.getenv("KAFKA_CONSUMER_GROUP", "finguard-decisioner")
+# Unacknowledged records allowed per producer before publish blocks (up to KAFKA_PUBLISH_TIMEOUT_SEC)
+KAFKA_MAX_INFLIGHT = int(os.getenv("KAFKA_MAX_INFLIGHT", "10000"))
+KAFKA_PUBLISH_TIMEOUT_SEC = float(os.getenv("KAFKA_PUBLISH_TIMEOUT_SEC", "60"))
+# Retry tiers for events whose handler raised: one topic per RETRY_DELAYS_SEC entry
+# (<TRANSACTIONS_TOPIC>.retry.<delay>s) re-run by a scheduler on RETRY_GROUP once due, then DLQ_TOPIC
+# with the error context; DLQ records are replayed on DLQ_REPLAY_GROUP (POST /tools/dlq/replay)
+RETRY_ENABLED = os.getenv("FINGUARD_RETRY", "true").lower() in ("1", "true", "yes")
+RETRY_DELAYS_SEC = [int(d) for d in os.getenv("FINGUARD_RETRY_DELAYS_SEC", "10,60,600").split(",") if d.strip()]
+RETRY_GROUP = os.getenv("KAFKA_RETRY_GROUP", f"{CONSUMER_GROUP}-retry")
+DLQ_TOPIC = os.getenv("KAFKA_DLQ_TOPIC", f"{TRANSACTIONS_TOPIC}.dlq")
+DLQ_REPLAY_GROUP = os.getenv("KAFKA_DLQ_REPLAY_GROUP", f"{CONSUMER_GROUP}-dlq-replay")
+
+# Consumer mode: "single" (one event per handler call), "parallel" (see below) or "batch" (micro-batches
+# of up to BATCH_MAX_RECORDS events or BATCH_MAX_WAIT_MS, persisted in one transaction)
+CONSUMER_MODE = os.getenv("FINGUARD_CONSUMER_MODE", "single").lower()
+BATCH_MAX_RECORDS = int(os.getenv("FINGUARD_BATCH_MAX_RECORDS", "500"))
+BATCH_MAX_WAIT_MS = int(os.getenv("FINGUARD_BATCH_MAX_WAIT_MS", "200"))
+# Exactly-once ("single" and "batch" modes): micro-batches are persisted together with their partition
+# offsets in fg_stream_offsets, in one Oracle transaction, and partitions are positioned from that table
+# on assignment, so a restart resumes where durable work ended instead of replaying or skipping events
+EXACTLY_ONCE = os.getenv("FINGUARD_EXACTLY_ONCE", "false").lower() in ("1", "true", "yes")
+
+# Parallel mode ("parallel"): events are routed by account_id to WORKER_COUNT
+# single-worker lanes ("thread" or "process"), keeping per-account ordering
+WORKER_COUNT = int(os.getenv("FINGUARD_WORKERS", "4"))
+WORKER_KIND = os.getenv("FINGUARD_WORKER_KIND", "thread").lower()
+WORKER_MAX_INFLIGHT = int(os.getenv("FINGUARD_WORKER_MAX_INFLIGHT", "1000"))
+WORKER_COMMIT_INTERVAL_MS = int(os.getenv("FINGUARD_WORKER_COMMIT_INTERVAL_MS", "1000"))
+# On a rebalance, revoked partitions' running records get this long to finish and be committed;
+# records still running after it are re-delivered to the partition's new owner
+WORKER_REVOKE_DRAIN_SEC = float(os.getenv("FINGUARD_WORKER_REVOKE_DRAIN_SEC", "30"))
+
+# Write-behind persistence ("single" and thread "parallel" modes): transactions,
+# devices, decisions, rule hits and alerts are coalesced into array DML commits of
+# up to WRITER_MAX_RECORDS rows or every WRITER_FLUSH_MS; offsets are committed
+# only once an event's writes are durable
+WRITE_BEHIND_ENABLED = os.getenv("FINGUARD_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITER_MAX_RECORDS = int(os.getenv("FINGUARD_WRITER_MAX_RECORDS", "2000"))
+WRITER_FLUSH_MS = int(os.getenv("FINGUARD_WRITER_FLUSH_MS", "200"))
+WRITER_MAX_QUEUE = int(os.getenv("FINGUARD_WRITER_MAX_QUEUE", "10000"))
+
+# Threads for the concurrent read steps of orchestrator.exec_workflow
+EXECUTOR_WORKERS = int(os.getenv("FINGUARD_EXECUTOR_WORKERS", "8"))
+
+# MCP server: threads for blocking (Oracle) handlers; keep in line with the DB pool size
+SERVER_THREADS = int(os.getenv("FINGUARD_SERVER_THREADS", "8"))
+
+# POST /decide: perceive -> rules -> model must finish within DECIDE_BUDGET_MS on one of
+# DECIDE_WORKERS threads, else DECIDE_DEFAULT_ACTION is returned and marked degraded
+DECIDE_BUDGET_MS = float(os.getenv("FINGUARD_DECIDE_BUDGET_MS", "50"))
+DECIDE_DEFAULT_ACTION = os.getenv("FINGUARD_DECIDE_DEFAULT_ACTION", "ALLOW").upper()
+DECIDE_WORKERS = int(os.getenv("FINGUARD_DECIDE_WORKERS", "8"))
+# /decide's velocity windows and known devices also follow TRANSACTIONS_TOPIC, so they
+# reflect what the consumers decided and not only /decide calls
+DECIDE_FOLLOW_TRANSACTIONS = os.getenv("FINGUARD_DECIDE_FOLLOW_TRANSACTIONS", "true").lower() in ("1", "true", "yes")
+
+# Dashboard rollups in the MCP server: latest DASHBOARD_LATEST_SIZE transactions plus counters fed
+# from the transactions/decisions topics, re-seeded from Oracle every DASHBOARD_RECONCILE_SEC
+DASHBOARD_LATEST_SIZE = int(os.getenv("FINGUARD_DASHBOARD_LATEST_SIZE", "500"))
+DASHBOARD_RECONCILE_SEC = float(os.getenv("FINGUARD_DASHBOARD_RECONCILE_SEC", "300"))
+
+# Live SSE stream (/stream/live): broadcast ring of the last STREAM_RING_SIZE decisions/alerts;
+# idle clients get a comment every STREAM_KEEPALIVE_SEC
+STREAM_RING_SIZE = int(os.getenv("FINGUARD_STREAM_RING_SIZE", "10000"))
+STREAM_KEEPALIVE_SEC = float(os.getenv("FINGUARD_STREAM_KEEPALIVE_SEC", "15"))
+
+# Logging: leveled, structured records on stderr ("json" one object per line, or "text");
+# per-event pipeline and DAO detail is DEBUG
+LOG_LEVEL = os.getenv("FINGUARD_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("FINGUARD_LOG_FORMAT", "json").lower()
+# Prometheus metrics: the MCP server serves /metrics; the consumer serves it from a sidecar
+# thread on METRICS_PORT (0 = off) and samples consumer lag every METRICS_LAG_INTERVAL_SEC. Process
+# workers' metrics reach the sidecar only through prometheus_client's PROMETHEUS_MULTIPROC_DIR
+METRICS_PORT = int(os.getenv("FINGUARD_METRICS_PORT", "0"))
+METRICS_LAG_INTERVAL_SEC = float(os.getenv("FINGUARD_METRICS_LAG_INTERVAL_SEC", "10"))
 
 # Risk thresholds
 BLOCK_THRESHOLD = float(os.getenv("FINGUARD_BLOCK_THRESHOLD", "80"))
@@ -42,21 +120,101 @@ CHALLENGE_THRESHOLD = float(os.getenv("FINGUARD_CHALLENGE_THRESHOLD", "55"))
 # Feature windows (seconds)
 VELOCITY_WINDOW_SEC = int(os.getenv("FINGUARD_VELOCITY_WINDOW_SEC", "60"))
 DEVICE_WINDOW_DAYS = int(os.getenv("FINGUARD_DEVICE_WINDOW_DAYS", "90"))
+GEO_WINDOW_SEC = int(os.getenv("FINGUARD_GEO_WINDOW_SEC", "3600"))
+
+# In-memory velocity windows for the consumer (replaces the per-event
+# FG_TRANSACTIONS scan); aggregates are checkpointed to fg_velocity_counters
+VELOCITY_STORE_ENABLED = os.getenv("FINGUARD_VELOCITY_STORE", "true").lower() in ("1", "true", "yes")
+VELOCITY_CHECKPOINT_SEC = int(os.getenv("FINGUARD_VELOCITY_CHECKPOINT_SEC", "60"))
+# Windows expire against the newest event time seen, capped at wall clock + VELOCITY_MAX_SKEW_SEC so one
+# future-dated event cannot expire every other key's window
+VELOCITY_MAX_SKEW_SEC = float(os.getenv("FINGUARD_VELOCITY_MAX_SKEW_SEC", "300"))
+
+# Known-device cache in front of FG_DEVICES_SEEN (bounded by fingerprint count);
+# LAST_SEEN_AT is refreshed at most once per DEVICE_TOUCH_INTERVAL_SEC per device
+DEVICE_CACHE_ENABLED = os.getenv("FINGUARD_DEVICE_CACHE", "true").lower() in ("1", "true", "yes")
+DEVICE_CACHE_MAX_ENTRIES = int(os.getenv("FINGUARD_DEVICE_CACHE_MAX_ENTRIES", "1000000"))
+DEVICE_TOUCH_INTERVAL_SEC = int(os.getenv("FINGUARD_DEVICE_TOUCH_INTERVAL_SEC", "86400"))
+# After a complete warm, misses skip FG_DEVICES_SEEN for this long; other writers make it stale after that
+DEVICE_CACHE_COMPLETE_TTL_SEC = int(os.getenv("FINGUARD_DEVICE_CACHE_COMPLETE_TTL_SEC", "60"))
 
+# In-memory fg_blacklist snapshot: incremental refresh every BLACKLIST_REFRESH_SEC,
+# full reload every BLACKLIST_FULL_REFRESH_SEC, plus pushes on BLACKLIST_TOPIC
+BLACKLIST_SNAPSHOT_ENABLED = os.getenv("FINGUARD_BLACKLIST_SNAPSHOT", "true").lower() in ("1", "true", "yes")
+BLACKLIST_REFRESH_SEC = float(os.getenv("FINGUARD_BLACKLIST_REFRESH_SEC", "5"))
+BLACKLIST_FULL_REFRESH_SEC = float(os.getenv("FINGUARD_BLACKLIST_FULL_REFRESH_SEC", "600"))
+
+# Compiled rule engine over the active FG_RULES catalog (replaces the built-in
+# rules in score_rules when enabled); the rule set is re-read every RULES_RELOAD_SEC
+RULE_ENGINE_ENABLED = os.getenv("FINGUARD_RULE_ENGINE", "false").lower() in ("1", "true", "yes")
+RULES_RELOAD_SEC = float(os.getenv("FINGUARD_RULES_RELOAD_SEC", "30"))
+
+# LLM risk adjustment and planning ("gemini", "stub" for offline runs, anything else = local heuristic).
+# Remote calls go through one shared client: responses are cached by bucketed feature vector
+# (LLM_CACHE_SIZE entries, LLM_CACHE_TTL_SEC), each call is capped at LLM_TIMEOUT_MS, and with
+# LLM_GRAY_ZONE_ONLY only events whose rule score is in [CHALLENGE_THRESHOLD, BLOCK_THRESHOLD) call out
+LLM_ENABLED = os.getenv("FINGUARD_LLM_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_PROVIDER = os.getenv("FINGUARD_LLM_PROVIDER", "mock").lower()
+LLM_MODEL = os.getenv("FINGUARD_LLM_MODEL", "gemini-1.5-flash")
+LLM_TIMEOUT_MS = int(os.getenv("FINGUARD_LLM_TIMEOUT_MS", "1500"))
+LLM_MAX_CONCURRENCY = int(os.getenv("FINGUARD_LLM_MAX_CONCURRENCY", "8"))
+# Calls admitted (running or queued for one of the LLM_MAX_CONCURRENCY threads); beyond that a call
+# gets its fallback at once instead of queueing behind a slow provider
+LLM_MAX_PENDING = int(os.getenv("FINGUARD_LLM_MAX_PENDING", "64"))
+LLM_CACHE_SIZE = int(os.getenv("FINGUARD_LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_TTL_SEC = float(os.getenv("FINGUARD_LLM_CACHE_TTL_SEC", "300"))
+LLM_GRAY_ZONE_ONLY = os.getenv("FINGUARD_LLM_GRAY_ZONE_ONLY", "true").lower() in ("1", "true", "yes")
+LLM_STUB_LATENCY_MS = int(os.getenv("FINGUARD_LLM_STUB_LATENCY_MS", "0"))
+# With a remote provider and LLM_ASYNC on, decide() returns the rules decision and a background lane
+# (LLM_LANE_CONCURRENCY calls in flight, up to LLM_LANE_MAX_PENDING queued) publishes an amended
+# revision when the LLM changes the action
+LLM_ASYNC = os.getenv("FINGUARD_LLM_ASYNC", "true").lower() in ("1", "true", "yes")
+LLM_LANE_CONCURRENCY = int(os.getenv("FINGUARD_LLM_LANE_CONCURRENCY", "32"))
+LLM_LANE_MAX_PENDING = int(os.getenv("FINGUARD_LLM_LANE_MAX_PENDING", "10000"))
 
 # Oracle DB
 ORACLE_DSN = os.getenv("ORACLE_DSN", "localhost/orclpdb1")
 ORACLE_USER = os.getenv("ORACLE_USER", "FINGUARD")
 ORACLE_PASSWORD = os.getenv("ORACLE_PASSWORD", "FINGUARD")
-print(f"Using Oracle DSN: {ORACLE_DSN}, User: {ORACLE_USER}")
+# Connection pool: each process sizes its pool to its own concurrent DB users (db.pool_size) plus
+# DB_POOL_BACKGROUND connections for the refresh, checkpoint and LLM-lane threads:
+#   server   - SERVER_THREADS handler threads + DECIDE_WORKERS + EXECUTOR_WORKERS + the /decide writer
+#   consumer - WORKER_COUNT thread lanes (the poll thread in other modes) + the writer + the retry scheduler
+#   worker   - one process lane (WORKER_KIND "process"); half the max is opened eagerly, one for a worker
+# DB_POOL_MAX / DB_POOL_MIN override the size for every role (0 = size by role). An acquire waits at most
+# DB_POOL_WAIT_TIMEOUT_MS for a free connection. Each connection keeps DB_STMT_CACHE_SIZE parsed statements.
+DB_POOL_BACKGROUND = int(os.getenv("FINGUARD_DB_POOL_BACKGROUND", "4"))
+DB_POOL_MAX = int(os.getenv("FINGUARD_DB_POOL_MAX", "0"))
+DB_POOL_MIN = int(os.getenv("FINGUARD_DB_POOL_MIN", "0"))
+DB_POOL_INCREMENT = int(os.getenv("FINGUARD_DB_POOL_INCREMENT", "2"))
+DB_POOL_WAIT_TIMEOUT_MS = int(os.getenv("FINGUARD_DB_POOL_WAIT_TIMEOUT_MS", "5000"))
+DB_POOL_IDLE_TIMEOUT_SEC = int(os.getenv("FINGUARD_DB_POOL_IDLE_TIMEOUT_SEC", "60"))
+DB_STMT_CACHE_SIZE = int(os.getenv("FINGUARD_DB_STMT_CACHE_SIZE", "64"))
+# Rows per fetch round trip for bulk reads (cache warm-up, blacklist snapshot, dashboard aggregates);
+# keyed and paginated queries size their fetch to the rows they expect
+DB_BULK_ARRAYSIZE = int(os.getenv("FINGUARD_DB_BULK_ARRAYSIZE", "5000"))
 # Table names (adjust if different in your fin_guard_oracle_schema.sql)
 TBL_TRANSACTIONS = os.getenv("FG_TBL_TRANSACTIONS", "FG_TRANSACTIONS")
 TBL_DECISIONS = os.getenv("FG_TBL_DECISIONS", "FG_DECISIONS")
 TBL_ALERTS = os.getenv("FG_TBL_ALERTS", "FG_ALERTS")
 TBL_DEVICES_SEEN = os.getenv("FG_TBL_DEVICES_SEEN", "FG_DEVICES_SEEN")
 TBL_MERCHANT_BLACKLIST = os.getenv("FG_TBL_MERCHANT_BLACKLIST", "FG_BLACKLIST")
+TBL_VELOCITY_COUNTERS = os.getenv("FG_TBL_VELOCITY_COUNTERS", "FG_VELOCITY_COUNTERS")
+TBL_RULES = os.getenv("FG_TBL_RULES", "FG_RULES")
+TBL_RULE_HITS = os.getenv("FG_TBL_RULE_HITS", "FG_RULE_HITS")
+TBL_INCIDENTS = os.getenv("FG_TBL_INCIDENTS", "FG_INCIDENTS")
+TBL_NOTIFICATIONS = os.getenv("FG_TBL_NOTIFICATIONS", "FG_NOTIFICATIONS")
+TBL_DAILY_RISK_ROLLUP = os.getenv("FG_TBL_DAILY_RISK_ROLLUP", "MV_DAILY_RISK_ROLLUP")
+TBL_STREAM_OFFSETS = os.getenv("FG_TBL_STREAM_OFFSETS", "FG_STREAM_OFFSETS")
 
 
 # Model Registry & Scores tables
 TBL_MODEL_VERSIONS = os.getenv("FG_TBL_MODEL_VERSIONS", "FG_MODEL_VERSIONS")
 TBL_MODEL_SCORES   = os.getenv("FG_TBL_MODEL_SCORES",   "FG_MODEL_SCORES")
+
+# In-process model artifacts (<FG_MODEL_DIR>/<model_name>.json, see tools/model_runtime.py);
+# with FINGUARD_BATCH_MODEL_SCORING the micro-batch consumer scores each batch in one call
+MODEL_DIR = os.getenv("FG_MODEL_DIR", "models")
+# How often the model registry re-reads the active FG_MODEL_VERSIONS row and artifact
+MODEL_REGISTRY_POLL_SEC = float(os.getenv("FG_MODEL_REGISTRY_POLL_SEC", "30"))
+BATCH_MODEL_SCORING = os.getenv("FINGUARD_BATCH_MODEL_SCORING", "false").lower() in ("1", "true", "yes")
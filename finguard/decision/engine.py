@@ -0,0 +1,323 @@
+import csv
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+from ..utils.schemas import PerceivedEvent
+from ..memory.velocity import VELOCITY_SCOPES, feature_name
+from ..perception.features import PERCEIVED_FEATURES
+from ..utils import dao
+from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Points added to the risk score per rule hit, unless definition_json sets "score".
+SEVERITY_POINTS = {"LOW": 10.0, "MEDIUM": 20.0, "HIGH": 35.0, "CRITICAL": 60.0}
+
+# definition_json keys that describe or parameterise a rule rather than test a feature
+_META_KEYS = {"category", "scope", "window_minutes", "lookback_days", "geo_points_required",
+              "days", "scam_pattern", "score", "present"}
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "gt": lambda v, x: v > x,
+    "gte": lambda v, x: v >= x,
+    "lt": lambda v, x: v < x,
+    "lte": lambda v, x: v <= x,
+    "in": lambda v, x: v in x,
+    "not_in": lambda v, x: v not in x,
+    "eq": lambda v, x: v == x,
+    "any_kw": lambda v, x: any(k.lower() in v.lower() for k in x),
+    "hour_between": lambda v, x: (x[0] <= v <= x[1]) if x[0] <= x[1] else (v >= x[0] or v <= x[1]),
+}
+
+# Aliases from catalog vocabulary to perceive feature names
+_ALIASES = {"new_device": "is_new_device", "txn_count": "tx_count_last_window", "forex_currency": "currency"}
+
+# Features some stage computes for every event: perceive, the velocity windows, and what RuleContext
+# derives from event fields and the blacklist snapshot. Anything else resolves from `event.extra` only,
+# so a rule reading it stays silent unless the event producer sends that field.
+COMPUTED_FEATURES = frozenset(
+    PERCEIVED_FEATURES
+    | {feature_name(s, m, agg) for s, m in VELOCITY_SCOPES.items() for agg in ("count", "sum")}
+    | {"hour", "is_weekend", "channel", "mcc", "currency",
+       "merchant_blacklisted", "device_blacklisted", "ip_blacklisted"}
+)
+
+@dataclass(frozen=True)
+class Condition:
+    feature: str
+    op: str
+    operand: Any
+
+    def test(self, value: Any) -> bool:
+        try:
+            return _OPS[self.op](value, self.operand)
+        except TypeError:
+            return False
+
+@dataclass
+class CompiledRule:
+    rule_id: Optional[int]
+    rule_code: str
+    name: str
+    severity: str
+    category: str
+    points: float
+    conditions: Tuple[Condition, ...]
+    features: FrozenSet[str] = field(default_factory=frozenset)
+
+def _split_op(key: str) -> Tuple[str, str]:
+    for suffix in ("_not_in", "_gte", "_lte", "_gt", "_lt", "_in"):
+        if key.endswith(suffix):
+            return key[: -len(suffix)], suffix[1:]
+    return key, "eq"
+
+def compile_definition(defn: Dict[str, Any]) -> Tuple[Condition, ...]:
+    """
+    Turn a portable definition_json into a conjunction of feature tests.
+    Structured keys (velocity scope/window, hour ranges, geo hops, narration
+    keywords) get dedicated features; every other key follows the
+    <feature>[_gt|_gte|_lt|_lte|_in|_not_in] convention, with plain values
+    meaning equality.
+    """
+    conds: List[Condition] = []
+    window = defn.get("window_minutes")
+    category = str(defn.get("category") or "").upper()
+    for key, value in defn.items():
+        if key in _META_KEYS:
+            continue
+        if category == "VELOCITY" and key in ("txn_count_gt", "total_amount_gte"):
+            scope = str(defn.get("scope") or "ACCOUNT").lower()
+            agg = "count" if key.startswith("txn_count") else "sum"
+            _, op = _split_op(key)
+            conds.append(Condition(f"velocity_{scope}_{int(window)}m_{agg}", op, value))
+        elif key in ("hour_from", "hour_to"):
+            if key == "hour_from":
+                conds.append(Condition("hour", "hour_between", (int(defn["hour_from"]), int(defn.get("hour_to", 23)))))
+        elif key in ("distance_km_gt", "geo_distance_km_gt"):
+            conds.append(Condition("geo_last_distance_km", "gt", value))
+            if window is not None:
+                conds.append(Condition("geo_last_gap_minutes", "lte", window))
+        elif key == "narration_keywords":
+            conds.append(Condition("narration", "any_kw", tuple(value)))
+        elif key == "beneficiary_txn_count_window":
+            conds.append(Condition("beneficiary_txn_count", "gte", value))
+        elif key.endswith("_blacklisted"):
+            conds.append(Condition(key, "eq", bool(value)))
+        else:
+            feat, op = _split_op(key)
+            if op in ("in", "not_in"):
+                value = tuple(value)
+            conds.append(Condition(_ALIASES.get(feat, feat), op, value))
+    days = str(defn.get("days") or "ANY").upper()
+    if days in ("WEEKEND", "WEEKDAY"):
+        conds.append(Condition("is_weekend", "eq", days == "WEEKEND"))
+    return tuple(conds)
+
+def compile_rule(rule_id: Optional[int], rule_code: str, name: str, severity: str, definition: Any) -> CompiledRule:
+    defn = json.loads(definition) if isinstance(definition, str) else dict(definition or {})
+    sev = (severity or "MEDIUM").upper()
+    conds = compile_definition(defn)
+    return CompiledRule(
+        rule_id=rule_id,
+        rule_code=rule_code,
+        name=name or rule_code,
+        severity=sev,
+        category=str(defn.get("category") or "UNCATEGORIZED").upper(),
+        points=float(defn.get("score", SEVERITY_POINTS.get(sev, 20.0))),
+        conditions=conds,
+        features=frozenset(c.feature for c in conds),
+    )
+
+class RuleContext:
+    """
+    Per-event feature resolver shared by every rule: each feature is resolved
+    at most once (perceive features, then event fields, then blacklist
+    lookups, then `event.extra`) and memoized. Missing features are None.
+    """
+    _BL_FIELDS = {"merchant": "merchant_id", "device": "device_id", "ip": "ip"}
+
+    def __init__(self, p: PerceivedEvent, memory):
+        self.p = p
+        self.memory = memory
+        self.extra = p.event.extra if isinstance(p.event.extra, dict) else {}
+        self._cache: Dict[str, Any] = {}
+
+    def get(self, name: str) -> Any:
+        if name in self._cache:
+            return self._cache[name]
+        value = self._resolve(name)
+        self._cache[name] = value
+        return value
+
+    def _resolve(self, name: str) -> Any:
+        evt = self.p.event
+        if name in self.p.features:
+            return self.p.features[name]
+        if name == "hour":
+            return evt.timestamp.hour
+        if name == "is_weekend":
+            return evt.timestamp.weekday() >= 5
+        if name == "channel":
+            return (evt.channel or "").upper()
+        if name == "mcc":
+            return (evt.mcc or "").strip() or None
+        if name == "currency":
+            return evt.currency
+        if name == "subtype":
+            return self.extra.get("channel_subtype", self.extra.get("subtype"))
+        if name.endswith("_blacklisted"):
+            kind = name[: -len("_blacklisted")]
+            field_name = self._BL_FIELDS.get(kind)
+            if field_name:
+                value = getattr(evt, field_name)
+            elif kind == "card":
+                value = self.extra.get("card_id") or self.extra.get("card_number")
+            else:
+                value = self.extra.get(kind)
+            if value is None or self.memory is None:
+                return None
+            return self.memory.is_listed(kind.upper(), value)
+        return self.extra.get(name)
+
+    @property
+    def lookups(self) -> int:
+        return len(self._cache)
+
+class RuleEngine:
+    """
+    Evaluates the active FG_RULES catalog. Rules are compiled once from
+    definition_json, indexed by channel (so CHANNEL rules for other channels
+    are never looked at) and grouped by category and the feature set they
+    need: if any of a group's features is missing for the event, the whole
+    group is skipped without evaluating its rules. The rule set can be hot-reloaded; swaps
+    are atomic so in-flight evaluations finish on the old set.
+
+    Rules reading a feature outside COMPUTED_FEATURES are listed in `inert`
+    (rule_code -> missing features) and reported when the set is loaded:
+    they can only fire for events whose `extra` carries those fields.
+    """
+    def __init__(self):
+        self.version = ""
+        self.loaded_at: Optional[float] = None
+        self._rules: List[CompiledRule] = []
+        self.inert: Dict[str, FrozenSet[str]] = {}
+        self._by_channel: Dict[Optional[str], List[Tuple[FrozenSet[str], List[CompiledRule]]]] = {}
+        self._timer: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._rules)
+
+    def set_rules(self, rules: List[CompiledRule], version: str):
+        by_channel: Dict[Optional[str], Dict[Tuple[str, FrozenSet[str]], List[CompiledRule]]] = {}
+        for r in rules:
+            channel = next((c.operand for c in r.conditions if c.feature == "channel" and c.op == "eq"), None)
+            key = str(channel).upper() if channel is not None else None
+            by_channel.setdefault(key, {}).setdefault((r.category, r.features), []).append(r)
+        # cheap groups (fewest features) first
+        index = {ch: [(feats, rs) for (_, feats), rs in sorted(groups.items(), key=lambda kv: (len(kv[0][1]), kv[0][0]))]
+                 for ch, groups in by_channel.items()}
+        inert = {r.rule_code: r.features - COMPUTED_FEATURES for r in rules if not r.features <= COMPUTED_FEATURES}
+        self._rules, self._by_channel, self.version, self.inert = list(rules), index, version, inert
+        self.loaded_at = time.time()
+        if inert:
+            categories: Dict[str, int] = {}
+            for r in rules:
+                if r.rule_code in inert:
+                    categories[r.category] = categories.get(r.category, 0) + 1
+            log.warning("rules read features no stage computes; they only fire when events carry them in extra",
+                        extra={"rules": len(inert), "of": len(rules), "categories": categories,
+                               "features": sorted(set().union(*inert.values()))})
+
+    def load_rows(self, rows: List[Dict[str, Any]]) -> bool:
+        """Compile FG_RULES-shaped rows; returns False if the set is unchanged."""
+        digest = hashlib.sha1()
+        compiled: List[CompiledRule] = []
+        for r in sorted(rows, key=lambda r: str(r.get("RULE_CODE"))):
+            definition = r.get("DEFINITION_JSON")
+            if hasattr(definition, "read"):
+                definition = definition.read()
+            digest.update(f"{r.get('RULE_ID')}|{r.get('RULE_CODE')}|{r.get('SEVERITY')}|{definition}".encode("utf-8"))
+            try:
+                compiled.append(compile_rule(r.get("RULE_ID"), r.get("RULE_CODE"), r.get("NAME"), r.get("SEVERITY"), definition))
+            except Exception as e:
+                log.warning("skipping rule", extra={"rule_code": r.get("RULE_CODE"), "error": str(e)})
+        version = digest.hexdigest()[:12]
+        if version == self.version:
+            return False
+        self.set_rules(compiled, version)
+        log.info("rules loaded", extra={"rules": len(compiled), "version": version})
+        return True
+
+    def load(self) -> bool:
+        return self.load_rows(dao.load_active_rules())
+
+    def load_csv(self, path: str) -> bool:
+        """Load the tabular rule catalog (documents/FinGuard_Rule_Catalog__tabular_.csv)."""
+        with open(path, newline="", encoding="utf-8") as fh:
+            rows = [{"RULE_ID": None, "RULE_CODE": r["Rule Code"], "NAME": r["Rule Name"],
+                     "SEVERITY": r["Severity"], "DEFINITION_JSON": r["Definition JSON"]}
+                    for r in csv.DictReader(fh)]
+        return self.load_rows(rows)
+
+    def evaluate(self, p: PerceivedEvent, memory) -> Tuple[float, List[str], List[Dict[str, Any]]]:
+        ctx = RuleContext(p, memory)
+        index = self._by_channel
+        score = 0.0
+        reasons: List[str] = []
+        hits: List[Dict[str, Any]] = []
+        for bucket in (index.get(None, []), index.get(ctx.get("channel"), [])):
+            for features, rules in bucket:
+                values = {}
+                for f in features:
+                    v = ctx.get(f)
+                    if v is None:
+                        break
+                    values[f] = v
+                else:
+                    for r in rules:
+                        if all(c.test(values[c.feature]) for c in r.conditions):
+                            score += r.points
+                            reasons.append(f"Rule {r.rule_code} ({r.name}) +{r.points:g}")
+                            hits.append({"rule_id": r.rule_id, "rule_code": r.rule_code, "severity": r.severity,
+                                         "category": r.category, "details": dict(values)})
+        return score, reasons, hits
+
+    def start_reloading(self, interval_sec: float):
+        def _loop():
+            while True:
+                time.sleep(interval_sec)
+                try:
+                    self.load()
+                except Exception as e:
+                    log.warning("rule reload failed", extra={"error": str(e)})
+        if self._timer is None:
+            self._timer = threading.Thread(target=_loop, name="finguard-rules-reload", daemon=True)
+            self._timer.start()
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+def set_rule_engine(engine: Optional[RuleEngine]):
+    """Install an already loaded engine (e.g. from the catalog CSV) as the process-wide one."""
+    global _engine
+    _engine = engine
+
+def get_rule_engine() -> Optional[RuleEngine]:
+    """Process-wide engine, loaded from FG_RULES on first use when FINGUARD_RULE_ENGINE is on."""
+    global _engine
+    if _engine is not None:
+        return _engine
+    if not config.RULE_ENGINE_ENABLED:
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = RuleEngine()
+                engine.load()
+                engine.start_reloading(config.RULES_RELOAD_SEC)
+                _engine = engine
+    return _engine
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from uuid import uuid4
+from ..utils.schemas import PerceivedEvent, DecisionOutcome
+from ..llm.client import get_llm_client, in_gray_zone
+from ..llm.service import llm_adjustment_async
+from ..llm.planner import plan_workflow_async
+from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+class LLMLane:
+    """
+    Background asyncio lane that reviews already-dispatched rules decisions
+    with the LLM, so LLM latency never sits on the decision path. Reviews run
+    with at most `concurrency` in flight; beyond `max_pending` queued reviews
+    new ones are dropped (the rules decision stands). When the LLM changes
+    the action, an amended DecisionOutcome (revision + 1, revision_of = the
+    original's published decision_id) is persisted as an FG_DECISIONS
+    revision, with its alerts, and published on the decisions topic. Reviews
+    are only submitted once the original decision is committed, so the
+    stored revision links to its row (see dao.insert_decision_revision).
+    """
+    def __init__(self, concurrency: int = 32, max_pending: int = 10_000, bus=None):
+        self.max_pending = max_pending
+        self._bus = bus
+        self._loop = asyncio.new_event_loop()
+        self._sem = asyncio.Semaphore(concurrency)
+        self._cond = threading.Condition()
+        self.pending = 0
+        self.reviewed = 0
+        self.amended = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._loop.run_forever, name="finguard-llm-lane", daemon=True)
+        self._thread.start()
+
+    def submit(self, p: PerceivedEvent, outcome: DecisionOutcome) -> bool:
+        """Queue a review if the LLM could change the outcome; returns False if not queued."""
+        if not in_gray_zone(outcome.risk_score):
+            return False
+        with self._cond:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending += 1
+        asyncio.run_coroutine_threadsafe(self._review(p, outcome), self._loop)
+        return True
+
+    def _count(self, name: str):
+        with self._cond:
+            setattr(self, name, getattr(self, name) + 1)
+
+    async def _review(self, p: PerceivedEvent, outcome: DecisionOutcome):
+        try:
+            async with self._sem:
+                adjustment, plan = await asyncio.gather(
+                    asyncio.wrap_future(llm_adjustment_async(p, outcome.risk_score)),
+                    asyncio.wrap_future(plan_workflow_async(p, outcome.risk_score)),
+                )
+                amended = self.amend(outcome, adjustment, plan)
+                self._count("reviewed")
+                if amended is not None:
+                    await self._loop.run_in_executor(None, self._dispatch, amended)
+                    self._count("amended")
+        except Exception as e:
+            self._count("failed")
+            log.warning("LLM review failed", extra={"event_id": outcome.event_id, "error": str(e)})
+        finally:
+            with self._cond:
+                self.pending -= 1
+                self._cond.notify_all()
+
+    @staticmethod
+    def amend(outcome: DecisionOutcome, adjustment, plan: Dict[str, Any]) -> Optional[DecisionOutcome]:
+        """The revision of `outcome` the LLM verdict implies, or None if the action is unchanged."""
+        from .rules import apply_llm
+        # outcome.risk_score is the rules-only score (the inline LLM was deferred)
+        reasons = [r for r in outcome.reasons if not r.startswith("LLM plan ")]
+        score, action = apply_llm(outcome.risk_score, reasons, adjustment, plan)
+        if action == outcome.action:
+            return None
+        return DecisionOutcome(
+            decision_id=str(uuid4()),
+            event_id=outcome.event_id,
+            action=action,
+            risk_score=round(score, 2),
+            reasons=reasons,
+            created_at=datetime.utcnow(),
+            revision=outcome.revision + 1,
+            revision_of=outcome.decision_id,
+            channel=outcome.channel,
+        )
+
+    def _dispatch(self, amended: DecisionOutcome):
+        from ..action.dispatcher import dispatch_revision
+        if self._bus is None:
+            from ..utils.kafka_bus import KafkaBus
+            self._bus = KafkaBus()
+        dispatch_revision(amended, self._bus)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued reviews finish; False if `timeout` passed first."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.pending == 0, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"pending": self.pending, "reviewed": self.reviewed, "amended": self.amended,
+                    "dropped": self.dropped, "failed": self.failed}
+
+_lane: Optional[LLMLane] = None
+_lane_lock = threading.Lock()
+
+def get_llm_lane() -> Optional[LLMLane]:
+    """Process-wide lane when FINGUARD_LLM_ASYNC is on and a remote LLM provider is configured."""
+    global _lane
+    if not config.LLM_ASYNC or get_llm_client() is None:
+        return None
+    if _lane is None:
+        with _lane_lock:
+            if _lane is None:
+                _lane = LLMLane(config.LLM_LANE_CONCURRENCY, config.LLM_LANE_MAX_PENDING)
+    return _lane
+
+def review_later(p: PerceivedEvent, outcome: DecisionOutcome) -> bool:
+    """Hand a dispatched decision to the LLM lane (no-op when the lane is off)."""
+    lane = get_llm_lane()
+    return lane.submit(p, outcome) if lane is not None else False
+
+def drain_llm_lane(timeout: Optional[float] = None):
+    """Shutdown hook: let queued reviews finish and deliver their revisions."""
+    if _lane is None:
+        return
+    if not _lane.drain(timeout):
+        log.warning("LLM reviews still pending at shutdown", extra={"pending": _lane.pending})
+    if _lane._bus is not None:
+        _lane._bus.flush(timeout)
@@ -0,0 +1,157 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+from ..utils.schemas import TransactionEvent, DecisionOutcome
+from ..utils.persistence import PersistenceWriter, WriteUnit
+from ..memory.oracle_store import OracleMemoryStore as MemoryStore, BatchMemoryStore
+from ..memory.context import LookupContext
+from ..perception.features import perceive
+from ..tools.ml_model_tool import score_batch
+from ..tools.model_runtime import model_features
+from ..action.dispatcher import to_alerts, publish_outcome, dispatch_revision
+from .rules import decide
+from .llm_lane import review_later
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+class InlineDecider:
+    """
+    Synchronous decisions for inline authorization. perceive -> rules ->
+    model runs on a small pool against warm in-memory caches; if it has not
+    finished within `budget_ms` the caller gets `default_action` with
+    `degraded=True` instead of waiting. Either way the decision is persisted
+    through the write-behind `writer` and published on the decisions topic
+    once durable, so the Kafka consumers see the same record. A degraded
+    decision whose full evaluation later disagrees is followed by an amended
+    revision.
+
+    `memory` is this process's own cache set, not the consumer's: it only
+    sees events passed to `observe` (see DECIDE_FOLLOW_TRANSACTIONS) besides
+    its own, and misses fall back to Oracle as usual.
+    """
+    def __init__(self, memory: MemoryStore, bus, writer: PersistenceWriter, budget_ms: float = 50.0,
+                 default_action: str = "ALLOW", workers: int = 8):
+        self.memory = memory
+        self.bus = bus
+        self.writer = writer
+        self.budget_sec = budget_ms / 1000.0
+        self.default_action = default_action
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="finguard-decide")
+        # complete() runs on request threads
+        self._lock = threading.Lock()
+        self.decided = 0
+        self.degraded = 0
+
+    def _evaluate(self, evt: TransactionEvent):
+        overlay = BatchMemoryStore(self.memory)
+        ctx = LookupContext.for_event(evt, overlay)
+        p = perceive(evt, ctx)
+        ctx.add_event(evt)
+        outcome = decide(p, ctx)
+        scored = score_batch([(evt.event_id, model_features(p.features, evt.extra))], persist=False)
+        outcome.model_score = scored["scores"][0]["risk_score"]
+        return p, overlay, outcome, scored
+
+    def submit(self, payload: Dict[str, Any]) -> Tuple[TransactionEvent, Future]:
+        """Validate and start evaluating; raises on a malformed event."""
+        evt = TransactionEvent(**payload)
+        return evt, self._pool.submit(self._evaluate, evt)
+
+    def observe(self, payload: Dict[str, Any]):
+        """Fold a transaction decided elsewhere (the consumers) into the velocity windows and known devices."""
+        try:
+            evt = TransactionEvent(**payload)
+        except Exception:
+            return
+        if self.memory.velocity is not None:
+            self.memory.velocity.record(evt)
+        if self.memory.devices is not None:
+            self.memory.devices.remember(evt.account_id, evt.device_id, evt.timestamp)
+
+    def complete(self, evt: TransactionEvent, fut: Future, started: float) -> Dict[str, Any]:
+        """
+        Answer with the full decision if `fut` is done, else a degraded one;
+        schedules persistence. Blocks while the writer queue is full, so
+        async callers run it in a worker thread.
+        """
+        if fut.done() and fut.exception() is None:
+            p, overlay, outcome, scored = fut.result()
+            unit = self._persist(overlay.pending, overlay.pending_devices, outcome, scored)
+
+            def _review(u: Future):
+                # the review may amend the decision; its revision links to the committed row
+                if u.exception() is None:
+                    review_later(p, outcome)
+            unit.add_done_callback(_review)
+            with self._lock:
+                self.decided += 1
+            return self._response(outcome, started, scored)
+        reason = "evaluation failed" if fut.done() else f"latency budget {self.budget_sec * 1000:.0f} ms exceeded"
+        degraded = DecisionOutcome(
+            decision_id=str(uuid4()),
+            event_id=evt.event_id,
+            action=self.default_action,
+            risk_score=0.0,
+            reasons=[f"Degraded: {reason}; default action {self.default_action}"],
+            created_at=datetime.utcnow(),
+            channel=evt.channel,
+            degraded=True,
+        )
+        with self._lock:
+            self.degraded += 1
+        fut.add_done_callback(lambda f: self._settle_degraded(evt, degraded, f))
+        return self._response(degraded, started, None)
+
+    def decide(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        evt, fut = self.submit(payload)
+        try:
+            fut.result(timeout=self.budget_sec)
+        except Exception:
+            # complete() reports both the timeout and a failed evaluation as degraded
+            pass
+        return self.complete(evt, fut, started)
+
+    def _settle_degraded(self, evt: TransactionEvent, degraded: DecisionOutcome, f: Future):
+        # the degraded answer is what the caller acted on: persist and publish it first
+        if f.exception() is not None:
+            log.warning("inline evaluation failed", extra={"event_id": evt.event_id, "error": str(f.exception())})
+            self._persist([evt], [], degraded, None)
+            return
+        p, overlay, outcome, scored = f.result()
+        degraded.model_score = outcome.model_score
+        unit = self._persist(overlay.pending, overlay.pending_devices, degraded, scored)
+        if outcome.action != degraded.action:
+            amended = outcome.copy(update={"revision": degraded.revision + 1, "revision_of": degraded.decision_id})
+
+            def _amend(u: Future):
+                if u.exception() is None:
+                    # a blocking insert; keep it off the writer's thread
+                    self._pool.submit(dispatch_revision, amended, self.bus)
+            unit.add_done_callback(_amend)
+
+    def _persist(self, events, devices, outcome: DecisionOutcome, scored: Optional[Dict[str, Any]]) -> Future:
+        alerts = to_alerts(outcome)
+        unit = self.writer.submit(WriteUnit(events=list(events), devices=list(devices), decisions=[outcome],
+                                            alerts=alerts, scores=scored["rows"] if scored else []))
+
+        def _published(f: Future):
+            if f.exception() is None:
+                publish_outcome(outcome, alerts, self.bus)
+            else:
+                log.error("persisting inline decision failed", extra={"event_id": outcome.event_id, "error": str(f.exception())})
+        unit.add_done_callback(_published)
+        return unit
+
+    @staticmethod
+    def _response(outcome: DecisionOutcome, started: float, scored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        out = outcome.dict()
+        out["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if scored:
+            out["model"] = {"model_id": scored["model_id"], "version": scored["version"],
+                            "risk_score": scored["scores"][0]["risk_score"]}
+        return out
@@ -1,13 +1,35 @@
-from typing import List, Tuple
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 from datetime import datetime
 from ..utils.schemas import PerceivedEvent, DecisionOutcome
 from ..memory.oracle_store import OracleMemoryStore as MemoryStore
 from ..config import settings as config
-from ..llm.service import llm_adjustment
-from ..llm.planner import plan_workflow
+from ..llm.service import llm_adjustment_async
+from ..llm.planner import plan_workflow_async, empty_plan
+from .engine import get_rule_engine
+from .llm_lane import get_llm_lane
+from ..memory.context import memoized
+from ..utils.metrics import span
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+def score_rules(p: PerceivedEvent, memory: MemoryStore,
+                hits: Optional[List[Dict[str, Any]]] = None) -> Tuple[float, List[str]]:
+    """
+    Deterministic rule score. With FINGUARD_RULE_ENGINE on and FG_RULES
+    loaded, the compiled catalog is evaluated (matched rules are appended to
+    `hits`); otherwise the built-in rules below apply.
+    """
+    engine = get_rule_engine()
+    if engine is not None and len(engine):
+        score, reasons, matched = engine.evaluate(p, memory)
+        if hits is not None:
+            hits.extend(matched)
+        log.debug("score_rules", extra={"event_id": p.event.event_id, "score": score, "reasons": reasons})
+        return score, reasons
 
-def score_rules(p: PerceivedEvent, memory: MemoryStore) -> Tuple[float, List[str]]:
     f = p.features
     evt = p.event
     score = 0.0
@@ -55,39 +77,80 @@ def score_rules(p: PerceivedEvent, memory: MemoryStore) -> Tuple[float, List[str
     # Blacklist
     if memory.is_blacklisted(evt.merchant_id):
         score += 40; reasons.append(f"Blacklisted merchant +40 ({evt.merchant_id})")
-    ## TO DO - add more rules here for DeviceId, Phone, Card, IP address block List    
-    print("score_rules:", score, reasons)
+    extra = evt.extra if isinstance(evt.extra, dict) else {}
+    card = extra.get("card_id") or extra.get("card_number")
+    if memory.is_listed("CARD", card):
+        score += 40; reasons.append("Blacklisted card +40")
+    if memory.is_listed("DEVICE", evt.device_id):
+        score += 35; reasons.append(f"Blacklisted device +35 ({evt.device_id})")
+    if memory.is_listed("PHONE", extra.get("phone")):
+        score += 30; reasons.append("Blacklisted phone +30")
+    if memory.is_listed("IP", evt.ip):
+        score += 25; reasons.append(f"Blacklisted IP +25 ({evt.ip})")
+    log.debug("score_rules", extra={"event_id": evt.event_id, "score": score, "reasons": reasons})
     return score, reasons
 
-def decide(p: PerceivedEvent, memory: MemoryStore) -> DecisionOutcome:
-    score, reasons = score_rules(p, memory)
-    # Optional LLM delta
-    delta, rationale = llm_adjustment(p)
-    print("decide: llm_adjustment returned:", delta, rationale)
+def rule_score(p: PerceivedEvent, memory: MemoryStore) -> Tuple[float, List[str], List[Dict[str, Any]]]:
+    """score_rules plus its hits, computed once per event under a LookupContext."""
+    def _score():
+        hits: List[Dict[str, Any]] = []
+        score, reasons = score_rules(p, memory, hits)
+        return score, reasons, hits
+    score, reasons, hits = memoized(memory, "score_rules", p.event.event_id, _score)
+    # callers append to reasons; keep the memoized copy intact
+    return score, list(reasons), list(hits)
+
+def final_action(score: float, expected_action: Optional[str]) -> str:
+    action = expected_action if expected_action else "ALLOW"
+    if score >= config.BLOCK_THRESHOLD:
+        action = "BLOCK"
+    elif score >= config.CHALLENGE_THRESHOLD and action != "BLOCK":
+        action = "CHALLENGE"
+    return action
+
+def apply_llm(score: float, reasons: List[str], adjustment: Tuple[float, str], plan: Dict[str, Any]) -> Tuple[float, str]:
+    """Fold an LLM delta and plan into the rule score; appends to reasons, returns (score, action)."""
+    delta, rationale = adjustment
     if delta:
         score += delta
         reasons.append(f"LLM adjustment +{delta:.1f}: {rationale}")
-    # Get LLM tool-workflow plan (S10-style)
-    print("decide: calling plan_workflow")
-    plan = plan_workflow(p)
-    print("decide: got plan", plan.get('workflow'),plan.get('expected_action'))
-
+    log.debug("apply_llm", extra={"delta": delta, "rationale": rationale, "expected_action": plan.get('expected_action'),
+                                  "steps": len(plan.get('workflow') or [])})
     if plan and plan.get('workflow'):
         reasons.append(f"LLM plan expected_action={plan.get('expected_action')} :: steps={len(plan.get('workflow',[]))}")
-    print(" --------------------------------------------------")
-    print("decide: got plan Workflow", plan.get('workflow'))
-    print(" --------------------------------------------------")
+    return score, final_action(score, plan.get('expected_action'))
 
-    action = plan.get('expected_action') if plan.get('expected_action') else "ALLOW"
-    if score >= config.BLOCK_THRESHOLD:
-        action = "BLOCK"
-    elif score >= config.CHALLENGE_THRESHOLD and action != "BLOCK":
-        action = "CHALLENGE"
+def decide(p: PerceivedEvent, memory: MemoryStore) -> DecisionOutcome:
+    with span("score_rules"):
+        score, reasons, hits = rule_score(p, memory)
+    if get_llm_lane() is not None:
+        # rules-only decision now; the LLM lane reviews it after dispatch
+        # (see llm_lane.review_later) and may publish an amended revision
+        score, action = apply_llm(score, reasons, (0.0, "deferred"), empty_plan("LLM deferred to async lane"))
+    else:
+        # Optional LLM delta and tool-workflow plan (S10-style); both calls are
+        # gated on the rule score and run concurrently under the LLM timeout
+        with span("llm"):
+            adjustment = llm_adjustment_async(p, score)
+            planned = plan_workflow_async(p, score)
+            # both resolve by the client's own timeout; this only guards against a stuck future
+            deadline = time.monotonic() + 2 * config.LLM_TIMEOUT_MS / 1000.0
+            try:
+                adjusted = adjustment.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                adjusted = (0.0, f"LLM error: {e}")
+            try:
+                plan = planned.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                plan = empty_plan(f"LLM plan unavailable ({e}); returning empty plan")
+        score, action = apply_llm(score, reasons, adjusted, plan)
     return DecisionOutcome(
         decision_id=str(uuid4()),
         event_id=p.event.event_id,
         action=action,
         risk_score=round(score, 2),
         reasons=reasons,
-        created_at=datetime.utcnow() 
+        created_at=datetime.utcnow(),
+        rule_hits=hits,
+        channel=p.event.channel,
     )
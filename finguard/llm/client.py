@@ -0,0 +1,280 @@
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from ..utils.schemas import PerceivedEvent
+from ..config import settings as config
+from ..utils import metrics
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+class LLMTimeout(TimeoutError):
+    pass
+
+class LLMOverloaded(RuntimeError):
+    pass
+
+class _Deadlines:
+    """One daemon thread running callbacks at their deadlines; replaces a Timer thread per call."""
+    def __init__(self):
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="finguard-llm-timeouts", daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay_sec: float, fn: Callable[[], None]) -> list:
+        entry = [time.monotonic() + delay_sec, next(self._seq), fn]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry: list):
+        # left in the heap and skipped when due
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                fn = heapq.heappop(self._heap)[2]
+            if fn is not None:
+                try:
+                    fn()
+                except Exception:
+                    log.exception("LLM deadline callback failed")
+
+class ResponseCache:
+    """TTL + LRU cache of parsed LLM responses."""
+    def __init__(self, max_entries: int = 10_000, ttl_sec: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, item[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+def _bucket(value: Any) -> Any:
+    # numbers go to quarter-octave buckets (~19% wide) so near-identical events share an entry
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        if value == 0:
+            return 0
+        return math.copysign(round(math.log2(abs(value)) * 4) / 4, value)
+    return None
+
+def feature_key(p: PerceivedEvent) -> str:
+    """Canonical, bucketed view of an event's features (plus channel/MCC/hour) as a cache key."""
+    evt = p.event
+    canon = {k: _bucket(v) for k, v in sorted(p.features.items()) if _bucket(v) is not None}
+    canon["_channel"] = (evt.channel or "").upper()
+    canon["_mcc"] = (evt.mcc or "").strip()
+    canon["_hour"] = evt.timestamp.hour
+    return hashlib.sha1(json.dumps(canon, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def in_gray_zone(score: Optional[float]) -> bool:
+    """
+    True when CHALLENGE_THRESHOLD <= score < BLOCK_THRESHOLD, i.e. the rule
+    score alone challenges but does not block. Always True when `score` is
+    None or LLM_GRAY_ZONE_ONLY is off.
+    """
+    if score is None or not config.LLM_GRAY_ZONE_ONLY:
+        return True
+    return config.CHALLENGE_THRESHOLD <= score < config.BLOCK_THRESHOLD
+
+class GeminiProvider:
+    """One google-genai client for the process; stateless generate_content calls reuse its connections."""
+    def __init__(self, model: str):
+        from google import genai
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise RuntimeError("GOOGLE_API_KEY not set")
+        self.model = model
+        self._client = genai.Client(api_key=api_key)
+
+    def generate(self, kind: str, system: str, prompt: str, temperature: float) -> str:
+        resp = self._client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config={"system_instruction": system, "temperature": temperature},
+        )
+        return resp.text
+
+class StubProvider:
+    """Offline provider: canned JSON per call kind after FINGUARD_LLM_STUB_LATENCY_MS."""
+    RESPONSES = {
+        "adjust": {"delta": 0.0, "rationale": "stub"},
+        "plan": {"workflow": [], "expected_action": "ALLOW", "rationale": "stub"},
+    }
+
+    def __init__(self, latency_ms: int = 0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def generate(self, kind: str, system: str, prompt: str, temperature: float) -> str:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return json.dumps(self.RESPONSES.get(kind, {}))
+
+class LLMClient:
+    """
+    Shared entry point for remote LLM calls. Calls run on a bounded pool;
+    the caller gets a Future that resolves to parse(text), to the cached
+    parsed value for the same (kind, key), or to fallback(exc) on error,
+    once `timeout_ms` has passed, or at once when `max_pending` calls are
+    already admitted. It always resolves: if fallback itself raises, the
+    Future carries that exception. A response that arrives after its caller
+    timed out is still cached.
+    """
+    def __init__(self, provider: Any, timeout_ms: int = 1500, max_concurrency: int = 8,
+                 cache: Optional[ResponseCache] = None, max_pending: int = 64):
+        self.provider = provider
+        self.timeout_sec = timeout_ms / 1000.0
+        self.max_pending = max(max_pending, max_concurrency)
+        self.cache = cache if cache is not None else ResponseCache()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="finguard-llm")
+        # released when the provider call returns, so timed-out calls still count until then
+        self._admitted = threading.BoundedSemaphore(self.max_pending)
+        self._deadlines = _Deadlines()
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def call_async(self, kind: str, key: Optional[Hashable], system: str, prompt: str,
+                   parse: Callable[[str], Any], fallback: Callable[[Exception], Any],
+                   temperature: float = 0.2) -> Future:
+        out: Future = Future()
+        cache_key = (kind, key) if key is not None else None
+        if cache_key is not None:
+            hit, value = self.cache.get(cache_key)
+            if hit:
+                metrics.LLM_CALLS.inc(kind, "cache_hit")
+                out.set_result(value)
+                return out
+
+        def _resolve(value: Any = None, exc: Optional[Exception] = None):
+            # first of response / timeout wins
+            if out.done():
+                return
+            try:
+                result = value if exc is None else fallback(exc)
+            except Exception as e:
+                log.warning("LLM fallback failed", extra={"kind": kind, "error": str(e)})
+                try:
+                    out.set_exception(e)
+                except InvalidStateError:
+                    pass
+                return
+            try:
+                out.set_result(result)
+            except InvalidStateError:
+                pass
+
+        if not self._admitted.acquire(blocking=False):
+            self.rejected += 1
+            metrics.LLM_CALLS.inc(kind, "rejected")
+            _resolve(exc=LLMOverloaded(f"{kind}: {self.max_pending} LLM calls already pending"))
+            return out
+
+        def _call() -> Any:
+            t0 = time.perf_counter()
+            text = self.provider.generate(kind, system, prompt, temperature)
+            metrics.LLM_SECONDS.observe(time.perf_counter() - t0, kind)
+            value = parse(text)
+            if cache_key is not None:
+                self.cache.put(cache_key, value)
+            return value
+
+        def _done(f: Future):
+            self._admitted.release()
+            self._deadlines.cancel(deadline)
+            exc = f.exception()
+            if exc is not None:
+                self.errors += 1
+                metrics.LLM_CALLS.inc(kind, "error")
+                log.warning("LLM call failed", extra={"kind": kind, "error": str(exc)})
+            elif not out.done():
+                metrics.LLM_CALLS.inc(kind, "ok")
+            _resolve(f.result() if exc is None else None, exc)
+
+        def _expire():
+            if not out.done():
+                self.timeouts += 1
+                metrics.LLM_CALLS.inc(kind, "timeout")
+            _resolve(exc=LLMTimeout(f"{kind} exceeded {self.timeout_sec * 1000:.0f} ms"))
+
+        self.calls += 1
+        deadline = self._deadlines.schedule(self.timeout_sec, _expire)
+        try:
+            self._pool.submit(_call).add_done_callback(_done)
+        except Exception as e:
+            self._admitted.release()
+            self._deadlines.cancel(deadline)
+            _resolve(exc=e)
+        return out
+
+    def call(self, *args, **kwargs) -> Any:
+        return self.call_async(*args, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "timeouts": self.timeouts, "errors": self.errors, "rejected": self.rejected,
+                "cache_hits": self.cache.hits, "cache_misses": self.cache.misses, "cache_size": len(self.cache)}
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> Optional[LLMClient]:
+    """Process-wide client for FINGUARD_LLM_PROVIDER, or None when the LLM is off or local-only."""
+    global _client
+    if not config.LLM_ENABLED or config.LLM_PROVIDER not in ("gemini", "stub"):
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if config.LLM_PROVIDER == "gemini":
+                    provider = GeminiProvider(config.LLM_MODEL)
+                else:
+                    provider = StubProvider(config.LLM_STUB_LATENCY_MS)
+                _client = LLMClient(provider, config.LLM_TIMEOUT_MS, config.LLM_MAX_CONCURRENCY,
+                                    ResponseCache(config.LLM_CACHE_SIZE, config.LLM_CACHE_TTL_SEC),
+                                    config.LLM_MAX_PENDING)
+    return _client
@@ -1,7 +1,9 @@
-import os, json, re
-from typing import Dict, Any, List, Tuple
+import json
+from concurrent.futures import Future
+from typing import Dict, Any, Optional
 from ..utils.schemas import PerceivedEvent
-from google import genai
+from ..config import settings as config
+from .client import get_llm_client, feature_key, in_gray_zone
 
 TOOLS_SPEC = [
     {"name":"recent_events", "desc":"Fetch account's recent events from Oracle for velocity features", "args":{"account_id":"str","window_sec":"int"}},
@@ -30,106 +32,101 @@ Rules:
 - Keep arguments concise and serializable.
 """
 
-def _gemini_call(prompt: str) -> str:
-    """Try calling Google Gemini (generative AI). If the gemini client is not
-    available or fails, raise the exception to let caller decide to fallback.
-    This wrapper attempts a few common SDK shapes; it's defensive because
-    users may not have the library installed in every environment.
-    """
-    try:
-        # prefer the official google generative ai client if present
-        api_key = os.getenv("GOOGLE_API_KEY")
-        print("Gemini API key:", "set" if os.getenv("GOOGLE_API_KEY") else "NOT set")
+# Event identifiers that a cached plan is re-bound to for the next event with the same features
+_BOUND_FIELDS = ("event_id", "account_id", "device_id", "merchant_id")
 
-        # Latest google generative SDK exposes genai.configure(api_key=...)
-        # Call it directly when provided; let exceptions propagate to the
-        # outer try so the caller can fallback to OpenAI or mock.
-        if api_key:
-            client = genai.Client(api_key=api_key)
+def _template(value: Any, p: PerceivedEvent) -> Any:
+    ids = {getattr(p.event, f): "${%s}" % f for f in _BOUND_FIELDS if getattr(p.event, f)}
+    def walk(v):
+        if isinstance(v, dict):
+            return {k: walk(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [walk(x) for x in v]
+        if isinstance(v, str):
+            return ids.get(v, v)
+        return v
+    return walk(value)
 
-            model = os.getenv("FINGUARD_LLM_MODEL", "gemini-1.5-flash")
-            print("gemini_call: using model", model)
-        # try chat-style API first
-         #if hasattr(genai, "chat") and hasattr(genai.chat, "create"):
-            #SYSTEM_INSTRUCTIONS = "You are a helpful assistant with access to the following tools: {tools}"
+def _bind(value: Any, p: PerceivedEvent) -> Any:
+    ids = {"${%s}" % f: getattr(p.event, f) for f in _BOUND_FIELDS}
+    def walk(v):
+        if isinstance(v, dict):
+            return {k: (p.features if k == "features" and isinstance(x, dict) else walk(x)) for k, x in v.items()}
+        if isinstance(v, list):
+            return [walk(x) for x in v]
+        if isinstance(v, str):
+            return ids.get(v, v)
+        return v
+    return walk(value)
 
-            chat = client.chats.create(
-            model=model,
-            config={
-                "system_instruction": SYSTEM_INSTRUCTIONS.format(
-                    tools=json.dumps(TOOLS_SPEC, indent=2)
-                ),
-                 "temperature": 0.1
-                    }
-            )
-            print("Gemini chat created with model:", model)
-            resp = chat.send_message(prompt)
-            print("Gemini chat response11:", resp)
-             
-            return resp.candidates[0].content.parts[0].text
+def deterministic_plan(p: PerceivedEvent, rationale: str = "LLM disabled; deterministic plan") -> Dict[str, Any]:
+    expected = "ALLOW"
+    if p.features.get("amount",0) >= 100000 or p.features.get("geo_velocity_km_per_min",0)>=50:
+        expected = "CHALLENGE"
+    plan = [
+        {"tool":"recent_events","args":{"account_id":p.event.account_id,"window_sec":60}},
+        {"tool":"device_seen","args":{"account_id":p.event.account_id,"device_id":p.event.device_id or ""}},
+        {"tool":"merchant_blacklist","args":{"merchant_id":p.event.merchant_id or ""}},
+        {"tool":"score_rules","args":{"features":p.features}},
+        {"tool":"persist_decision","args":{"event_id":p.event.event_id,"action":expected,"risk_score":0.0,"reasons":["mock-plan"]}},
+        {"tool":"publish_kafka","args":{"topic":"finguard.decisions","key":p.event.event_id,"value":{"event_id":p.event.event_id,"action":expected}}},
+    ]
+    if expected in ("CHALLENGE","BLOCK"):
+        plan.append({"tool":"create_alert","args":{"severity":"MEDIUM" if expected=="CHALLENGE" else "HIGH","title":f"Decision: {expected}","description":"mock-plan","event_id":p.event.event_id,"tags":["fraud","decision"]}})
+        plan.append({"tool":"publish_kafka","args":{"topic":"finguard.alerts","key":p.event.event_id,"value":{"event_id":p.event.event_id,"severity":"MEDIUM" if expected=="CHALLENGE" else "HIGH"}}})
+    return {"workflow": plan, "expected_action": expected, "rationale": rationale}
 
+def empty_plan(rationale: str) -> Dict[str, Any]:
+    """Plan used when the LLM is enabled but gives no answer; leaves the action to the rule score."""
+    return {"workflow": [], "expected_action": "ALLOW", "rationale": rationale}
 
-    except Exception as e:
-        # raise to allow the caller to fallback to OpenAI or mock
-        import traceback
-        traceback.print_exc()
-        
+def _parse_plan(text: str) -> Dict[str, Any]:
+    # strip markdown code fences (```json ... ```) around the JSON
+    plan = json.loads((text or "").strip('` \njson'))
+    if not isinstance(plan, dict) or "workflow" not in plan:
+        raise ValueError("plan JSON missing 'workflow'")
+    return plan
 
- 
+def plan_workflow_async(p: PerceivedEvent, score: Optional[float] = None) -> Future:
+    """
+    Future of the plan dict (workflow, expected_action, rationale). The LLM
+    is only asked when enabled and the rule `score` is in the gray zone.
+    With the LLM disabled the deterministic plan is used; when it is enabled
+    but not asked (no remote provider, score outside the gray zone) or it
+    times out or errors, an empty ALLOW plan is used so the rule score alone
+    sets the action.
+    Plans are cached per bucketed feature vector with event identifiers
+    templated out and re-bound to `p` on a hit.
+    """
+    out: Future = Future()
+    if not config.LLM_ENABLED:
+        out.set_result(deterministic_plan(p))
+        return out
+    client = get_llm_client()
+    if client is None:
+        out.set_result(empty_plan("Unknown provider; returning empty plan"))
+        return out
+    if not in_gray_zone(score):
+        out.set_result(empty_plan("LLM skipped (outside gray zone); returning empty plan"))
+        return out
+    user_prompt = f"""Produce a tool workflow for this transaction.\nFeatures: {json.dumps(p.features, default=str)}\nEvent: {p.event.dict()}"""
+    system = SYSTEM_INSTRUCTIONS.format(tools=json.dumps(TOOLS_SPEC, indent=2))
+    templated = client.call_async("plan", feature_key(p), system, user_prompt,
+                                  lambda text: _template(_parse_plan(text), p),
+                                  lambda e: empty_plan(f"LLM plan unavailable ({e}); returning empty plan"),
+                                  temperature=0.1)
 
+    def _bound(f: Future):
+        # `out` must resolve even if the fallback raised or the plan cannot be bound to `p`
+        try:
+            out.set_result(_bind(f.result(), p))
+        except Exception as e:
+            out.set_result(empty_plan(f"LLM plan unavailable ({e}); returning empty plan"))
+    templated.add_done_callback(_bound)
+    return out
 
-def plan_workflow(p: PerceivedEvent) -> Dict[str, Any]:
+def plan_workflow(p: PerceivedEvent, score: Optional[float] = None) -> Dict[str, Any]:
     """
     Returns a dict with keys: workflow, expected_action, rationale
     """
-    enable = os.getenv("FINGUARD_LLM_ENABLED","false").lower() in ("1","true","yes")
-    provider = os.getenv("FINGUARD_LLM_PROVIDER","mock").lower()
-    if not enable:
-        # deterministic fallback mini-plan
-        expected = "ALLOW"
-        if p.features.get("amount",0) >= 100000 or p.features.get("geo_velocity_km_per_min",0)>=50:
-            expected = "CHALLENGE"
-        plan = [
-            {"tool":"recent_events","args":{"account_id":p.event.account_id,"window_sec":60}},
-            {"tool":"device_seen","args":{"account_id":p.event.account_id,"device_id":p.event.device_id or ""}},
-            {"tool":"merchant_blacklist","args":{"merchant_id":p.event.merchant_id or ""}},
-            {"tool":"score_rules","args":{"features":p.features}},
-            {"tool":"persist_decision","args":{"event_id":p.event.event_id,"action":expected,"risk_score":0.0,"reasons":["mock-plan"]}},
-            {"tool":"publish_kafka","args":{"topic":"finguard.decisions","key":p.event.event_id,"value":{"event_id":p.event.event_id,"action":expected}}},
-        ]
-        if expected in ("CHALLENGE","BLOCK"):
-            plan.append({"tool":"create_alert","args":{"severity":"MEDIUM" if expected=="CHALLENGE" else "HIGH","title":f"Decision: {expected}","description":"mock-plan","event_id":p.event.event_id,"tags":["fraud","decision"]}})
-            plan.append({"tool":"publish_kafka","args":{"topic":"finguard.alerts","key":p.event.event_id,"value":{"event_id":p.event.event_id,"severity":"MEDIUM" if expected=="CHALLENGE" else "HIGH"}}})
-        return {"workflow": plan, "expected_action": expected, "rationale": "LLM disabled; deterministic plan"}
-    print("plan_workflow: LLM enabled, provider=", provider)
-    if provider == "gemini":
-        user_prompt = f"""Produce a tool workflow for this transaction.\nFeatures: {json.dumps(p.features, default=str)}\nEvent: {p.event.dict()}"""
-        try:
-            content = _gemini_call(user_prompt)
-            print("plan_workflow Gemini response:")
-            json_string = content
-            print("plan_workflow Gemini json_string ****:", json_string) 
-
-            # 2. Clean the string by removing the markdown code block fences (```json and ```)
-            # The strip() method removes leading/trailing whitespace
-            cleaned_json_string = json_string.strip('` \njson')
-            # 3. Parse the cleaned JSON string into a Python dictionary
-            parsed_json = json.loads(cleaned_json_string)
-            print("plan_workflow Gemini parsed_json:", parsed_json)
-            # 4. Now you can access the data just like you would with any dictionary
-            print("Workflow:", parsed_json['workflow'])
-            print("Expected Action:", parsed_json['expected_action'])
-            print("Rationale:", parsed_json['rationale'])
-
-            # Example of accessing a nested value
-            print("Tool from the first workflow step:", parsed_json['workflow'][0]['tool'])            
- 
- 
-            return parsed_json
-
-        except Exception:
-            import traceback   
-            traceback.print_exc() 
-            return {"workflow": [], "expected_action": "ALLOW", "rationale": f"Parse error: {e}"}
-    # mock provider same as disabled
-    return {"workflow": [], "expected_action": "ALLOW", "rationale": "Unknown provider; returning empty plan"}
+    return plan_workflow_async(p, score).result()
@@ -0,0 +1,181 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from ..utils import dao
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+def _utc_naive(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        return None
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def _bucket(score: float) -> int:
+    return max(0, min(9, int((score or 0) // 10)))
+
+class DashboardRollups:
+    """
+    Incrementally maintained aggregates behind the /api dashboard endpoints,
+    so reads are served from memory instead of scanning Oracle per request:
+
+    - the newest `latest_size` transactions (ordered by event time, event_id)
+      with their latest decision; a live row's `created_at` is taken from
+      its first decision, which is persisted with or just after it;
+    - transaction counts per channel and model-score histogram (10 buckets);
+    - notification status counts and the mv_daily_risk_rollup rows.
+
+    Transactions, decisions and notification status changes are fed from the
+    Kafka topics (`observe`), model scores from decisions that carry one and
+    from the scoring tools. `reconcile` re-seeds the counters from aggregate
+    queries (run every DASHBOARD_RECONCILE_SEC) and records how far the live
+    counts drifted.
+    """
+    def __init__(self, latest_size: int = 500):
+        self.latest_size = latest_size
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[datetime, str]] = []
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self.channels: Dict[str, int] = {}
+        self.score_buckets = [0] * 10
+        self.notifications: Dict[str, int] = {}
+        self.daily: List[Dict[str, Any]] = []
+        self.reconciled_at: Optional[float] = None
+        self._seeded = False
+        self.drift: Dict[str, int] = {}
+        self._timer: Optional[threading.Thread] = None
+
+    # --- incremental feed ------------------------------------------------------
+    def observe(self, topic_kind: str, msg: Dict[str, Any]):
+        if topic_kind == "transaction":
+            self.observe_transaction(msg)
+        elif topic_kind == "decision":
+            self.observe_decision(msg)
+        elif topic_kind == "notification":
+            self.observe_notification(msg)
+
+    def observe_transaction(self, evt: Dict[str, Any]):
+        ts = _utc_naive(evt.get("timestamp"))
+        event_id = evt.get("event_id")
+        if ts is None or not event_id:
+            return
+        with self._lock:
+            channel = evt.get("channel")
+            self.channels[channel] = self.channels.get(channel, 0) + 1
+            self._remember(ts, event_id, {"event_id": event_id, "amount": evt.get("amount"), "channel": channel,
+                                          "status": None, "risk_score": None, "event_ts": ts, "created_at": None})
+
+    def _remember(self, ts: datetime, event_id: str, row: Dict[str, Any]):
+        # caller holds the lock; keeps the newest latest_size rows in (ts, event_id) order
+        if event_id in self._latest:
+            return
+        key = (ts, event_id)
+        if len(self._keys) >= self.latest_size and key < self._keys[0]:
+            return
+        bisect.insort(self._keys, key)
+        self._latest[event_id] = row
+        while len(self._keys) > self.latest_size:
+            _, old = self._keys.pop(0)
+            self._latest.pop(old, None)
+
+    def observe_decision(self, dec: Dict[str, Any]):
+        with self._lock:
+            row = self._latest.get(dec.get("event_id"))
+            if row is not None:
+                row["status"] = dec.get("action")
+                row["risk_score"] = dec.get("risk_score")
+                if row.get("created_at") is None:
+                    row["created_at"] = _utc_naive(dec.get("created_at"))
+            score = dec.get("model_score")
+            # a revision re-announces an already counted score
+            if score is not None and not dec.get("revision"):
+                self.score_buckets[_bucket(float(score))] += 1
+
+    def observe_notification(self, msg: Dict[str, Any]):
+        # a status change moves one notification between counters; a new one has no previous_status
+        status = (msg.get("status") or "").upper()
+        previous = (msg.get("previous_status") or "").upper()
+        if not status or status == previous:
+            return
+        with self._lock:
+            if previous and self.notifications.get(previous, 0) > 0:
+                self.notifications[previous] -= 1
+            self.notifications[status] = self.notifications.get(status, 0) + 1
+
+    def observe_scores(self, scores: List[float]):
+        with self._lock:
+            for s in scores:
+                self.score_buckets[_bucket(float(s))] += 1
+
+    # --- reads ---------------------------------------------------------------
+    def latest(self, limit: int, before: Optional[Tuple[datetime, str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Up to `limit` newest rows older than `before`; None when the ring
+        cannot answer (it does not reach back far enough) and the caller must
+        page in Oracle.
+        """
+        with self._lock:
+            end = len(self._keys) if before is None else bisect.bisect_left(self._keys, before)
+            start = max(0, end - limit)
+            if end - start < limit and (not self._seeded or len(self._keys) >= self.latest_size):
+                # the page runs past the oldest row we hold (or we have not loaded history yet)
+                return None
+            return [dict(self._latest[eid]) for _, eid in reversed(self._keys[start:end])]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "buckets": list(self.score_buckets),
+                "channels": dict(self.channels),
+                "notifications": dict(self.notifications),
+                "latest_rows": len(self._keys),
+                "reconciled_at": self.reconciled_at,
+                "drift": dict(self.drift),
+            }
+
+    # --- reconciliation ------------------------------------------------------
+    def seed_latest(self):
+        """Load the newest rows from Oracle; live rows already observed take precedence."""
+        rows = dao.latest_transactions(self.latest_size)
+        with self._lock:
+            for r in rows:
+                ts = _utc_naive(r["event_ts"])
+                if ts is not None:
+                    self._remember(ts, r["event_id"], {**r, "event_ts": ts, "created_at": _utc_naive(r.get("created_at"))})
+            self._seeded = True
+
+    def reconcile(self):
+        buckets = dao.model_score_histogram()
+        channels = dao.channel_counts()
+        notifications = dao.notification_status_counts()
+        daily = dao.daily_risk_rollup()
+        with self._lock:
+            if self.reconciled_at is not None:
+                self.drift = {
+                    "transactions": sum(self.channels.values()) - sum(channels.values()),
+                    "scores": sum(self.score_buckets) - sum(buckets),
+                    "notifications": sum(self.notifications.values()) - sum(notifications.values()),
+                }
+            self.score_buckets, self.channels = buckets, channels
+            self.notifications, self.daily = notifications, daily
+            self.reconciled_at = time.time()
+
+    def start(self, interval_sec: float):
+        def _loop():
+            try:
+                self.seed_latest()
+            except Exception as e:
+                log.warning("seeding latest transactions failed", extra={"error": str(e)})
+            while True:
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    log.warning("rollup reconcile failed", extra={"error": str(e)})
+                time.sleep(interval_sec)
+        if self._timer is None:
+            self._timer = threading.Thread(target=_loop, name="finguard-dashboard-rollups", daemon=True)
+            self._timer.start()
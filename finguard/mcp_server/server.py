@@ -1,14 +1,64 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from fastapi.encoders import jsonable_encoder
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 import json
+import time
 import asyncio
-from ..utils.kafka_bus import KafkaBus
+import threading
+import anyio.to_thread
+from ..utils.kafka_bus import get_shared_bus, close_shared_bus
+from ..utils.db import set_role, warm_pool, pool_stats, tune_fetch
 from ..utils import dao
 from ..config import settings as config
+from .rollups import DashboardRollups
+from .stream import LiveStream, StreamFilter
+from ..utils import metrics
+from ..utils.log import get_logger
 
-app = FastAPI(title="FinGuard MCP Tool Server", version="1.0.0")
+log = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync (blocking oracledb) handlers run on anyio's thread pool; size it to
+    # the DB pool so requests queue here instead of inside pool.acquire()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = config.SERVER_THREADS
+    # One producer and one DB pool (sized for handlers, /decide and workflow threads; half of it opened
+    # up front) for the server's lifetime
+    set_role("server")
+    for name, warm in (("Oracle pool", warm_pool), ("Kafka producer", get_shared_bus)):
+        try:
+            warm()
+        except Exception as e:
+            log.warning("not ready at startup", extra={"component": name, "error": str(e)})
+    # dashboard rollups: seeded from Oracle, then kept current from the topics
+    rollups.start(config.DASHBOARD_RECONCILE_SEC)
+    # one subscription feeds both the rollups and the live SSE ring, however many clients connect
+    live.bind(asyncio.get_running_loop())
+    try:
+        get_shared_bus().follow(list(_FOLLOWED), _on_message, name="finguard-server-follow")
+    except Exception as e:
+        log.warning("dashboard rollups will only refresh on reconcile, live stream is idle", extra={"error": str(e)})
+    # warm the /decide caches in the background so startup is not blocked on them
+    threading.Thread(target=_get_decider, name="finguard-decide-warm", daemon=True).start()
+    yield
+    close_shared_bus(timeout=10)
+
+rollups = DashboardRollups(config.DASHBOARD_LATEST_SIZE)
+live = LiveStream(config.STREAM_RING_SIZE)
+_FOLLOWED = {config.TRANSACTIONS_TOPIC: "transaction", config.DECISIONS_TOPIC: "decision",
+             config.ALERTS_TOPIC: "alert", config.NOTIFICATIONS_TOPIC: "notification"}
+
+def _on_message(topic: str, msg: Dict[str, Any]):
+    kind = _FOLLOWED[topic]
+    rollups.observe(kind, msg)
+    if kind in ("decision", "alert"):
+        live.publish(kind, msg)
+
+app = FastAPI(title="FinGuard MCP Tool Server", version="1.0.0", lifespan=lifespan)
 
 # Allow CORS from the React dev server during development
 app.add_middleware(
@@ -19,28 +69,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+HTTP_SECONDS = metrics.Histogram("finguard_http_seconds", "MCP server request latency (to response headers for streams).",
+                                 ("method", "route", "status"))
+STREAM_STATS = metrics.Gauge("finguard_stream", "Live stream ring and clients (clients, buffered, dropped).", ("stat",),
+                             fn=lambda: {(k,): live.stats()[k] for k in ("clients", "buffered", "dropped")})
+
+@app.middleware("http")
+async def _time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - t0, request.method, getattr(route, "path", "unmatched"), response.status_code)
+    return response
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/db/pool")
+def db_pool():
+    # sizing, occupancy and acquire wait times for capacity planning
+    return pool_stats()
+
+def _delivery(fut) -> "asyncio.Future":
+    """Awaitable for a kafka-python send future; resolved from the producer's I/O thread."""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def _set(setter, value):
+        if not done.done():
+            setter(value)
+    fut.add_callback(lambda md: loop.call_soon_threadsafe(_set, done.set_result, md))
+    fut.add_errback(lambda e: loop.call_soon_threadsafe(_set, done.set_exception, e))
+    return done
+
+def _send_events(events: List[Dict[str, Any]]) -> list:
+    """Queue events on the shared producer; blocks on connect, metadata and KAFKA_MAX_INFLIGHT, so runs off the loop."""
+    bus = get_shared_bus()
+    sent = []
+    for event in events:
+        try:
+            sent.append(bus.publish(config.TRANSACTIONS_TOPIC, value=event,
+                                    key=event.get("account_id") or event.get("user_id")))
+        except Exception as e:
+            sent.append(e)
+    return sent
+
+async def _publish_events(events: List[Dict[str, Any]]) -> List["asyncio.Future"]:
+    loop = asyncio.get_running_loop()
+    futs = []
+    for sent in await anyio.to_thread.run_sync(_send_events, events):
+        if isinstance(sent, Exception):
+            failed = loop.create_future()
+            failed.set_exception(sent)
+            futs.append(failed)
+        else:
+            futs.append(_delivery(sent))
+    return futs
+
 @app.post("/tools/ingest")
-def ingest_event(event: Dict[str, Any]):
-    # Push incoming transaction into Kafka ingestion topic
+async def ingest_event(event: Dict[str, Any]):
+    # Push incoming transaction into Kafka ingestion topic on the shared producer
     try:
-        bus = KafkaBus()
-        key = event.get("account_id") or event.get("user_id")
-        bus.publish(config.TRANSACTIONS_TOPIC, value=event, key=key)
+        await (await _publish_events([event]))[0]
         return {"status":"queued","topic":config.TRANSACTIONS_TOPIC}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/tools/ingest_batch")
+async def ingest_batch(request: Request):
+    """
+    Queue many transactions with one round of acknowledgements. Body: a JSON
+    array of events, {"events": [...]}, or NDJSON (one event per line).
+    """
+    body = (await request.body()).decode("utf-8")
+    try:
+        try:
+            events = json.loads(body)
+        except ValueError:
+            events = [json.loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Body must be a JSON array or NDJSON: {e}")
+    if isinstance(events, dict):
+        # {"events": [...]} or a single-line NDJSON body
+        events = events.get("events", [events])
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        raise HTTPException(status_code=400, detail="Every event must be a JSON object")
+    try:
+        futs = await _publish_events(events)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    results = await asyncio.gather(*futs, return_exceptions=True)
+    errors = [{"index": i, "error": str(r)} for i, r in enumerate(results) if isinstance(r, Exception)]
+    return {"status": "queued" if not errors else "partial", "topic": config.TRANSACTIONS_TOPIC,
+            "queued": len(events) - len(errors), "failed": len(errors), "errors": errors[:20]}
+
+_decider = None
+_decider_lock = threading.Lock()
+
+def _get_decider():
+    """InlineDecider over warm memory caches (same components as the consumer) and a write-behind writer."""
+    global _decider
+    if _decider is None:
+        with _decider_lock:
+            if _decider is None:
+                from ..app import _build_memory, _new_writer
+                from ..decision.realtime import InlineDecider
+                try:
+                    bus = get_shared_bus()
+                    writer = _new_writer()
+                    # the consumer owns fg_velocity_counters; this store only sees /decide traffic
+                    memory = _build_memory(bus, writer, checkpoint=False)
+                    decider = InlineDecider(memory, bus, writer, config.DECIDE_BUDGET_MS,
+                                            config.DECIDE_DEFAULT_ACTION, config.DECIDE_WORKERS)
+                    if config.DECIDE_FOLLOW_TRANSACTIONS:
+                        bus.follow([config.TRANSACTIONS_TOPIC], lambda topic, msg: decider.observe(msg),
+                                   name="finguard-decide-follow")
+                    _decider = decider
+                    # LLM client construction is slow; do it now rather than inside the first budget
+                    from ..decision.llm_lane import get_llm_lane
+                    get_llm_lane()
+                except Exception as e:
+                    log.warning("/decide not ready", extra={"error": str(e)})
+    return _decider
+
+@app.post("/decide")
+async def decide_now(event: Dict[str, Any]):
+    """
+    Inline authorization decision within FINGUARD_DECIDE_BUDGET_MS. Past the
+    budget the default action is returned with "degraded": true; the
+    decision is persisted and published to finguard.decisions asynchronously.
+    """
+    started = time.perf_counter()
+    # first call may still be warming caches; wait for that off the event loop
+    decider = _decider or await anyio.to_thread.run_sync(_get_decider)
+    if decider is None:
+        raise HTTPException(status_code=503, detail="decision pipeline unavailable")
+    try:
+        evt, fut = decider.submit(event)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        # shield: the evaluation keeps running past the budget and settles the degraded decision
+        await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout=decider.budget_sec)
+    except Exception:
+        pass
+    # persistence hand-off can block on a full writer queue
+    return await anyio.to_thread.run_sync(decider.complete, evt, fut, started)
+
+_SQL_DECISION = f"SELECT DECISION_ID, ACTION, RISK_SCORE, REASONS_JSON, CREATED_AT_UTC FROM {config.TBL_DECISIONS} WHERE EVENT_ID=:1 ORDER BY DECISION_ID DESC FETCH FIRST 1 ROWS ONLY"
+
 @app.get("/tools/decision/{event_id}")
 def get_decision(event_id: str):
     # Fetch a previously created decision by event_id
-    sql = f"SELECT DECISION_ID, ACTION, RISK_SCORE, REASONS_JSON, CREATED_AT_UTC FROM {config.TBL_DECISIONS} WHERE EVENT_ID=:1 FETCH FIRST 1 ROWS ONLY"
     with dao.get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [event_id])
+            tune_fetch(cur, 1)
+            cur.execute(_SQL_DECISION, [event_id])
             row = cur.fetchone()
             if not row:
                 raise HTTPException(status_code=404, detail="Not found")
@@ -55,9 +244,33 @@ def get_decision(event_id: str):
             return rec
 
 @app.post("/tools/blacklist")
-def blacklist(merchant_id: str, active: bool = True, reason: str = None):
-    dao.upsert_blacklist(merchant_id, 'Y' if active else 'N', reason)
-    return {"merchant_id": merchant_id, "active": active}
+def blacklist(merchant_id: str = None, active: bool = True, reason: str = None, type: str = "MERCHANT", value: str = None):
+    # type is one of MERCHANT, DEVICE, IP, CARD, PHONE; merchant_id is kept for existing callers
+    value = value or merchant_id
+    if not value:
+        raise HTTPException(status_code=400, detail="value (or merchant_id) is required")
+    bl_type = type.upper()
+    dao.upsert_blacklist(value, 'Y' if active else 'N', reason, bl_type=bl_type)
+    # Push the change so consumer snapshots apply it without waiting for their next refresh
+    try:
+        get_shared_bus().publish(config.BLACKLIST_TOPIC, value={"type": bl_type, "value": value, "active": active}, key=f"{bl_type}:{value}")
+    except Exception as e:
+        log.warning("blacklist push failed", extra={"topic": config.BLACKLIST_TOPIC, "error": str(e)})
+    return {"type": bl_type, "value": value, "merchant_id": value if bl_type == "MERCHANT" else None, "active": active}
+
+@app.post("/tools/dlq/replay")
+def dlq_replay(max_records: int = 500, timeout_sec: float = 10.0):
+    """
+    Re-run up to `max_records` dead-lettered events through the consumer's
+    handle_event once the cause is fixed; events that fail again return to the
+    DLQ with the new error. Returns read/replayed/failed counts.
+    """
+    from ..app import handle_event
+    from ..memory.oracle_store import OracleMemoryStore
+    from ..utils.retry import replay_dlq
+    bus = get_shared_bus()
+    memory = OracleMemoryStore()
+    return replay_dlq(bus, lambda evt: handle_event(evt, memory, bus), max_records=max_records, timeout_sec=timeout_sec)
 
 @app.get("/stream/heartbeat")
 async def stream_heartbeat():
@@ -70,9 +283,60 @@ async def stream_heartbeat():
             await asyncio.sleep(1.0)
     return StreamingResponse(eventgen(), media_type="text/event-stream")
 
+@app.get("/stream/live")
+async def stream_live(request: Request, kinds: str = None, action: str = None, min_risk: float = None,
+                      channel: str = None, last_event_id: int = None):
+    """
+    Live decisions and alerts as SSE, filtered server-side (`kinds`=decision,alert;
+    `action`=BLOCK,CHALLENGE; `min_risk`; `channel`=UPI,CARD). Resumes after the
+    Last-Event-ID header (or `last_event_id`); a client that falls a whole ring
+    behind is sent `event: dropped` and disconnected.
+    """
+    header = request.headers.get("last-event-id")
+    if header is not None:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            last_event_id = None
+    filt = StreamFilter(kinds, action, min_risk, channel)
+    cursor, missed = live.resume_from(last_event_id)
+
+    async def eventgen():
+        nonlocal cursor
+        live.clients += 1
+        try:
+            yield "retry: 2000\n\n"
+            if missed:
+                yield f"event: gap\ndata: {json.dumps({'resumed_from': cursor})}\n\n"
+            while True:
+                changed = live.changed
+                entries, cursor = live.read(cursor)
+                if entries is None:
+                    live.dropped += 1
+                    yield f"event: dropped\ndata: {json.dumps({'last_event_id': cursor})}\n\n"
+                    return
+                chunk = "".join(f"id: {e[0]}\nevent: {e[1]}\ndata: {e[5]}\n\n" for e in entries if filt.match(e))
+                if chunk:
+                    yield chunk
+                if entries:
+                    continue
+                if await request.is_disconnected():
+                    return
+                if not await live.wait(config.STREAM_KEEPALIVE_SEC, changed):
+                    yield ": keepalive\n\n"
+        finally:
+            live.clients -= 1
+    return StreamingResponse(eventgen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/stats")
+def stream_stats():
+    return live.stats()
+
 from ..utils.schemas import TransactionEvent
 from ..perception.features import perceive
 from ..memory.oracle_store import OracleMemoryStore as MemoryStore
+from ..memory.context import LookupContext as _LookupContext
 from ..llm.planner import plan_workflow as _plan_workflow
 from ..orchestrator.executor import exec_workflow as _exec_workflow
 from ..utils import dao as _dao
@@ -84,21 +348,28 @@ def plan(event: dict):
     """
     Return an LLM-generated tool workflow for a given event (S10-style).
     """
-    memory = MemoryStore()
     evt = TransactionEvent(**event)
-    p = perceive(evt, memory)
+    p = perceive(evt, _LookupContext.for_event(evt, MemoryStore()))
     plan = _plan_workflow(p)
     return JSONResponse(plan)
 
 @app.post("/execute")
 def execute(plan: dict):
     """
-    Execute a tool workflow plan server-side (optional convenience).
+    Execute a tool workflow plan server-side (optional convenience). With
+    the planned "event" in the body, windowed reads use its timestamp; the
+    workflow's read steps share one LookupContext either way.
     """
-    result = _exec_workflow(plan)
+    event = plan.get("event")
+    if event:
+        ctx = _LookupContext.for_event(TransactionEvent(**event), MemoryStore())
+    else:
+        ctx = _LookupContext(MemoryStore())
+    result = _exec_workflow(plan, ctx=ctx)
     return JSONResponse(result)
 
-from ..tools.ml_model_tool import score_transaction as _ml_score_transaction
+from ..tools.ml_model_tool import score_transaction as _ml_score_transaction, score_batch as _ml_score_batch
+from ..tools.model_runtime import model_features as _model_features
 from ..tools.risk_score_tool import combine_scores as _combine_scores
 from ..perception.features import perceive
 from ..memory.oracle_store import OracleMemoryStore as _Memory
@@ -109,11 +380,45 @@ def ml_score(payload: dict):
     """
     Run ML model inference for a perceived event and persist model score.
     Expects: {"event": {...}, "features": {...}, "model_name": "gbm_txn", "threshold": 75.0}
+    The returned "record" is the row just written, not read back.
     """
     model_name = payload.get("model_name") or "gbm_txn"
     threshold = float(payload.get("threshold") or 75.0)
     evt = TransactionEvent(**payload["event"])
-    res = _ml_score_transaction(evt.event_id, payload["features"], model_name=model_name, threshold=threshold)
+    ctx = _LookupContext.for_event(evt, _Memory())
+    res = _ml_score_transaction(evt.event_id, payload["features"], model_name=model_name, threshold=threshold,
+                                ctx=ctx)
+    rollups.observe_scores([res["risk_score"]])
+    return res
+
+@app.get("/tools/models")
+def models():
+    """Models loaded by the registry: active model_id, version, artifact and load time."""
+    from ..tools.model_registry import get_model_registry
+    return {"models": get_model_registry().snapshot()}
+
+@app.post("/tools/models/{model_name}/reload")
+def reload_model(model_name: str):
+    """Re-read the active version now instead of waiting for the next poll (e.g. right after a promotion)."""
+    from ..tools.model_registry import get_model_registry
+    registry = get_model_registry()
+    swapped = registry.refresh(model_name)
+    return {"swapped": bool(swapped), "model": registry.get(model_name).describe()}
+
+@app.post("/tools/ml_score_batch")
+def ml_score_batch(payload: dict):
+    """
+    Score many events in one vectorized model call and persist them with one array insert.
+    Expects: {"items": [{"event": {...}, "features": {...}}, ...], "model_name": "gbm_txn", "threshold": 75.0}
+    """
+    model_name = payload.get("model_name") or "gbm_txn"
+    threshold = float(payload.get("threshold") or 75.0)
+    items = []
+    for item in payload.get("items") or []:
+        evt = TransactionEvent(**item["event"])
+        items.append((evt.event_id, _model_features(item.get("features") or {}, evt.extra)))
+    res = _ml_score_batch(items, model_name=model_name, threshold=threshold)
+    rollups.observe_scores([r[2] for r in res.pop("rows")])
     return res
 
 @app.post("/tools/risk_score")
@@ -122,69 +427,91 @@ def risk_score(payload: dict):
     Combine latest model score with rules to produce final decision.
     Expects: {"event": {...}}
     """
-    memory = _Memory()
     evt = TransactionEvent(**payload["event"])
-    perceived = perceive(evt, memory)
-    out = _combine_scores(perceived, memory)
+    ctx = _LookupContext.for_event(evt, _Memory())
+    perceived = perceive(evt, ctx)
+    out = _combine_scores(perceived, ctx)
+    out["lookups"] = ctx.stats()
     return out
 
 
 # --- UI / Dashboard API proxies ------------------------------------------------
+def _cursor(value: Optional[str]):
+    # keyset cursor "<iso event_ts>|<event_id>" as returned in X-Next-Cursor
+    if not value:
+        return None
+    ts, sep, event_id = value.partition("|")
+    try:
+        return datetime.fromisoformat(ts), event_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
 @app.get('/api/transactions/latest')
-def api_latest_transactions(limit: int = 25):
-    """Return recent transactions with latest model score (if any)."""
-    # Use an analytic subquery to pick the latest model score per txn_id
-    
-    sql ="""
-    Select distinct event_id , amount , channel, status,created_at from (
-    SELECT   t.event_id, t.amount, t.channel, decisions.action status, TO_CHAR(t.created_at, 'YYYY-MM-DD HH24:MI:SS') as created_at,
-    decisions.risk_score
-    FROM fg_transactions t
-    left join fg_decisions decisions
-    on t.event_id = decisions.event_id)
-    order by  event_id desc,created_at desc
-       """ 
-    
-    with _get_conn() as con:
-        with con.cursor() as cur:
-            cur.execute(sql )   
-            rows = cur.fetchall()
-            cols = [d[0].lower() for d in cur.description]
-            return [dict(zip(cols, r)) for r in rows]
+def api_latest_transactions(limit: int = 25, before: Optional[str] = None):
+    """
+    Recent transactions with their latest decision, newest first by event
+    time. `created_at` is when the row was recorded, `event_ts` when the
+    transaction happened. Served from the rollups' latest-N ring; pages
+    beyond it are keyset queries on (event_ts, event_id). Pass the
+    X-Next-Cursor header back as `before`.
+    """
+    limit = max(1, min(int(limit), 500))
+    cursor = _cursor(before)
+    rows = rollups.latest(limit, cursor)
+    if rows is None:
+        rows = dao.latest_transactions(limit, cursor)
+    def _fmt(ts):
+        return ts.strftime("%Y-%m-%d %H:%M:%S") if ts else None
+    items = [{"event_id": r["event_id"], "amount": r["amount"], "channel": r["channel"], "status": r["status"],
+              "risk_score": r["risk_score"], "created_at": _fmt(r.get("created_at")), "event_ts": _fmt(r["event_ts"])}
+             for r in rows]
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = f"{rows[-1]['event_ts'].isoformat()}|{rows[-1]['event_id']}"
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
 
 
+_SQL_OPEN_ALERTS = f"SELECT alert_id, txn_id, risk_score, decision, created_at FROM {config.TBL_ALERTS} WHERE decision IN ('PENDING','CHALLENGE') AND (:before_id IS NULL OR alert_id < :before_id) ORDER BY alert_id DESC FETCH FIRST :lim ROWS ONLY"
+
 @app.get('/api/alerts/open')
-def api_open_alerts(limit: int = 25):
-    sql = f"SELECT alert_id, txn_id, risk_score, decision, created_at FROM {config.TBL_ALERTS} WHERE decision IN ('PENDING','CHALLENGE') ORDER BY created_at DESC FETCH FIRST :1 ROWS ONLY"
+def api_open_alerts(limit: int = 25, before_id: Optional[int] = None):
+    """Open alerts, newest first; pass the last alert_id as `before_id` for the next page."""
     with _get_conn() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [int(limit)])
+            tune_fetch(cur, int(limit))
+            cur.execute(_SQL_OPEN_ALERTS, dict(before_id=before_id, lim=int(limit)))
             rows = cur.fetchall()
             cols = [d[0].lower() for d in cur.description]
             return [dict(zip(cols, r)) for r in rows]
 
 
+_SQL_INCIDENTS = f"SELECT incident_id, alert_id, status, priority, assignee, sla_due_at, created_at FROM {config.TBL_INCIDENTS} WHERE status = :status AND (:before_id IS NULL OR incident_id < :before_id) ORDER BY incident_id DESC FETCH FIRST :lim ROWS ONLY"
+
 @app.get('/api/incidents')
-def api_incidents(status: str = 'OPEN'):
-    sql = f"SELECT incident_id, alert_id, status, priority, assignee, sla_due_at, created_at FROM {config.TBL_INCIDENTS} WHERE status = :1 ORDER BY created_at DESC"
+def api_incidents(status: str = 'OPEN', limit: int = 50, before_id: Optional[int] = None):
+    """Incidents in `status`, newest first; pass the last incident_id as `before_id` for the next page."""
     with _get_conn() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [status])
+            tune_fetch(cur, int(limit))
+            cur.execute(_SQL_INCIDENTS, dict(status=status, before_id=before_id, lim=int(limit)))
             rows = cur.fetchall()
             cols = [d[0].lower() for d in cur.description]
             return [dict(zip(cols, r)) for r in rows]
 
 
+_SQL_RULE_HITS_TOP = f"SELECT r.rule_code, r.name, r.severity, COUNT(*) AS cnt FROM {config.TBL_RULE_HITS} h JOIN {config.TBL_RULES} r ON r.rule_id=h.rule_id WHERE h.hit_at >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:1,'SECOND') GROUP BY r.rule_code, r.name, r.severity ORDER BY cnt DESC FETCH FIRST :2 ROWS ONLY"
+
 @app.get('/api/rule_hits/top')
 def api_rule_hits_top(range: str = '24h', limit: int = 5):
     # range in '24h' or '7d'
     seconds = 24*3600
     if range.endswith('d'):
         seconds = int(range[:-1]) * 24 * 3600
-    sql = f"SELECT r.rule_code, r.name, r.severity, COUNT(*) AS cnt FROM {config.TBL_RULE_HITS} h JOIN {config.TBL_RULES} r ON r.rule_id=h.rule_id WHERE h.hit_at >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:1,'SECOND') GROUP BY r.rule_code, r.name, r.severity ORDER BY cnt DESC FETCH FIRST :2 ROWS ONLY"
     with _get_conn() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [int(seconds), int(limit)])
+            tune_fetch(cur, int(limit))
+            cur.execute(_SQL_RULE_HITS_TOP, [int(seconds), int(limit)])
             rows = cur.fetchall()
             cols = [d[0].lower() for d in cur.description]
             items = [dict(zip(cols, r)) for r in rows]
@@ -196,32 +523,21 @@ def api_rule_hits_top(range: str = '24h', limit: int = 5):
 
 @app.get('/api/model_scores/distribution')
 def api_model_scores_distribution():
-    # Return a simple histogram and channel breakdown
-    with _get_conn() as con:
-        with con.cursor() as cur:
-            cur.execute(f"SELECT risk_score FROM {config.TBL_MODEL_SCORES} WHERE risk_score IS NOT NULL")
-            rows = [r[0] for r in cur.fetchall()]
-            buckets = [0]*10
-            for v in rows:
-                idx = min(9, int((v or 0)//10))
-                buckets[idx] += 1
-            cur.execute(f"SELECT channel, COUNT(*) FROM {config.TBL_TRANSACTIONS} GROUP BY channel")
-            channels = {r[0]: r[1] for r in cur.fetchall()}
-            return {'buckets': buckets, 'channels': channels}
+    # Histogram and channel breakdown from the rollups (reconciled against Oracle periodically)
+    snap = rollups.snapshot()
+    return {'buckets': snap['buckets'], 'channels': snap['channels']}
 
 
 @app.get('/api/notifications/verification_status')
 def api_verification_status():
-    sql = f"SELECT status, COUNT(*) FROM {config.TBL_NOTIFICATIONS} GROUP BY status"
-    with _get_conn() as con:
-        with con.cursor() as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            stats = {'sent':0,'delivered':0,'responded':0,'verified':0}
-            for st,c in rows:
-                key = (st or '').upper()
-                if key == 'SENT': stats['sent'] = c
-                elif key == 'DELIVERED': stats['delivered'] = c
-                elif key == 'ACKED': stats['responded'] = c
-                elif key == 'VERIFIED': stats['verified'] = c
-            return stats
+    counts = rollups.snapshot()['notifications']
+    return {'sent': counts.get('SENT', 0), 'delivered': counts.get('DELIVERED', 0),
+            'responded': counts.get('ACKED', 0), 'verified': counts.get('VERIFIED', 0)}
+
+
+@app.get('/api/rollups')
+def api_rollups():
+    """Rollup state: counters, mv_daily_risk_rollup rows, last reconcile time and drift."""
+    snap = rollups.snapshot()
+    snap['daily'] = list(rollups.daily)
+    return jsonable_encoder(snap)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# (seq, kind, action, risk_score, channel, data) -- data is the serialized SSE payload
+Entry = Tuple[int, str, Optional[str], Optional[float], Optional[str], str]
+
+class LiveStream:
+    """
+    Bounded broadcast ring behind the live SSE endpoint. One in-process
+    Kafka subscription appends decisions and alerts (`publish`, from any
+    thread); every SSE client only holds a cursor (the last sequence id it
+    sent) and reads the ring from there, so a message is serialized once no
+    matter how many clients are connected. A client whose cursor falls off
+    the end of the ring is too slow to keep up and is dropped instead of
+    buffering for it; browsers reconnect with Last-Event-ID and resume from
+    whatever the ring still holds.
+    """
+    def __init__(self, capacity: int = 10_000):
+        self.capacity = capacity
+        self._ring: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._wake_pending = False
+        self.clients = 0
+        self.dropped = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach the server's event loop; must be called on that loop."""
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def publish(self, kind: str, msg: Dict[str, Any]):
+        data = json.dumps({"type": kind, **msg}, default=str)
+        risk = msg.get("risk_score")
+        with self._lock:
+            self._seq += 1
+            self._ring.append((self._seq, kind, msg.get("action"), float(risk) if risk is not None else None,
+                               msg.get("channel"), data))
+            wake = self._loop is not None and not self._wake_pending
+            self._wake_pending = self._wake_pending or wake
+        if wake:
+            # coalesce wake-ups: one per loop iteration however many messages arrived
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        with self._lock:
+            self._wake_pending = False
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    def read(self, after: int, limit: int = 500) -> Tuple[Optional[List[Entry]], int]:
+        """
+        Entries with seq > `after` (at most `limit`) and the id to continue
+        from; None when entries after `after` were already overwritten.
+        """
+        with self._lock:
+            if after >= self._seq:
+                # nothing new (or an id from before a server restart): continue live
+                return [], self._seq
+            oldest = self._ring[0][0]
+            if after < oldest - 1:
+                return None, after
+            start = after - oldest + 1
+            out = [self._ring[i] for i in range(start, min(len(self._ring), start + limit))]
+        return out, out[-1][0]
+
+    def resume_from(self, last_event_id: Optional[int]) -> Tuple[int, bool]:
+        """Cursor for a (re)connecting client and whether messages were missed since `last_event_id`."""
+        with self._lock:
+            if last_event_id is None or last_event_id > self._seq:
+                return self._seq, False
+            oldest = self._ring[0][0] if self._ring else self._seq + 1
+            if last_event_id < oldest - 1:
+                return oldest - 1, True
+            return last_event_id, False
+
+    @property
+    def changed(self) -> Optional[asyncio.Event]:
+        """
+        The event the next publish sets. Take it before `read` and pass it to
+        `wait`: a wake-up between the two then ends the wait at once instead
+        of replacing the event being waited on.
+        """
+        return self._changed
+
+    async def wait(self, timeout: float, changed: Optional[asyncio.Event] = None) -> bool:
+        changed = changed or self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = self._ring[0][0] if self._ring else None
+        return {"last_id": self._seq, "oldest_id": oldest, "buffered": len(self._ring),
+                "capacity": self.capacity, "clients": self.clients, "dropped": self.dropped}
+
+
+def _csv(value: Optional[str]) -> Optional[Set[str]]:
+    return {v.strip().upper() for v in value.split(",") if v.strip()} if value else None
+
+class StreamFilter:
+    """Server-side filter of an SSE client: kinds, decision actions, minimum risk and channels."""
+    def __init__(self, kinds: Optional[str] = None, action: Optional[str] = None,
+                 min_risk: Optional[float] = None, channel: Optional[str] = None):
+        self.kinds = {k.lower() for k in _csv(kinds)} if kinds else None
+        self.actions = _csv(action)
+        self.min_risk = min_risk
+        self.channels = _csv(channel)
+
+    def match(self, e: Entry) -> bool:
+        _, kind, action, risk, channel, _ = e
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        # alerts have no action; the action filter only narrows decisions
+        if self.actions is not None and kind == "decision" and (action or "").upper() not in self.actions:
+            return False
+        if self.min_risk is not None and (risk is None or risk < self.min_risk):
+            return False
+        if self.channels is not None and (channel or "").upper() not in self.channels:
+            return False
+        return True
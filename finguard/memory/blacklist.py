@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from ..utils import dao
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+# fg_blacklist.TYPE values
+BLACKLIST_TYPES = ("MERCHANT", "DEVICE", "IP", "CARD", "PHONE")
+
+def _epoch(ts: Optional[datetime]) -> Optional[float]:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+class BlacklistSnapshot:
+    """
+    In-process copy of fg_blacklist indexed by (TYPE, VALUE), so lookups are
+    O(1) dict hits instead of a query per transaction. VALID_FROM/VALID_TO are
+    honoured at lookup time. The snapshot is refreshed incrementally on a
+    timer (new BL_IDs plus rows whose validity moved), fully reloaded every
+    `full_refresh_sec`, and accepts pushed updates from /tools/blacklist via
+    `apply`. `version` increases with every applied change.
+    """
+    # incremental refreshes look back this far to absorb clock skew with the DB
+    SKEW_SEC = 30
+
+    def __init__(self, refresh_sec: float = 5.0, full_refresh_sec: float = 600.0):
+        self.refresh_sec = refresh_sec
+        self.full_refresh_sec = full_refresh_sec
+        self.version = 0
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]] = {}
+        self._max_id = 0
+        self._last_refresh: Optional[datetime] = None
+        self._last_full = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _apply_rows(self, rows, replace: bool = False) -> int:
+        if not rows and not replace:
+            return 0
+        with self._lock:
+            entries = {} if replace else dict(self._entries)
+            max_id = 0 if replace else self._max_id
+            for r in rows:
+                key = (str(r.get("TYPE") or "").upper(), str(r.get("VALUE")))
+                entries[key] = (_epoch(r.get("VALID_FROM")), _epoch(r.get("VALID_TO")))
+                if r.get("BL_ID") is not None:
+                    max_id = max(max_id, int(r["BL_ID"]))
+            # swap the whole dict so lock-free readers never see a half-applied refresh
+            self._entries = entries
+            self._max_id = max_id
+            self.version += 1
+        return len(rows)
+
+    def load(self):
+        started = datetime.now(timezone.utc)
+        n = self._apply_rows(dao.load_blacklist(), replace=True)
+        self._last_refresh = started
+        self._last_full = time.monotonic()
+        log.info("blacklist loaded", extra={"entries": n, "version": self.version})
+
+    def refresh(self):
+        if self._last_refresh is None or time.monotonic() - self._last_full >= self.full_refresh_sec:
+            self.load()
+            return
+        started = datetime.now(timezone.utc)
+        since = self._last_refresh - timedelta(seconds=self.SKEW_SEC)
+        n = self._apply_rows(dao.load_blacklist(min_id=self._max_id, since=since))
+        self._last_refresh = started
+        if n:
+            log.info("blacklist refreshed", extra={"changed": n, "version": self.version})
+
+    def apply(self, bl_type: str, value: str, active: bool):
+        """Apply a pushed change immediately, ahead of the next DB refresh."""
+        now = time.time()
+        key = (bl_type.upper(), str(value))
+        with self._lock:
+            entries = dict(self._entries)
+            prev = entries.get(key)
+            if active:
+                still_active = prev is not None and prev[0] is not None and prev[1] is None
+                entries[key] = (prev[0] if still_active else now, None)
+            else:
+                entries[key] = (prev[0] if prev else None, now)
+            self._entries = entries
+            self.version += 1
+
+    def apply_message(self, msg: Dict[str, Any]):
+        # payload published by /tools/blacklist
+        if msg.get("value"):
+            self.apply(msg.get("type") or "MERCHANT", msg["value"], bool(msg.get("active", True)))
+
+    def is_listed(self, bl_type: str, value: Optional[str], at: Optional[float] = None) -> bool:
+        if not value:
+            return False
+        entry = self._entries.get((bl_type.upper(), str(value)))
+        if entry is None:
+            return False
+        now = at if at is not None else time.time()
+        valid_from, valid_to = entry
+        if valid_from is not None and valid_from > now:
+            return False
+        return valid_to is None or valid_to > now
+
+    def start_refreshing(self):
+        def _loop():
+            while True:
+                time.sleep(self.refresh_sec)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    log.warning("blacklist refresh failed", extra={"error": str(e)})
+        if self._timer is None:
+            self._timer = threading.Thread(target=_loop, name="finguard-blacklist-refresh", daemon=True)
+            self._timer.start()
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from .oracle_store import OracleMemoryStore, EventRow, _as_utc
+from ..utils.schemas import TransactionEvent
+from ..utils import dao
+
+class LookupContext:
+    """
+    Per-event view over a memory store that memoizes every read, so a fact
+    asked for by perceive, the rules, the scoring tools and the planner's
+    workflow is fetched once. Drop-in wherever a memory store is accepted.
+
+    `recent_events` for a window covered by an earlier, wider read of the same
+    account is answered by filtering that read. `add_event` passes through
+    and invalidates the account's recent-events and device entries.
+    `stats()` reports hits and misses per lookup.
+    """
+    def __init__(self, memory: Optional[OracleMemoryStore] = None, now: Optional[datetime] = None):
+        self.memory = memory if memory is not None else OracleMemoryStore()
+        # reference time for windowed reads that don't pass one (e.g. workflow steps)
+        self.now = now
+        self._memo: Dict[Tuple[str, Hashable], Any] = {}
+        self._recent: Dict[str, Tuple[float, Optional[datetime], List[EventRow]]] = {}
+        self._stats: Dict[str, List[int]] = {}
+
+    @classmethod
+    def for_event(cls, evt: TransactionEvent, memory: Optional[OracleMemoryStore] = None) -> "LookupContext":
+        return cls(memory, now=evt.timestamp)
+
+    def _count(self, name: str, hit: bool):
+        s = self._stats.setdefault(name, [0, 0])
+        s[0 if hit else 1] += 1
+
+    def lookup(self, name: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Memoize fn() under (name, key) for the lifetime of this context."""
+        mk = (name, key)
+        if mk in self._memo:
+            self._count(name, True)
+            return self._memo[mk]
+        self._count(name, False)
+        value = fn()
+        self._memo[mk] = value
+        return value
+
+    def prime(self, name: str, key: Hashable, value: Any):
+        """Seed a value the caller already has (e.g. a model score it just wrote)."""
+        self._memo[(name, key)] = value
+
+    # --- memory store interface ------------------------------------------------
+    def add_event(self, evt: TransactionEvent):
+        self.memory.add_event(evt)
+        self._recent.pop(evt.account_id, None)
+        self._memo.pop(("device_seen", (evt.account_id, evt.device_id)), None)
+
+    def recent_events(self, account_id: str, window: timedelta, now: Optional[datetime] = None) -> List[EventRow]:
+        now = now or self.now
+        window_sec = window.total_seconds()
+        cached = self._recent.get(account_id)
+        if cached is not None and cached[0] >= window_sec and cached[1] == now:
+            self._count("recent_events", True)
+            if cached[0] == window_sec:
+                return list(cached[2])
+            cutoff = _as_utc(now or datetime.utcnow()) - window
+            return [r for r in cached[2] if r.timestamp is not None and _as_utc(r.timestamp) >= cutoff]
+        self._count("recent_events", False)
+        rows = self.memory.recent_events(account_id, window, now=now)
+        self._recent[account_id] = (window_sec, now, rows)
+        return list(rows)
+
+    def velocity_features(self, evt: TransactionEvent) -> Dict[str, Any]:
+        return self.lookup("velocity_features", evt.event_id, lambda: self.memory.velocity_features(evt))
+
+    def has_seen_device_recently(self, account_id: str, device_id: Optional[str]) -> bool:
+        return self.lookup("device_seen", (account_id, device_id),
+                           lambda: self.memory.has_seen_device_recently(account_id, device_id))
+
+    def is_blacklisted(self, merchant_id: Optional[str]) -> bool:
+        return self.is_listed("MERCHANT", merchant_id)
+
+    def is_listed(self, bl_type: str, value: Optional[str]) -> bool:
+        return self.lookup("blacklist", (bl_type.upper(), value), lambda: self.memory.is_listed(bl_type, value))
+
+    # --- other per-event facts -------------------------------------------------
+    def model_score(self, txn_id: str) -> Optional[Dict[str, Any]]:
+        return self.lookup("model_score", txn_id, lambda: dao.get_latest_model_score(txn_id))
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(s[0] for s in self._stats.values())
+        misses = sum(s[1] for s in self._stats.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "by_lookup": {name: {"hits": s[0], "misses": s[1]} for name, s in self._stats.items()},
+        }
+
+def memoized(memory: Any, name: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    """Use the context's memo when `memory` is a LookupContext, else just call fn()."""
+    if isinstance(memory, LookupContext):
+        return memory.lookup(name, key, fn)
+    return fn()
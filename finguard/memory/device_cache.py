@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from ..utils import dao
+from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+def _epoch(ts: Optional[datetime]) -> float:
+    if ts is None:
+        return time.time()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+OnDropped = Callable[[str, str], None]
+
+class DeviceWriteBehind:
+    """
+    Background writer for device sightings. Pairs are queued and flushed as a
+    single array MERGE every `flush_ms` or once `max_batch` are pending. A
+    failed MERGE is retried with the next flush up to `attempts` times; after
+    that each pair's `on_dropped(account_id, device_id)` is called so the
+    cache stops treating it as written.
+    """
+    def __init__(self, flush_ms: int = 500, max_batch: int = 500, max_queue: int = 100_000, attempts: int = 3):
+        self.flush_sec = flush_ms / 1000.0
+        self.max_batch = max_batch
+        self.attempts = attempts
+        self._q: "queue.Queue[Tuple[str, str, Optional[OnDropped]]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="finguard-device-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, account_id: str, device_id: str, on_dropped: Optional[OnDropped] = None):
+        # blocks when the queue is full so a stuck DB applies backpressure
+        self._q.put((account_id, device_id, on_dropped))
+
+    def _run(self):
+        retry: List[Tuple[str, str, Optional[OnDropped]]] = []
+        failures = 0
+        while True:
+            batch, retry = retry, []
+            deadline = time.monotonic() + self.flush_sec
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+            try:
+                dao.upsert_devices_seen(list(dict.fromkeys((a, d) for a, d, _ in batch)))
+                failures = 0
+                continue
+            except Exception as e:
+                failures += 1
+                log.warning("device flush failed", extra={"devices": len(batch), "attempt": failures, "error": str(e)})
+            if failures < self.attempts:
+                retry = batch
+                time.sleep(self.flush_sec)
+                continue
+            failures = 0
+            log.error("device sightings dropped", extra={"devices": len(batch)})
+            for account_id, device_id, on_dropped in batch:
+                if on_dropped is not None:
+                    on_dropped(account_id, device_id)
+
+class KnownDeviceCache:
+    """
+    Per-account known-device cache (LRU by account, bounded by `max_entries`
+    fingerprints) in front of FG_DEVICES_SEEN. Only genuinely new fingerprints,
+    or ones whose LAST_SEEN_AT is older than `touch_interval_sec`, are written
+    back, through a DeviceWriteBehind queue (or the consumer's
+    PersistenceWriter when write-behind persistence is on); a write that is
+    finally dropped evicts its fingerprint again. A device counts as seen only if it
+    was used within DEVICE_WINDOW_DAYS.
+
+    Right after a warm that fit in `max_entries` the cache holds every
+    FG_DEVICES_SEEN row, so a miss is answered without a DB read. Other
+    consumers and the server write that table too, so this only holds for
+    `complete_ttl_sec`; afterwards a miss reads FG_DEVICES_SEEN.
+    """
+    def __init__(self, max_entries: int, window_days: int, touch_interval_sec: int,
+                 writer: Optional[DeviceWriteBehind] = None, complete_ttl_sec: int = 60):
+        self.max_entries = max_entries
+        self.window_sec = window_days * 86400
+        self.touch_interval_sec = touch_interval_sec
+        self.complete_ttl_sec = complete_ttl_sec
+        self.writer = writer or DeviceWriteBehind()
+        self._accounts: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._size = 0
+        # monotonic deadline until which a miss may be answered from the cache alone
+        self._complete_until = 0.0
+        self._lock = threading.Lock()
+
+    def warm(self):
+        rows = dao.devices_seen_since(self.window_sec // 86400)
+        with self._lock:
+            for account_id, device_id, last_seen in rows:
+                self._put(str(account_id), str(device_id), _epoch(last_seen))
+            complete = self._size < self.max_entries
+            self._complete_until = time.monotonic() + self.complete_ttl_sec if complete else 0.0
+        log.info("device cache warmed", extra={"devices": len(rows), "accounts": len(self._accounts), "complete": complete})
+
+    def _put(self, account_id: str, device_id: str, ts: float):
+        devices = self._accounts.get(account_id)
+        if devices is None:
+            devices = self._accounts[account_id] = {}
+        else:
+            self._accounts.move_to_end(account_id)
+        if device_id not in devices:
+            self._size += 1
+        devices[device_id] = max(ts, devices.get(device_id, 0.0))
+        while self._size > self.max_entries and len(self._accounts) > 1:
+            _, evicted = self._accounts.popitem(last=False)
+            self._size -= len(evicted)
+            self._complete_until = 0.0
+
+    def _get(self, account_id: str, device_id: str) -> Optional[float]:
+        devices = self._accounts.get(account_id)
+        if devices is None:
+            return None
+        self._accounts.move_to_end(account_id)
+        return devices.get(device_id)
+
+    def is_seen(self, account_id: str, device_id: Optional[str]) -> bool:
+        if not device_id:
+            return False
+        now = time.time()
+        with self._lock:
+            ts = self._get(account_id, device_id)
+            complete = time.monotonic() < self._complete_until
+        if ts is not None:
+            return now - ts <= self.window_sec
+        if complete:
+            return False
+        last_seen = dao.device_last_seen(account_id, device_id)
+        if last_seen is None:
+            return False
+        with self._lock:
+            self._put(account_id, device_id, _epoch(last_seen))
+        return True
+
+    def observe(self, account_id: str, device_id: Optional[str]):
+        """Record a sighting; queues a MERGE only for new or stale fingerprints."""
+        if not device_id:
+            return
+        now = time.time()
+        with self._lock:
+            ts = self._get(account_id, device_id)
+            write = ts is None or now - ts >= self.touch_interval_sec
+            if write:
+                self._put(account_id, device_id, now)
+        if write:
+            self.writer.enqueue(account_id, device_id, on_dropped=self.forget)
+
+    def remember(self, account_id: str, device_id: Optional[str], seen_at: Optional[datetime] = None):
+        """Cache a sighting that another process writes to FG_DEVICES_SEEN; queues nothing."""
+        if not device_id:
+            return
+        with self._lock:
+            self._put(account_id, device_id, _epoch(seen_at))
+
+    def forget(self, account_id: str, device_id: str):
+        """Evict a fingerprint whose write was dropped, so the next sighting writes it again."""
+        with self._lock:
+            devices = self._accounts.get(account_id)
+            if devices is not None and devices.pop(device_id, None) is not None:
+                self._size -= 1
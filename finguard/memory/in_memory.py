@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .oracle_store import EventRow
+from .velocity import VelocityStore, _epoch
+from ..utils.schemas import TransactionEvent
+from ..config import settings as config
+
+class InMemoryStore:
+    """
+    Memory store that never touches Oracle: velocity windows in a
+    VelocityStore, known devices per account and a static blacklist. Used by
+    offline replays and backtests, where event time (not wall clock) drives
+    every window, including the DEVICE_WINDOW_DAYS known-device horizon.
+    """
+    def __init__(self, blacklist: Optional[Iterable[Tuple[str, str]]] = None, dedupe_size: int = 10_000):
+        self.velocity = VelocityStore(dedupe_size=dedupe_size)
+        self._devices: Dict[str, Dict[str, float]] = {}
+        self._blacklist: Set[Tuple[str, str]] = {(t.upper(), str(v)) for t, v in (blacklist or [])}
+        self._device_window_sec = config.DEVICE_WINDOW_DAYS * 86400.0
+        self._now = 0.0
+
+    def add_event(self, evt: TransactionEvent):
+        ts = _epoch(evt.timestamp)
+        self._now = max(self._now, ts)
+        if evt.device_id:
+            self._devices.setdefault(evt.account_id, {})[evt.device_id] = ts
+        self.velocity.record(evt)
+
+    def recent_events(self, account_id: str, window: timedelta, now: Optional[datetime] = None) -> List[EventRow]:
+        return self.velocity.recent("ACCOUNT", account_id, window.total_seconds(), now=now)
+
+    def velocity_features(self, evt: TransactionEvent) -> Dict[str, Any]:
+        return self.velocity.features(evt)
+
+    def has_seen_device_recently(self, account_id: str, device_id: Optional[str]) -> bool:
+        if not device_id:
+            return False
+        last = self._devices.get(account_id, {}).get(device_id)
+        return last is not None and self._now - last <= self._device_window_sec
+
+    def is_blacklisted(self, merchant_id: Optional[str]) -> bool:
+        return self.is_listed("MERCHANT", merchant_id)
+
+    def is_listed(self, bl_type: str, value: Optional[str]) -> bool:
+        return value is not None and (bl_type.upper(), str(value)) in self._blacklist
@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import timedelta, timezone
 from typing import List, Optional, Dict, Any
 from dataclasses import dataclass
 from datetime import datetime
@@ -16,13 +16,28 @@ class EventRow:
     channel: str
 
 class OracleMemoryStore:
+    def __init__(self, velocity=None, devices=None, blacklist=None):
+        # Optional memory.velocity.VelocityStore; when set, velocity reads are
+        # served from memory instead of scanning FG_TRANSACTIONS per event.
+        self.velocity = velocity
+        # Optional memory.device_cache.KnownDeviceCache; when set, device
+        # lookups hit the cache and only new devices are merged (write-behind).
+        self.devices = devices
+        # Optional memory.blacklist.BlacklistSnapshot for O(1) fg_blacklist lookups.
+        self.blacklist = blacklist
+
     def add_event(self, evt: TransactionEvent):
-        print("OracleMemoryStore.add_event:", evt.event_id)
         dao.insert_transaction(evt)
-        dao.upsert_device_seen(evt.account_id, evt.device_id)
-        print("OracleMemoryStore.add_event: done")
+        if self.devices is not None:
+            self.devices.observe(evt.account_id, evt.device_id)
+        else:
+            dao.upsert_device_seen(evt.account_id, evt.device_id)
+        if self.velocity is not None:
+            self.velocity.record(evt)
 
-    def recent_events(self, account_id: str, window: timedelta) -> List[EventRow]:
+    def recent_events(self, account_id: str, window: timedelta, now: Optional[datetime] = None) -> List[EventRow]:
+        if self.velocity is not None:
+            return self.velocity.recent("ACCOUNT", account_id, window.total_seconds(), now=now)
         rows: List[Dict[str, Any]] = dao.recent_events(account_id, window)
         out: List[EventRow] = []
         for r in rows:
@@ -37,8 +52,83 @@ class OracleMemoryStore:
             ))
         return out
 
+    def velocity_features(self, evt: TransactionEvent) -> Dict[str, Any]:
+        return self.velocity.features(evt) if self.velocity is not None else {}
+
     def has_seen_device_recently(self, account_id: str, device_id: Optional[str]) -> bool:
+        if self.devices is not None:
+            return self.devices.is_seen(account_id, device_id)
         return dao.is_device_seen(account_id, device_id)
 
     def is_blacklisted(self, merchant_id: Optional[str]) -> bool:
-        return dao.is_merchant_blacklisted(merchant_id)
+        return self.is_listed("MERCHANT", merchant_id)
+
+    def is_listed(self, bl_type: str, value: Optional[str]) -> bool:
+        if self.blacklist is not None:
+            return self.blacklist.is_listed(bl_type, value)
+        return dao.is_blacklisted(bl_type, value)
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+class BatchMemoryStore:
+    """
+    Micro-batch view over a base store. Writes are buffered in `pending` so the
+    caller can persist the whole batch in one transaction, while reads overlay
+    the pending events so later events in the batch still see earlier ones.
+    """
+    def __init__(self, base: OracleMemoryStore):
+        self.base = base
+        self.pending: List[TransactionEvent] = []
+        self._devices = set()
+
+    @property
+    def pending_devices(self) -> List[tuple]:
+        # With a device cache the sightings go through its write-behind queue instead
+        if self.base.devices is not None:
+            return []
+        return list(self._devices)
+
+    def add_event(self, evt: TransactionEvent):
+        self.pending.append(evt)
+        if evt.device_id:
+            self._devices.add((evt.account_id, evt.device_id))
+        if self.base.devices is not None:
+            self.base.devices.observe(evt.account_id, evt.device_id)
+        # the velocity store dedupes by event_id, so recording before the
+        # batch commits is safe if the batch is later re-delivered
+        if self.base.velocity is not None:
+            self.base.velocity.record(evt)
+
+    def recent_events(self, account_id: str, window: timedelta, now: Optional[datetime] = None) -> List[EventRow]:
+        out = self.base.recent_events(account_id, window, now=now)
+        if self.base.velocity is not None:
+            return out
+        cutoff = datetime.now(timezone.utc) - window
+        for e in self.pending:
+            if e.account_id == account_id and _as_utc(e.timestamp) >= cutoff:
+                out.append(EventRow(
+                    timestamp=e.timestamp,
+                    amount=e.amount,
+                    lat=e.lat,
+                    lon=e.lon,
+                    device_id=e.device_id,
+                    merchant_id=e.merchant_id,
+                    channel=e.channel
+                ))
+        return out
+
+    def has_seen_device_recently(self, account_id: str, device_id: Optional[str]) -> bool:
+        if device_id and (account_id, device_id) in self._devices:
+            return True
+        return self.base.has_seen_device_recently(account_id, device_id)
+
+    def velocity_features(self, evt: TransactionEvent) -> Dict[str, Any]:
+        return self.base.velocity_features(evt)
+
+    def is_blacklisted(self, merchant_id: Optional[str]) -> bool:
+        return self.base.is_blacklisted(merchant_id)
+
+    def is_listed(self, bl_type: str, value: Optional[str]) -> bool:
+        return self.base.is_listed(bl_type, value)
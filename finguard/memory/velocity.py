@@ -0,0 +1,270 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from .oracle_store import EventRow
+from ..utils.schemas import TransactionEvent
+from ..utils import dao
+from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Velocity windows (minutes) per key scope, as used by the VELOCITY rules in
+# documents/FinGuard_Rule_Catalog (FG_VELOCITY_01..06).
+VELOCITY_SCOPES: Dict[str, int] = {
+    "ACCOUNT": 15,
+    "DEVICE": 30,
+    "IP": 60,
+    "MERCHANT": 120,
+    "CUSTOMER": 1440,
+    "CARD": 4320,
+}
+
+# Scopes that can be rebuilt from FG_TRANSACTIONS columns. CUSTOMER and CARD
+# keys are not stored there, so those windows start cold after a restart.
+WARMABLE_SCOPES = ("ACCOUNT", "DEVICE", "IP", "MERCHANT")
+
+def _epoch(ts: datetime) -> float:
+    # naive timestamps are treated as UTC, matching what the DAO writes
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+def scope_keys(evt: TransactionEvent) -> Dict[str, Optional[str]]:
+    extra = evt.extra if isinstance(evt.extra, dict) else {}
+    return {
+        "ACCOUNT": evt.account_id,
+        "DEVICE": evt.device_id,
+        "IP": evt.ip,
+        "MERCHANT": evt.merchant_id,
+        "CUSTOMER": evt.user_id or extra.get("customer_id"),
+        "CARD": extra.get("card_id") or extra.get("card_number"),
+    }
+
+def feature_name(scope: str, window_minutes: int, agg: str) -> str:
+    return f"velocity_{scope.lower()}_{window_minutes}m_{agg}"
+
+class SlidingWindow:
+    """
+    Time-ordered ring of events for one key, holding at most `horizon_sec`
+    of history. Appends and expiry are O(1) amortized; running count/total
+    cover the whole horizon so full-window stats need no scan.
+    """
+    __slots__ = ("horizon_sec", "times", "rows", "count", "total")
+
+    def __init__(self, horizon_sec: float):
+        self.horizon_sec = horizon_sec
+        self.times: deque = deque()
+        self.rows: deque = deque()
+        self.count = 0
+        self.total = 0.0
+
+    def append(self, ts: float, row: EventRow):
+        if self.times and ts < self.times[-1]:
+            # late event: keep the ring ordered (rare, O(n))
+            idx = bisect.bisect_right(self.times, ts)
+            self.times.insert(idx, ts)
+            self.rows.insert(idx, row)
+        else:
+            self.times.append(ts)
+            self.rows.append(row)
+        self.count += 1
+        self.total += row.amount
+
+    def expire(self, now: float):
+        cutoff = now - self.horizon_sec
+        while self.times and self.times[0] < cutoff:
+            self.times.popleft()
+            self.count -= 1
+            self.total -= self.rows.popleft().amount
+        if not self.times:
+            self.total = 0.0
+
+    def since(self, cutoff: float, until: float) -> List[EventRow]:
+        out: List[EventRow] = []
+        for ts, row in zip(reversed(self.times), reversed(self.rows)):
+            if ts < cutoff:
+                break
+            if ts <= until:
+                out.append(row)
+        out.reverse()
+        return out
+
+    def stats(self, cutoff: float, until: float) -> Tuple[int, float]:
+        if self.times and self.times[0] >= cutoff and self.times[-1] <= until:
+            return self.count, self.total
+        rows = self.since(cutoff, until)
+        return len(rows), sum(r.amount for r in rows)
+
+class VelocityStore:
+    """
+    Per-key sliding windows for every scope in VELOCITY_SCOPES, replacing the
+    per-event FG_TRANSACTIONS range scan on the perceive path. Warmed from
+    FG_TRANSACTIONS at startup and checkpointed into fg_velocity_counters.
+    Event time drives expiry, so replays and backtests see the same windows
+    as live traffic; the expiry watermark never runs more than
+    VELOCITY_MAX_SKEW_SEC ahead of wall clock, so a future-dated event does
+    not empty every other key's window.
+
+    A store only sees the events routed to its process, so `scopes` should
+    list only the scopes whose keys that routing keeps together (ACCOUNT for
+    account-keyed process workers), and only a store that sees every event
+    of its scopes may checkpoint: each checkpoint overwrites the shared rows.
+    """
+    def __init__(self, scopes: Optional[Dict[str, int]] = None, dedupe_size: int = 100_000):
+        self.scopes = dict(scopes or VELOCITY_SCOPES)
+        self._horizons = {s: m * 60.0 for s, m in self.scopes.items()}
+        # perceive also reads the VELOCITY_WINDOW_SEC and GEO_WINDOW_SEC account windows
+        self._horizons["ACCOUNT"] = max(self._horizons.get("ACCOUNT", 0.0), float(config.VELOCITY_WINDOW_SEC),
+                                        float(config.GEO_WINDOW_SEC))
+        self._windows: Dict[Tuple[str, str], SlidingWindow] = {}
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._dedupe_size = dedupe_size
+        self._watermark = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    def record(self, evt: TransactionEvent):
+        ts = _epoch(evt.timestamp)
+        row = EventRow(
+            timestamp=evt.timestamp,
+            amount=float(evt.amount),
+            lat=evt.lat,
+            lon=evt.lon,
+            device_id=evt.device_id,
+            merchant_id=evt.merchant_id,
+            channel=evt.channel
+        )
+        with self._lock:
+            # at-least-once delivery can hand us the same event twice
+            if evt.event_id in self._seen:
+                return
+            self._seen[evt.event_id] = None
+            if len(self._seen) > self._dedupe_size:
+                self._seen.popitem(last=False)
+            self._advance(ts, evt.event_id)
+            for scope, key in scope_keys(evt).items():
+                if key and scope in self._horizons:
+                    self._append(scope, str(key), ts, row)
+
+    def _advance(self, ts: float, event_id: Optional[str] = None):
+        # caller holds the lock
+        limit = time.time() + config.VELOCITY_MAX_SKEW_SEC
+        if ts > limit:
+            log.debug("future-dated event; watermark capped", extra={"event_id": event_id, "ahead_sec": ts - limit})
+            ts = limit
+        if ts > self._watermark:
+            self._watermark = ts
+
+    def _append(self, scope: str, key: str, ts: float, row: EventRow):
+        w = self._windows.get((scope, key))
+        if w is None:
+            w = self._windows[(scope, key)] = SlidingWindow(self._horizons[scope])
+        w.append(ts, row)
+        w.expire(self._watermark)
+
+    def recent(self, scope: str, key: Optional[str], window_sec: float, now: Optional[datetime] = None) -> List[EventRow]:
+        if not key:
+            return []
+        until = _epoch(now) if now is not None else datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            w = self._windows.get((scope, str(key)))
+            if w is None:
+                return []
+            w.expire(self._watermark)
+            return w.since(until - window_sec, until)
+
+    def stats(self, scope: str, key: Optional[str], window_sec: float, now: Optional[datetime] = None) -> Tuple[int, float]:
+        if not key:
+            return 0, 0.0
+        until = _epoch(now) if now is not None else datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            return self._stats(scope, str(key), window_sec, until)
+
+    def _stats(self, scope: str, key: str, window_sec: float, until: float) -> Tuple[int, float]:
+        # caller holds the lock
+        w = self._windows.get((scope, key))
+        if w is None:
+            return 0, 0.0
+        w.expire(self._watermark)
+        return w.stats(until - window_sec, until)
+
+    def features(self, evt: TransactionEvent) -> Dict[str, Any]:
+        """
+        Count/sum per scope over its catalog window, including `evt` itself
+        (the catalog rules read "N transactions within M minutes").
+        """
+        feats: Dict[str, Any] = {}
+        keys = scope_keys(evt)
+        until = _epoch(evt.timestamp)
+        with self._lock:
+            recorded = evt.event_id in self._seen
+            for scope, minutes in self.scopes.items():
+                key = keys.get(scope)
+                cnt, total = 0, 0.0
+                if key:
+                    cnt, total = self._stats(scope, str(key), minutes * 60.0, until)
+                    if not recorded:
+                        cnt, total = cnt + 1, total + float(evt.amount)
+                feats[feature_name(scope, minutes, "count")] = cnt
+                feats[feature_name(scope, minutes, "sum")] = round(total, 2)
+        return feats
+
+    def warm(self):
+        """Rebuild the warmable windows from FG_TRANSACTIONS."""
+        horizon = max(self._horizons[s] for s in WARMABLE_SCOPES if s in self._horizons)
+        rows = dao.transactions_since(int(horizon))
+        with self._lock:
+            for r in rows:
+                ts_val = r.get("EVENT_TS")
+                if ts_val is None:
+                    continue
+                ts = _epoch(ts_val)
+                self._advance(ts)
+                row = EventRow(
+                    timestamp=ts_val,
+                    amount=float(r.get("AMOUNT")) if r.get("AMOUNT") is not None else 0.0,
+                    lat=r.get("GEOLAT"),
+                    lon=r.get("GEOLON"),
+                    device_id=r.get("DEVICE_ID"),
+                    merchant_id=r.get("MERCHANT_ID"),
+                    channel=r.get("CHANNEL")
+                )
+                keys = {"ACCOUNT": r.get("ACCOUNT_ID"), "DEVICE": r.get("DEVICE_ID"),
+                        "IP": r.get("IP_ADDR"), "MERCHANT": r.get("MERCHANT_ID")}
+                for scope, key in keys.items():
+                    if key is not None and scope in self._horizons:
+                        self._append(scope, str(key), ts, row)
+        log.info("velocity store warmed", extra={"transactions": len(rows), "keys": len(self._windows)})
+
+    def checkpoint(self):
+        """Write current per-scope aggregates to fg_velocity_counters and drop idle keys."""
+        rows = []
+        with self._lock:
+            for (scope, key), w in list(self._windows.items()):
+                w.expire(self._watermark)
+                minutes = self.scopes.get(scope)
+                if minutes is None:
+                    continue
+                cnt, total = w.stats(self._watermark - minutes * 60.0, self._watermark)
+                rows.append((scope, key, minutes, cnt, round(total, 2)))
+                if not w.count:
+                    del self._windows[(scope, key)]
+        if rows:
+            dao.upsert_velocity_counters(rows)
+        log.debug("velocity checkpoint", extra={"counters": len(rows)})
+
+    def start_checkpointing(self, interval_sec: float):
+        def _loop():
+            while True:
+                time.sleep(interval_sec)
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    log.warning("velocity checkpoint failed", extra={"error": str(e)})
+        if self._timer is None:
+            self._timer = threading.Thread(target=_loop, name="finguard-velocity-ckpt", daemon=True)
+            self._timer.start()
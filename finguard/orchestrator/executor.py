@@ -1,63 +1,187 @@
-\
-from typing import Dict, Any, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
 from ..utils import dao
+from ..utils.schemas import DecisionOutcome, Alert
 from ..config import settings as config
-from ..utils.kafka_bus import KafkaBus
+from ..utils.kafka_bus import KafkaBus, get_shared_bus
 
-def exec_workflow(plan: Dict[str, Any]) -> Dict[str, Any]:
+READ_TOOLS = {"recent_events", "device_seen", "merchant_blacklist", "score_rules"}
+# Write tools coalesced per level: decisions and alerts in one transaction, publishes on one producer
+DB_WRITE_TOOLS = {"persist_decision", "create_alert"}
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _read_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=config.EXECUTOR_WORKERS, thread_name_prefix="finguard-exec")
+    return _pool
+
+def plan_levels(steps: List[Dict[str, Any]]) -> List[List[int]]:
     """
-    Execute a small subset of tools locally.
+    Dependency levels of a workflow. Reads depend on earlier DB writes, DB
+    writes on every earlier read, and publish_kafka on every earlier step
+    (it announces what was read and written). Steps in one level are
+    independent: reads run concurrently and writes are coalesced.
     """
-    bus = None
-    out = {"steps": []}
-    for step in plan.get("workflow", []):
+    level: List[int] = []
+    for i, step in enumerate(steps):
         tool = step.get("tool")
-        args = step.get("args", {})
-        if tool == "recent_events":
-            rows = dao.recent_events(args["account_id"], __import__("datetime").timedelta(seconds=int(args.get("window_sec",60))))
-            out["steps"].append({"tool": tool, "result_count": len(rows)})
-        elif tool == "device_seen":
+        deps = []
+        for j in range(i):
+            prev = steps[j].get("tool")
+            if tool in READ_TOOLS:
+                needed = prev in DB_WRITE_TOOLS
+            elif tool in DB_WRITE_TOOLS:
+                needed = prev in READ_TOOLS
+            else:
+                needed = prev != tool
+            if needed:
+                deps.append(level[j] + 1)
+        level.append(max(deps, default=0))
+    levels: List[List[int]] = [[] for _ in range(max(level, default=-1) + 1)]
+    for i, lv in enumerate(level):
+        levels[lv].append(i)
+    return levels
+
+def _read(tool: str, args: Dict[str, Any], ctx) -> Dict[str, Any]:
+    # ctx is shared by the concurrent reads of one workflow; a racing miss only fetches twice
+    if tool == "recent_events":
+        window = timedelta(seconds=int(args.get("window_sec",60)))
+        if ctx is not None:
+            rows = ctx.recent_events(args["account_id"], window)
+        else:
+            rows = dao.recent_events(args["account_id"], window)
+        return {"tool": tool, "result_count": len(rows)}
+    if tool == "device_seen":
+        if ctx is not None:
+            res = ctx.has_seen_device_recently(args["account_id"], args.get("device_id"))
+        else:
             res = dao.is_device_seen(args["account_id"], args.get("device_id"))
-            out["steps"].append({"tool": tool, "seen": bool(res)})
-        elif tool == "merchant_blacklist":
+        return {"tool": tool, "seen": bool(res)}
+    if tool == "merchant_blacklist":
+        if ctx is not None:
+            res = ctx.is_blacklisted(args.get("merchant_id"))
+        else:
             res = dao.is_merchant_blacklisted(args.get("merchant_id"))
-            out["steps"].append({"tool": tool, "blacklisted": bool(res)})
-        elif tool == "score_rules":
-            # Scoring is already done in service; in a real MCP, you'd call an internal scoring tool.
-            out["steps"].append({"tool": tool, "status": "ok"})
+        return {"tool": tool, "blacklisted": bool(res)}
+    # score_rules: scoring is already done in service; in a real MCP, you'd call an internal scoring tool.
+    return {"tool": tool, "status": "ok"}
+
+def _timed_read(tool: str, args: Dict[str, Any], ctx) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    try:
+        res = _read(tool, args, ctx)
+    except Exception as e:
+        res = {"tool": tool, "error": str(e)}
+    res["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return res
+
+def _decision(args: Dict[str, Any]) -> DecisionOutcome:
+    return DecisionOutcome(
+        decision_id=args.get("decision_id",""),
+        event_id=args.get("event_id",""),
+        action=args.get("action","ALLOW"),
+        risk_score=float(args.get("risk_score",0.0)),
+        reasons=args.get("reasons", []),
+        created_at=datetime.utcnow(),
+    )
+
+def _alert(args: Dict[str, Any]) -> Alert:
+    return Alert(
+        alert_id=args.get("alert_id",""),
+        event_id=args.get("event_id",""),
+        severity=args.get("severity","MEDIUM"),
+        title=args.get("title",""),
+        description=args.get("description",""),
+        created_at=datetime.utcnow(),
+        tags=args.get("tags", [])
+    )
+
+def _write_db(steps: List[Dict[str, Any]], idx: List[int], results: Dict[int, Dict[str, Any]]):
+    decisions = [_decision(steps[i].get("args", {})) for i in idx if steps[i].get("tool") == "persist_decision"]
+    alerts = [_alert(steps[i].get("args", {})) for i in idx if steps[i].get("tool") == "create_alert"]
+    t0 = time.perf_counter()
+    error = None
+    try:
+        dao.persist_batch([], decisions, alerts, devices=[])
+    except Exception as e:
+        error = str(e)
+    ms = round((time.perf_counter() - t0) * 1000, 2)
+    for i in idx:
+        tool = steps[i].get("tool")
+        res: Dict[str, Any] = {"tool": tool, "ms": ms, "batched": len(idx)}
+        if error is not None:
+            res["error"] = error
         elif tool == "persist_decision":
-            # Persist decision structure if provided
-            evt = {
-                "decision_id": args.get("decision_id",""),
-                "event_id": args.get("event_id",""),
-                "action": args.get("action","ALLOW"),
-                "risk_score": float(args.get("risk_score",0.0)),
-                "reasons": args.get("reasons", []),
-                "created_at": __import__("datetime").datetime.utcnow()
-            }
-            # Build DecisionOutcome on the fly
-            from ..utils.schemas import DecisionOutcome
-            dec = DecisionOutcome(**evt)
-            dao.insert_decision(dec)
-            out["steps"].append({"tool": tool, "persisted": True})
-        elif tool == "create_alert":
-            from ..utils.schemas import Alert
-            a = Alert(
-                alert_id=args.get("alert_id",""),
-                event_id=args.get("event_id",""),
-                severity=args.get("severity","MEDIUM"),
-                title=args.get("title",""),
-                description=args.get("description",""),
-                created_at=__import__("datetime").datetime.utcnow(),
-                tags=args.get("tags", [])
-            )
-            dao.insert_alerts([a])
-            out["steps"].append({"tool": tool, "alert": True})
-        elif tool == "publish_kafka":
-            if bus is None:
-                bus = KafkaBus()
-            bus.publish(args["topic"], key=args.get("key"), value=args.get("value", {}))
-            out["steps"].append({"tool": tool, "published": args["topic"]})
+            res["persisted"] = True
         else:
-            out["steps"].append({"tool": tool, "error": "unknown_tool"})
+            res["alert"] = True
+        results[i] = res
+
+def _publish(steps: List[Dict[str, Any]], idx: List[int], results: Dict[int, Dict[str, Any]], bus: KafkaBus):
+    t0 = time.perf_counter()
+    futures = {}
+    for i in idx:
+        args = steps[i].get("args", {})
+        try:
+            futures[i] = bus.publish(args["topic"], key=args.get("key"), value=args.get("value", {}))
+        except Exception as e:
+            results[i] = {"tool": "publish_kafka", "error": str(e)}
+    # wait for this workflow's records only, not everything queued on the shared producer
+    for i, fut in futures.items():
+        try:
+            fut.get(timeout=config.KAFKA_PUBLISH_TIMEOUT_SEC)
+            results[i] = {"tool": "publish_kafka", "published": steps[i]["args"]["topic"]}
+        except Exception as e:
+            results[i] = {"tool": "publish_kafka", "error": str(e)}
+    ms = round((time.perf_counter() - t0) * 1000, 2)
+    for i in idx:
+        results[i].update({"ms": ms, "batched": len(idx)})
+
+def exec_workflow(plan: Dict[str, Any], ctx=None, bus: Optional[KafkaBus] = None) -> Dict[str, Any]:
+    """
+    Execute a small subset of tools locally, level by level of the plan's
+    dependency graph (see plan_levels): independent reads run concurrently
+    on a shared thread pool, persist_decision/create_alert steps of a level
+    are written in one transaction and publish_kafka steps go out on a
+    shared long-lived producer (`bus`, else get_shared_bus()). With the event's
+    LookupContext as `ctx`, read steps are answered from facts already
+    fetched while perceiving and scoring the event. Every step reports its
+    "ms"; batched writes report the batch time and size.
+    """
+    t0 = time.perf_counter()
+    steps = plan.get("workflow", [])
+    results: Dict[int, Dict[str, Any]] = {}
+    levels = plan_levels(steps)
+    for idx in levels:
+        reads = [i for i in idx if steps[i].get("tool") in READ_TOOLS]
+        writes = [i for i in idx if steps[i].get("tool") in DB_WRITE_TOOLS]
+        publishes = [i for i in idx if steps[i].get("tool") == "publish_kafka"]
+        for i in idx:
+            if i not in reads and i not in writes and i not in publishes:
+                results[i] = {"tool": steps[i].get("tool"), "error": "unknown_tool", "ms": 0.0}
+        if len(reads) == 1:
+            results[reads[0]] = _timed_read(steps[reads[0]]["tool"], steps[reads[0]].get("args", {}), ctx)
+        elif reads:
+            futs = {i: _read_pool().submit(_timed_read, steps[i]["tool"], steps[i].get("args", {}), ctx) for i in reads}
+            for i, f in futs.items():
+                results[i] = f.result()
+        if writes:
+            _write_db(steps, writes, results)
+        if publishes:
+            _publish(steps, publishes, results, bus or get_shared_bus())
+    out: Dict[str, Any] = {
+        "steps": [results[i] for i in range(len(steps))],
+        "levels": levels,
+        "total_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+    if ctx is not None:
+        out["lookups"] = ctx.stats()
     return out
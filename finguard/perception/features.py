@@ -1,9 +1,12 @@
 from math import radians, cos, sin, asin, sqrt
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
 from ..utils.schemas import TransactionEvent, PerceivedEvent
 from ..memory.oracle_store import OracleMemoryStore as MemoryStore
 from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
 
 def _haversine(lat1, lon1, lat2, lon2):
     # Distance in km
@@ -13,6 +16,10 @@ def _haversine(lat1, lon1, lat2, lon2):
     a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
     return 2 * r * asin(sqrt(a))
 
+def _utc(ts: datetime) -> datetime:
+    # Oracle hands back naive UTC timestamps while events may carry an offset
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
 CHANNEL_BASE_RISK = {
     "CARD": 10, "UPI": 8, "IMPS": 12, "NEFT": 6, "NETBANKING": 7, "ATM": 9
 }
@@ -24,31 +31,46 @@ MCC_RISK = {
     "5699": 5,   # apparel
 }
 
+# Features perceive() sets (the geo hop pair only when both events carry coordinates), besides the
+# velocity_<scope>_<minutes>m_* windows; the rule engine checks its catalog against these
+PERCEIVED_FEATURES = frozenset({
+    "tx_count_last_window", "tx_sum_last_window", "geo_velocity_km_per_min", "geo_last_distance_km",
+    "geo_last_gap_minutes", "is_new_device", "channel_base_risk", "mcc_risk", "is_night", "amount",
+})
+
 def perceive(evt: TransactionEvent, memory: MemoryStore) -> PerceivedEvent:
     feats: Dict[str, Any] = {}
 
-    # Velocity features
-    recent = memory.recent_events(evt.account_id, timedelta(seconds=config.VELOCITY_WINDOW_SEC))
+    # Velocity features (one lookup covers both the velocity and the geo-hop window)
+    history = memory.recent_events(evt.account_id, timedelta(seconds=max(config.VELOCITY_WINDOW_SEC, config.GEO_WINDOW_SEC)), now=evt.timestamp)
+    cutoff = _utc(evt.timestamp) - timedelta(seconds=config.VELOCITY_WINDOW_SEC)
+    recent = [r for r in history if r.timestamp is not None and _utc(r.timestamp) >= cutoff]
     feats["tx_count_last_window"] = len(recent)
     feats["tx_sum_last_window"] = sum(r.amount for r in recent) if recent else 0.0
-    print("perceive:", len(recent), feats["tx_sum_last_window"])
     # Geo-velocity (km/min) comparing with last event if coordinates exist
     if recent and evt.lat is not None and evt.lon is not None:
         last = recent[-1]
         if last.lat is not None and last.lon is not None:
             dist_km = _haversine(last.lat, last.lon, evt.lat, evt.lon)
-            minutes = max( (evt.timestamp - last.timestamp).total_seconds() / 60.0, 0.001)
+            minutes = max( (_utc(evt.timestamp) - _utc(last.timestamp)).total_seconds() / 60.0, 0.001)
             feats["geo_velocity_km_per_min"] = dist_km / minutes
         else:
             feats["geo_velocity_km_per_min"] = 0.0
     else:
         feats["geo_velocity_km_per_min"] = 0.0
-    print("perceive:", len(recent), feats["geo_velocity_km_per_min"])
+
+    # Geo hop against the last geo-tagged event in the geo window (GEO / GEO_VELOCITY rules)
+    if evt.lat is not None and evt.lon is not None:
+        prev = next((r for r in reversed(history) if r.lat is not None and r.lon is not None), None)
+        if prev is not None:
+            feats["geo_last_distance_km"] = _haversine(prev.lat, prev.lon, evt.lat, evt.lon)
+            feats["geo_last_gap_minutes"] = max((_utc(evt.timestamp) - _utc(prev.timestamp)).total_seconds() / 60.0, 0.0)
+
+    # Multi-scope velocity windows (ACCOUNT 15m ... CARD 4320m) for the catalog rules
+    feats.update(memory.velocity_features(evt))
 
     # New device
-    print("has_seen_device_recently:", evt.account_id, evt.device_id)
     feats["is_new_device"] = not memory.has_seen_device_recently(evt.account_id, evt.device_id)
-    print("is_new_device:", feats["is_new_device"])
     # Risk hints
     feats["channel_base_risk"] = CHANNEL_BASE_RISK.get(evt.channel.upper(), 5)
     feats["mcc_risk"] = MCC_RISK.get((evt.mcc or "").strip(), 0)
@@ -59,6 +81,8 @@ def perceive(evt: TransactionEvent, memory: MemoryStore) -> PerceivedEvent:
 
     # Amount normalization (assume currency already normalized)
     feats["amount"] = evt.amount
-    print("amount:", len(recent), feats["geo_velocity_km_per_min"])
+    log.debug("perceive", extra={"event_id": evt.event_id, "tx_count": len(recent),
+                                 "geo_velocity_km_per_min": feats["geo_velocity_km_per_min"],
+                                 "is_new_device": feats["is_new_device"]})
 
     return PerceivedEvent(event=evt, features=feats)
@@ -35,6 +35,7 @@ def send_demo(n: int = 5, account_id: str = "ACC001", user_id: str = "USR001"):
         bus.publish(config.TRANSACTIONS_TOPIC, value=payload, key=payload["account_id"])
         print(f"[Demo] Sent {payload['event_id']} amount={payload['amount']} channel={payload['channel']}")
         time.sleep(0.2)
+    bus.close()
 
 if __name__ == "__main__":
     send_demo(10)
@@ -0,0 +1,211 @@
+"""
+High-rate synthetic transaction traffic with fraud injection.
+
+    python -m finguard.producers.load_generator --rate 5000 --duration 60 --processes 4 \\
+        --accounts 100000 --fraud-rate 0.02 --scenarios burst,travel,new_device,blacklist,night_amount
+
+Each process paces its share of `--rate` in 10 ms ticks (no per-event sleep
+or flush) against a population of accounts with home locations and known
+devices. Injected scenarios follow the rule catalog: `burst` (velocity),
+`travel` (impossible travel), `new_device`, `blacklist` (merchant from
+`--blacklist-merchants`) and `night_amount` (high amount at night); the
+scenario name is in `extra.injected` as ground truth. Every event carries
+`extra.sent_at` (epoch seconds at send) so the consumer can report
+end-to-end decision latency. `--local` sends to an in-process LocalBus
+instead of Kafka (generator throughput only); point `--bootstrap` at a
+local single-node broker to drive the consumer.
+"""
+import argparse
+import multiprocessing as mp
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings as config
+
+CITIES = [
+    ("Bengaluru", "KA", 12.9716, 77.5946), ("Mumbai", "MH", 19.0760, 72.8777), ("Delhi", "DL", 28.6139, 77.2090),
+    ("Chennai", "TN", 13.0827, 80.2707), ("Kolkata", "WB", 22.5726, 88.3639), ("Hyderabad", "TG", 17.3850, 78.4867),
+    ("Pune", "MH", 18.5204, 73.8567), ("Ahmedabad", "GJ", 23.0225, 72.5714), ("Jaipur", "RJ", 26.9124, 75.7873),
+    ("Lucknow", "UP", 26.8467, 80.9462),
+]
+SCENARIOS = ("burst", "travel", "new_device", "blacklist", "night_amount")
+DEFAULT_CHANNELS = "CARD:4,UPI:5,IMPS:1,NEFT:1,NETBANKING:1,ATM:1"
+DEFAULT_MCCS = "5411:4,5812:2,5699:2,4829:1,7995:0.5,none:3"
+
+def parse_mix(spec: str) -> Tuple[List[Optional[str]], List[float]]:
+    """"CARD:4,UPI:5" -> (["CARD", "UPI"], [4.0, 5.0]); "none" stands for a missing value."""
+    names, weights = [], []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition(":")
+        names.append(None if name.strip().lower() == "none" else name.strip().upper())
+        weights.append(float(weight or 1))
+    return names, weights
+
+class TrafficGenerator:
+    """Builds event payloads for one process; `seed` makes a run reproducible."""
+    def __init__(self, accounts: int = 10_000, devices_per_account: int = 2, merchants: int = 5_000,
+                 channels: str = DEFAULT_CHANNELS, mccs: str = DEFAULT_MCCS, fraud_rate: float = 0.0,
+                 scenarios: Tuple[str, ...] = SCENARIOS, blacklist_merchants: Tuple[str, ...] = ("MBL001",),
+                 seed: Optional[int] = None, prefix: str = "lg"):
+        self.rng = random.Random(seed)
+        self.accounts = accounts
+        self.devices_per_account = max(1, devices_per_account)
+        self.merchants = merchants
+        self.channels, self.channel_weights = parse_mix(channels)
+        self.mccs, self.mcc_weights = parse_mix(mccs)
+        self.fraud_rate = fraud_rate
+        self.scenarios = tuple(s for s in scenarios if s in SCENARIOS)
+        self.blacklist_merchants = tuple(blacklist_merchants)
+        self.prefix = prefix
+        self._seq = 0
+        self.injected: Dict[str, int] = {s: 0 for s in self.scenarios}
+
+    def _home(self, acct: int):
+        # stable per account without holding the population in memory
+        return CITIES[acct % len(CITIES)]
+
+    def _event(self, acct: int, ts: datetime, **overrides) -> Dict[str, Any]:
+        self._seq += 1
+        city, state, lat, lon = self._home(acct)
+        payload = {
+            "event_id": f"{self.prefix}-{uuid.uuid4().hex[:12]}-{self._seq}",
+            "account_id": f"ACC{acct:07d}",
+            "user_id": f"USR{acct:07d}",
+            "amount": round(min(self.rng.lognormvariate(7.0, 1.2), 90_000.0), 2),
+            "currency": "INR",
+            "channel": self.rng.choices(self.channels, self.channel_weights)[0],
+            "mcc": self.rng.choices(self.mccs, self.mcc_weights)[0],
+            "merchant_id": f"M{self.rng.randrange(self.merchants):05d}",
+            "timestamp": ts.isoformat(),
+            "lat": round(lat + self.rng.uniform(-0.05, 0.05), 6),
+            "lon": round(lon + self.rng.uniform(-0.05, 0.05), 6),
+            "device_id": f"D{acct:07d}-{self.rng.randrange(self.devices_per_account)}",
+            "ip": f"10.{acct % 250}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}",
+            "country": "IN",
+            "state": state,
+            "city": city,
+            "extra": {},
+        }
+        payload.update(overrides)
+        return payload
+
+    def next_events(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """One normal event, or the events of one injected fraud scenario."""
+        now = now or datetime.now(timezone.utc)
+        acct = self.rng.randrange(self.accounts)
+        if not self.scenarios or self.rng.random() >= self.fraud_rate:
+            return [self._event(acct, now)]
+        scenario = self.rng.choice(self.scenarios)
+        self.injected[scenario] += 1
+        if scenario == "burst":
+            n = self.rng.randint(6, 10)
+            events = [self._event(acct, now - timedelta(seconds=(n - i) * 3)) for i in range(n)]
+        elif scenario == "travel":
+            home = self._home(acct)
+            far = max(CITIES, key=lambda c: abs(c[2] - home[2]) + abs(c[3] - home[3]))
+            events = [self._event(acct, now - timedelta(minutes=2)),
+                      self._event(acct, now, city=far[0], state=far[1], lat=far[2], lon=far[3])]
+        elif scenario == "new_device":
+            events = [self._event(acct, now, device_id=f"DNEW-{uuid.uuid4().hex[:10]}",
+                                  amount=round(self.rng.uniform(20_000, 80_000), 2))]
+        elif scenario == "blacklist":
+            events = [self._event(acct, now, merchant_id=self.rng.choice(self.blacklist_merchants))]
+        else:  # night_amount
+            night = now - timedelta(hours=(now.hour - 2) % 24)
+            events = [self._event(acct, night, amount=round(self.rng.uniform(100_000, 250_000), 2))]
+        for e in events:
+            e["extra"]["injected"] = scenario
+        return events
+
+def _bus(local: bool, bootstrap: Optional[str]):
+    if local:
+        from ..utils.local_bus import LocalBus
+        return LocalBus(keep=False)
+    from ..utils.kafka_bus import KafkaBus
+    return KafkaBus(bootstrap)
+
+def generate(rate: float, duration: float, topic: str, bus, gen: TrafficGenerator, tick_sec: float = 0.01) -> Dict[str, Any]:
+    """Send at `rate` events/sec for `duration` seconds; returns counts and the achieved rate."""
+    sent = 0
+    t0 = time.monotonic()
+    deadline = t0 + duration
+    pending: List[Dict[str, Any]] = []
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        due = int((now - t0) * rate) - sent
+        while due > 0:
+            if not pending:
+                pending = gen.next_events()
+            payload = pending.pop(0)
+            payload["extra"]["sent_at"] = time.time()
+            bus.publish(topic, value=payload, key=payload["account_id"])
+            sent += 1
+            due -= 1
+        time.sleep(max(0.0, min(tick_sec, deadline - time.monotonic())))
+    bus.flush()
+    elapsed = time.monotonic() - t0
+    return {"sent": sent, "elapsed_sec": round(elapsed, 3), "events_per_sec": round(sent / elapsed, 1) if elapsed else 0.0,
+            "injected": dict(gen.injected), "delivery_failed": getattr(bus, "failed", 0)}
+
+def _proc(idx: int, args: Dict[str, Any], results: "mp.Queue"):
+    gen = TrafficGenerator(args["accounts"], args["devices"], args["merchants"], args["channels"], args["mccs"],
+                           args["fraud_rate"], tuple(args["scenarios"]), tuple(args["blacklist_merchants"]),
+                           seed=None if args["seed"] is None else args["seed"] + idx, prefix=f"lg{idx}")
+    bus = _bus(args["local"], args["bootstrap"])
+    try:
+        results.put(generate(args["rate"] / args["processes"], args["duration"], args["topic"], bus, gen))
+    finally:
+        bus.close()
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="FinGuard synthetic load generator")
+    ap.add_argument("--rate", type=float, default=1000.0, help="target events/sec across all processes")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--processes", type=int, default=1)
+    ap.add_argument("--accounts", type=int, default=10_000)
+    ap.add_argument("--devices", type=int, default=2, help="known devices per account")
+    ap.add_argument("--merchants", type=int, default=5_000)
+    ap.add_argument("--channels", default=DEFAULT_CHANNELS, help="channel mix, NAME:weight,...")
+    ap.add_argument("--mccs", default=DEFAULT_MCCS, help="MCC mix, CODE:weight,... (none = no MCC)")
+    ap.add_argument("--fraud-rate", type=float, default=0.01, help="share of draws that inject a scenario")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--blacklist-merchants", default="MBL001", help="merchant ids the blacklist scenario uses")
+    ap.add_argument("--topic", default=config.TRANSACTIONS_TOPIC)
+    ap.add_argument("--bootstrap", default=None, help="Kafka bootstrap servers (default: KAFKA_BOOTSTRAP_SERVERS)")
+    ap.add_argument("--local", action="store_true", help="send to an in-process LocalBus instead of Kafka")
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+    args = {
+        "rate": a.rate, "duration": a.duration, "processes": max(1, a.processes), "accounts": a.accounts,
+        "devices": a.devices, "merchants": a.merchants, "channels": a.channels, "mccs": a.mccs,
+        "fraud_rate": a.fraud_rate, "scenarios": [s.strip() for s in a.scenarios.split(",") if s.strip()],
+        "blacklist_merchants": [m.strip() for m in a.blacklist_merchants.split(",") if m.strip()],
+        "topic": a.topic, "bootstrap": a.bootstrap, "local": a.local, "seed": a.seed,
+    }
+    results = mp.Queue()
+    procs = [mp.Process(target=_proc, args=(i, args, results), daemon=True) for i in range(args["processes"])]
+    for p in procs:
+        p.start()
+    total = {"sent": 0, "delivery_failed": 0, "injected": {}}
+    elapsed = 0.0
+    for _ in procs:
+        r = results.get()
+        total["sent"] += r["sent"]
+        total["delivery_failed"] += r["delivery_failed"]
+        elapsed = max(elapsed, r["elapsed_sec"])
+        for k, v in r["injected"].items():
+            total["injected"][k] = total["injected"].get(k, 0) + v
+    for p in procs:
+        p.join()
+    total["elapsed_sec"] = elapsed
+    total["events_per_sec"] = round(total["sent"] / elapsed, 1) if elapsed else 0.0
+    print(f"[LoadGen] {total}")
+
+if __name__ == "__main__":
+    main()
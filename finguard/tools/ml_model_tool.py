@@ -1,8 +1,10 @@
 \
 import time, os
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
 from ..utils import dao
 from ..config import settings as config
+from .model_registry import get_model_registry
 
 DEFAULT_MODEL_NAME = os.getenv("FG_MODEL_NAME", "gbm_txn")
 
@@ -20,21 +22,58 @@ def _dummy_model_predict(features: Dict[str, Any]) -> (float, dict):
     explain = {"top_factors": ["amount","velocity","geo","device"]}
     return min(score, 99.9), explain
 
-def score_transaction(txn_id: str, features: Dict[str, Any], model_name: str = DEFAULT_MODEL_NAME, threshold: float = 75.0) -> Dict[str, Any]:
+def _predict_batch(features: List[Dict[str, Any]], model) -> Tuple[List[float], List[dict], float]:
+    if model is None:
+        t0 = time.perf_counter()
+        out = [_dummy_model_predict(f) for f in features]
+        return [s for s, _ in out], [e for _, e in out], (time.perf_counter() - t0) * 1000.0
+    from . import model_runtime
+    scores, factors, batch_ms = model_runtime.score_matrix(model, features)
+    return [round(float(s), 2) for s in scores], [{"top_factors": f} for f in factors], batch_ms
+
+def score_batch(items: List[Tuple[str, Dict[str, Any]]], model_name: str = DEFAULT_MODEL_NAME, threshold: float = 75.0,
+                persist: bool = True) -> Dict[str, Any]:
+    """
+    Score (txn_id, features) pairs in one vectorized call with the registry's
+    active model for `model_name` and, with `persist`,
+    write them to FG_MODEL_SCORES as one array insert. `inference_ms` on each
+    row is the batch time amortized per row. `rows` are FG_MODEL_SCORES tuples
+    for callers that persist with their own transaction (persist=False).
+    """
+    # one registry entry for the whole batch, even if a new version is swapped in meanwhile
+    loaded = get_model_registry().get(model_name)
+    model_id = loaded.model_id
+    risk_scores, explains, batch_ms = _predict_batch([f for _, f in items], loaded.model)
+    per_row_ms = round(batch_ms / len(items), 4) if items else 0.0
+    rows = [(txn_id, model_id, score, threshold, per_row_ms, explain)
+            for (txn_id, _), score, explain in zip(items, risk_scores, explains)]
+    if persist and rows:
+        dao.insert_model_scores(rows)
+    return {
+        "model_id": model_id,
+        "version": loaded.version,
+        "count": len(rows),
+        "threshold": threshold,
+        "batch_inference_ms": round(batch_ms, 3),
+        "inference_ms": per_row_ms,
+        "scores": [{"txn_id": r[0], "risk_score": r[2], "explain": r[5]} for r in rows],
+        "rows": rows,
+    }
+
+def score_transaction(txn_id: str, features: Dict[str, Any], model_name: str = DEFAULT_MODEL_NAME, threshold: float = 75.0,
+                      ctx=None) -> Dict[str, Any]:
     """
     Execute model inference and persist to FG_MODEL_SCORES.
+    With a LookupContext, the written score is primed into it instead of
+    being read back, so combine_scores sees it without a query.
     """
-    model_id = dao.get_active_model_id(model_name)
-    t0 = time.time()
-    risk_score, explain = _dummy_model_predict(features)
-    inference_ms = int((time.time() - t0) * 1000)
-    dao.insert_model_score(
-        txn_id=txn_id,
-        model_id=model_id,
-        risk_score=risk_score,
-        threshold_used=threshold,
-        inference_ms=inference_ms,
-        explain_json=explain
-    )
-    latest = dao.get_latest_model_score(txn_id)
+    res = score_batch([(txn_id, features)], model_name=model_name, threshold=threshold)
+    model_id, risk_score, inference_ms = res["model_id"], res["scores"][0]["risk_score"], res["inference_ms"]
+    explain = res["scores"][0]["explain"]
+    if ctx is not None:
+        latest = {"TXN_ID": txn_id, "MODEL_ID": model_id, "RISK_SCORE": risk_score, "THRESHOLD_USED": threshold,
+                  "INFERENCE_MS": inference_ms, "EXPLAIN_JSON": explain, "CREATED_AT_UTC": datetime.utcnow()}
+        ctx.prime("model_score", txn_id, latest)
+    else:
+        latest = dao.get_latest_model_score(txn_id)
     return {"model_id": model_id, "risk_score": risk_score, "threshold": threshold, "inference_ms": inference_ms, "explain": explain, "record": latest}
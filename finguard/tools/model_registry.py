@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from ..utils import dao
+from ..config import settings as config
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+@dataclass(frozen=True)
+class LoadedModel:
+    model_name: str
+    model_id: Any
+    version: Optional[str]
+    # model_runtime model, or None when no artifact exists (heuristic scoring)
+    model: Any
+    artifact_path: Optional[str]
+    artifact_mtime: Optional[float]
+    loaded_at: datetime
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "model_id": self.model_id,
+            "version": self.version,
+            "kind": getattr(self.model, "kind", "heuristic"),
+            "artifact": self.artifact_path,
+            "loaded_at": self.loaded_at.isoformat() + "Z",
+        }
+
+def artifact_path(model_name: str, version: Optional[str]) -> Optional[str]:
+    """FG_MODEL_DIR/<name>-<version>.json if present, else FG_MODEL_DIR/<name>.json, else None."""
+    candidates = [f"{model_name}-{version}.json"] if version else []
+    candidates.append(f"{model_name}.json")
+    for name in candidates:
+        path = os.path.join(config.MODEL_DIR, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+class ModelRegistry:
+    """
+    Active model per model_name from FG_MODEL_VERSIONS together with its
+    loaded artifact. Scoring reads the cached entry (no query per score);
+    a poll thread re-reads the active version every `poll_sec` and, when the
+    version or artifact file changed, loads the new artifact off the hot
+    path and swaps the entry in one assignment. Callers take one LoadedModel
+    per request or batch, so in-flight work finishes on the version it
+    started with.
+    """
+    def __init__(self, poll_sec: float = 30.0):
+        self.poll_sec = poll_sec
+        self._entries: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    def get(self, model_name: str) -> LoadedModel:
+        entry = self._entries.get(model_name)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(model_name)
+                if entry is None:
+                    entry = self._load(model_name)
+                    self._entries = {**self._entries, model_name: entry}
+            self.start_polling()
+        return entry
+
+    def _load(self, model_name: str) -> LoadedModel:
+        active = dao.get_active_model(model_name)
+        version = str(active["VERSION"]) if active.get("VERSION") is not None else None
+        path = artifact_path(model_name, version)
+        model = None
+        mtime = None
+        if path is not None:
+            from . import model_runtime
+            mtime = os.path.getmtime(path)
+            model = model_runtime.load_model(path)
+        entry = LoadedModel(model_name, active["MODEL_ID"], version, model, path, mtime, datetime.utcnow())
+        log.info("model loaded", extra={"model_name": model_name, "model_id": entry.model_id, "version": version,
+                                       "kind": getattr(model, 'kind', 'heuristic')})
+        return entry
+
+    def refresh(self, model_name: Optional[str] = None) -> List[str]:
+        """Reload entries whose active version or artifact changed; returns swapped model names."""
+        swapped = []
+        for name in ([model_name] if model_name else list(self._entries)):
+            current = self._entries.get(name)
+            active = dao.get_active_model(name)
+            version = str(active["VERSION"]) if active.get("VERSION") is not None else None
+            path = artifact_path(name, version)
+            mtime = os.path.getmtime(path) if path else None
+            if (current is not None and current.model_id == active["MODEL_ID"] and current.version == version
+                    and current.artifact_path == path and current.artifact_mtime == mtime):
+                continue
+            entry = self._load(name)
+            with self._lock:
+                self._entries = {**self._entries, name: entry}
+            swapped.append(name)
+        return swapped
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [e.describe() for e in self._entries.values()]
+
+    def start_polling(self):
+        def _loop():
+            while True:
+                time.sleep(self.poll_sec)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    log.warning("model registry refresh failed", extra={"error": str(e)})
+        with self._lock:
+            if self._timer is None and self.poll_sec > 0:
+                self._timer = threading.Thread(target=_loop, name="finguard-model-registry", daemon=True)
+                self._timer.start()
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(config.MODEL_REGISTRY_POLL_SEC)
+    return _registry
@@ -0,0 +1,285 @@
+"""
+In-process model runtime for ml_model_tool.
+
+Models are plain JSON artifacts (no pickle) of two kinds:
+  - "linear": standardized logistic regression (weights, bias, mean, scale)
+  - "tree":   gradient-boosted regression trees stored as flat node arrays
+Both score a whole batch of feature dicts with NumPy in one call and return
+risk scores on the 0-100 scale used by FG_MODEL_SCORES.
+
+Train from documents/data.csv-style data:
+    python -m finguard.tools.model_runtime train --data documents/data.csv --kind tree --out models/gbm_txn.json
+"""
+import argparse
+import csv
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Feature order used by trained artifacts. Names match perceive() features;
+# the last four come from event.extra (see model_features).
+DEFAULT_FEATURES = [
+    "amount", "is_night", "is_new_device", "tx_count_last_window", "geo_velocity_km_per_min",
+    "login_attempts", "transaction_duration", "account_balance", "customer_age",
+]
+
+def model_features(features: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """perceive() features plus numeric event.extra fields (extra never overrides)."""
+    out = {k: v for k, v in (extra or {}).items() if isinstance(v, (int, float, bool))}
+    out.update(features)
+    return out
+
+def to_matrix(rows: Sequence[Dict[str, Any]], names: Sequence[str]) -> np.ndarray:
+    """Feature dicts -> float64 matrix in `names` order; missing/non-numeric values are 0."""
+    num = lambda v: float(v) if isinstance(v, (int, float, bool)) else 0.0
+    X = np.array([[num(row.get(name)) for name in names] for row in rows], dtype=np.float64)
+    return X.reshape(len(rows), len(names))
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+
+class LinearModel:
+    kind = "linear"
+
+    def __init__(self, features: List[str], weights, bias: float, mean, scale):
+        self.features = list(features)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(((X - self.mean) / self.scale) @ self.weights + self.bias) * 100.0
+
+    def predict_explain(self, X: np.ndarray, top: int = 3) -> Tuple[np.ndarray, List[List[str]]]:
+        # factors: largest positive contributions to the logit
+        contrib = ((X - self.mean) / self.scale) * self.weights
+        scores = _sigmoid(contrib.sum(axis=1) + self.bias) * 100.0
+        order = np.argsort(-contrib, axis=1)[:, :top]
+        return scores, [[self.features[j] for j in idx] for idx in order]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "features": self.features, "weights": self.weights.tolist(),
+                "bias": self.bias, "mean": self.mean.tolist(), "scale": self.scale.tolist()}
+
+class TreeModel:
+    """
+    Boosted trees in flat arrays: per node `feature` (-1 for leaves),
+    `threshold`, `left`, `right`, `value`; `roots` holds each tree's first
+    node. Prediction walks all rows through all trees level by level.
+    """
+    kind = "tree"
+
+    def __init__(self, features: List[str], roots, feature, threshold, left, right, value,
+                 base: float, learning_rate: float, max_depth: int):
+        self.features = list(features)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.base = float(base)
+        self.learning_rate = float(learning_rate)
+        self.max_depth = int(max_depth)
+
+    def _walk(self, X: np.ndarray, counts: Optional[np.ndarray] = None) -> np.ndarray:
+        """Leaf index per (row, tree); optionally counts feature use per row into `counts`."""
+        n = X.shape[0]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        rows = np.arange(n)[:, None]
+        for _ in range(self.max_depth):
+            f = self.feature[node]
+            internal = f >= 0
+            if not internal.any():
+                break
+            if counts is not None:
+                flat = (np.broadcast_to(rows, f.shape) * counts.shape[1] + f)[internal]
+                counts += np.bincount(flat, minlength=counts.size).reshape(counts.shape)
+            go_left = X[rows, np.where(internal, f, 0)] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return node
+
+    def _margin(self, leaves: np.ndarray) -> np.ndarray:
+        return self.base + self.learning_rate * self.value[leaves].sum(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(self._margin(self._walk(X))) * 100.0
+
+    def predict_explain(self, X: np.ndarray, top: int = 3) -> Tuple[np.ndarray, List[List[str]]]:
+        # factors: features used on the row's decision paths, most frequent first
+        counts = np.zeros((X.shape[0], len(self.features)))
+        scores = _sigmoid(self._margin(self._walk(X, counts))) * 100.0
+        order = np.argsort(-counts, axis=1)[:, :top]
+        return scores, [[self.features[j] for j in idx] for idx in order]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "features": self.features, "roots": self.roots.tolist(),
+                "feature": self.feature.tolist(), "threshold": self.threshold.tolist(),
+                "left": self.left.tolist(), "right": self.right.tolist(), "value": self.value.tolist(),
+                "base": self.base, "learning_rate": self.learning_rate, "max_depth": self.max_depth}
+
+def from_dict(d: Dict[str, Any]):
+    kind = d.get("kind")
+    args = {k: v for k, v in d.items() if k not in ("kind", "meta")}
+    if kind == "linear":
+        return LinearModel(**args)
+    if kind == "tree":
+        return TreeModel(**args)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+def load_model(path: str):
+    with open(path, encoding="utf-8") as fh:
+        return from_dict(json.load(fh))
+
+def save_model(model, path: str, meta: Optional[Dict[str, Any]] = None):
+    import os
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    d = model.to_dict()
+    d["meta"] = meta or {}
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(d, fh)
+
+def score_matrix(model, rows: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, List[List[str]], float]:
+    """Score a batch; returns (scores 0-100, top factors per row, elapsed ms for the batch)."""
+    t0 = time.perf_counter()
+    X = to_matrix(rows, model.features)
+    scores, factors = model.predict_explain(X)
+    return scores, factors, (time.perf_counter() - t0) * 1000.0
+
+# ---- training -----------------------------------------------------------------
+def load_training_csv(path: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Map documents/data.csv columns onto model features. Per-account history
+    (new device, 60s velocity) is rebuilt in timestamp order.
+    """
+    with open(path, newline="", encoding="utf-8") as fh:
+        raw = list(csv.DictReader(fh))
+    raw.sort(key=lambda r: r["TransactionDate"])
+    devices = defaultdict(set)
+    history = defaultdict(list)
+    rows, labels = [], []
+    for r in raw:
+        ts = datetime.strptime(r["TransactionDate"], "%Y-%m-%d %H:%M:%S")
+        acct = r["AccountID"]
+        recent = [t for t in history[acct] if (ts - t).total_seconds() <= 60]
+        rows.append({
+            "amount": float(r["TransactionAmount"]),
+            "is_night": 1 if (ts.hour >= 22 or ts.hour <= 5) else 0,
+            "is_new_device": r["DeviceID"] not in devices[acct],
+            "tx_count_last_window": len(recent),
+            "geo_velocity_km_per_min": 0.0,
+            "login_attempts": float(r["LoginAttempts"] or 0),
+            "transaction_duration": float(r["TransactionDuration"] or 0),
+            "account_balance": float(r["AccountBalance"] or 0),
+            "customer_age": float(r["CustomerAge"] or 0),
+        })
+        labels.append(1.0 if r["IsFraud"] == "1" else 0.0)
+        devices[acct].add(r["DeviceID"])
+        history[acct].append(ts)
+    return rows, np.asarray(labels)
+
+def train_linear(X: np.ndarray, y: np.ndarray, features: List[str], epochs: int = 500, lr: float = 0.1,
+                 l2: float = 1e-3) -> LinearModel:
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+    w = np.zeros(Z.shape[1])
+    b = float(np.log((y.mean() + 1e-9) / (1 - y.mean() + 1e-9)))
+    # class-balanced gradient so the rare fraud class is not ignored
+    sw = np.where(y == 1, 0.5 / max(y.mean(), 1e-9), 0.5 / max(1 - y.mean(), 1e-9))
+    for _ in range(epochs):
+        err = (_sigmoid(Z @ w + b) - y) * sw
+        w -= lr * (Z.T @ err / len(y) + l2 * w)
+        b -= lr * err.mean()
+    return LinearModel(features, w, b, mean, scale)
+
+def _fit_tree(X, g, max_depth, min_leaf, thresholds, nodes) -> int:
+    """Grow one least-squares regression tree on residuals g; returns the root index."""
+    def grow(idx, depth) -> int:
+        me = len(nodes["feature"])
+        for k in nodes:
+            nodes[k].append(0)
+        nodes["feature"][me] = -1
+        nodes["value"][me] = float(g[idx].mean()) if len(idx) else 0.0
+        if depth >= max_depth or len(idx) < 2 * min_leaf:
+            return me
+        best = None
+        total, n = g[idx].sum(), len(idx)
+        for j, cands in enumerate(thresholds):
+            col = X[idx, j]
+            for t in cands:
+                mask = col <= t
+                nl = int(mask.sum())
+                if nl < min_leaf or n - nl < min_leaf:
+                    continue
+                sl = g[idx][mask].sum()
+                gain = sl * sl / nl + (total - sl) ** 2 / (n - nl)
+                if best is None or gain > best[0]:
+                    best = (gain, j, t, mask)
+        if best is None:
+            return me
+        _, j, t, mask = best
+        nodes["feature"][me], nodes["threshold"][me] = j, float(t)
+        nodes["left"][me] = grow(idx[mask], depth + 1)
+        nodes["right"][me] = grow(idx[~mask], depth + 1)
+        return me
+    return grow(np.arange(X.shape[0]), 0)
+
+def train_trees(X: np.ndarray, y: np.ndarray, features: List[str], n_trees: int = 50, max_depth: int = 3,
+                learning_rate: float = 0.2, min_leaf: int = 20) -> TreeModel:
+    base = float(np.log((y.mean() + 1e-9) / (1 - y.mean() + 1e-9)))
+    thresholds = [np.unique(np.quantile(X[:, j], np.linspace(0.05, 0.95, 19))) for j in range(X.shape[1])]
+    nodes = {k: [] for k in ("feature", "threshold", "left", "right", "value")}
+    roots = []
+    margin = np.full(len(y), base)
+    for _ in range(n_trees):
+        residual = y - _sigmoid(margin)
+        root = _fit_tree(X, residual, max_depth, min_leaf, thresholds, nodes)
+        roots.append(root)
+        model = TreeModel(features, roots, nodes["feature"], nodes["threshold"], nodes["left"],
+                          nodes["right"], nodes["value"], base, learning_rate, max_depth)
+        margin = model._margin(model._walk(X))
+    return TreeModel(features, roots, nodes["feature"], nodes["threshold"], nodes["left"],
+                     nodes["right"], nodes["value"], base, learning_rate, max_depth)
+
+def _auc(y: np.ndarray, s: np.ndarray) -> float:
+    order = np.argsort(s)
+    ranks = np.empty(len(s))
+    ranks[order] = np.arange(1, len(s) + 1)
+    pos = y == 1
+    n_pos, n_neg = pos.sum(), (~pos).sum()
+    if not n_pos or not n_neg:
+        return float("nan")
+    return float((ranks[pos].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Train/inspect FinGuard JSON models")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    tr = sub.add_parser("train")
+    tr.add_argument("--data", default="documents/data.csv")
+    tr.add_argument("--kind", choices=("linear", "tree"), default="tree")
+    tr.add_argument("--out", default="models/gbm_txn.json")
+    tr.add_argument("--trees", type=int, default=50)
+    tr.add_argument("--depth", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    rows, y = load_training_csv(args.data)
+    X = to_matrix(rows, DEFAULT_FEATURES)
+    if args.kind == "linear":
+        model = train_linear(X, y, DEFAULT_FEATURES)
+    else:
+        model = train_trees(X, y, DEFAULT_FEATURES, n_trees=args.trees, max_depth=args.depth)
+    scores, _, ms = score_matrix(model, rows)
+    auc = _auc(y, scores)
+    save_model(model, args.out, meta={"trained_on": args.data, "rows": len(rows), "train_auc": auc,
+                                      "trained_at": datetime.utcnow().isoformat()})
+    print(f"model_runtime: {args.kind} model -> {args.out} rows={len(rows)} train_auc={auc:.3f} "
+          f"batch_score_ms={ms:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,31 @@
 \
 from typing import Dict, Any, List
 from ..utils import dao
-from ..decision.rules import score_rules
+from ..decision import rules
+from ..memory.context import memoized
 from ..memory.oracle_store import OracleMemoryStore as MemoryStore
 from ..utils.schemas import PerceivedEvent, TransactionEvent
 
+def combine(model_score: float, rule_score: float, model_threshold: float = 75.0):
+    """(final, action) for a model and a rule score: 0.6 * model + 0.4 * rules against the threshold."""
+    final = round(0.6 * model_score + 0.4 * rule_score, 2)
+    action = "ALLOW"
+    if final >= model_threshold:
+        action = "CHALLENGE" if final < (model_threshold + 15) else "BLOCK"
+    return final, action
+
 def combine_scores(perceived: PerceivedEvent, memory: MemoryStore, model_threshold: float = 75.0):
     """
     Pull latest model score and combine with rule score.
     Strategy (example): final = 0.6 * model + 0.4 * rules, then compare to threshold.
+    With a LookupContext as `memory`, the rule score and model score already
+    computed for this event are reused.
     """
-    rule_score, reasons = score_rules(perceived, memory)
-    latest = dao.get_latest_model_score(perceived.event.event_id)
+    rule_score, reasons, _ = rules.rule_score(perceived, memory)
+    txn_id = perceived.event.event_id
+    latest = memoized(memory, "model_score", txn_id, lambda: dao.get_latest_model_score(txn_id))
     model_score = float(latest["RISK_SCORE"]) if latest else 0.0
-    final = round(0.6 * model_score + 0.4 * rule_score, 2)
-    action = "ALLOW"
-    if final >= model_threshold:
-        action = "CHALLENGE" if final < (model_threshold + 15) else "BLOCK"
+    final, action = combine(model_score, rule_score, model_threshold)
     if latest and "EXPLAIN_JSON" in latest:
         reasons.append(f"Model factors: {latest['EXPLAIN_JSON'].get('top_factors')}")
     reasons.append(f"Model score={model_score}, Rule score={rule_score}, Combined={final}")
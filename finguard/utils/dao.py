@@ -1,213 +1,527 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-from ..utils.db import get_connection
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta, timezone
+from ..utils.db import get_connection, tune_fetch
 from ..config import settings as config
 from ..utils.schemas import TransactionEvent, DecisionOutcome, Alert
+from .log import get_logger
+from .metrics import timed
 
-def insert_transaction(evt: TransactionEvent):
-    # Insert into fg_transaction table. Map optional/extra fields using evt.extra when needed.
-    sql = f"""
-        INSERT INTO {config.TBL_TRANSACTIONS}
-        (EVENT_ID, EVENT_TS, ACCOUNT_ID, COUNTERPARTY_ACCT, MERCHANT_ID, AMOUNT, CURRENCY,
-         CHANNEL, GEOLAT, GEOLON, IP_ADDR, DEVICE_ID, STATUS, CREATED_AT)
-        VALUES (:1,:2,:3,:4,:5,:6,:7,:8,:9,:10,:11,:12,:13,SYSTIMESTAMP AT TIME ZONE 'UTC')
-    """
+log = get_logger(__name__)
+
+# Statements are module constants built once at import (table names come from settings), so
+# every call sends identical text and hits the connection's statement cache (DB_STMT_CACHE_SIZE).
+# Single-row lookups fetch in one round trip; bulk reads use DB_BULK_ARRAYSIZE.
+
+def _transaction_row(evt: TransactionEvent) -> list:
     # Use evt.extra for fields not present on the TransactionEvent model (e.g. counterparty, status)
     counterparty = evt.extra.get('counterparty_acct') if isinstance(evt.extra, dict) else None
     status = evt.extra.get('status') if isinstance(evt.extra, dict) else None
+    return [
+        evt.event_id,
+        evt.timestamp,
+        evt.account_id,
+        counterparty,
+        evt.merchant_id,
+        evt.amount,
+        evt.currency,
+        evt.channel,
+        evt.lat,
+        evt.lon,
+        evt.ip,
+        evt.device_id,
+        status
+    ]
+
+# Insert-if-absent on the unique EVENT_ID: a retried or replayed event whose row is already
+# committed (e.g. a later step failed after insert_transaction) is a no-op instead of ORA-00001
+_SQL_INSERT_TRANSACTION = f"""
+    MERGE INTO {config.TBL_TRANSACTIONS} t
+    USING (SELECT :1 AS EVENT_ID, :2 AS EVENT_TS, :3 AS ACCOUNT_ID, :4 AS COUNTERPARTY_ACCT, :5 AS MERCHANT_ID,
+                  :6 AS AMOUNT, :7 AS CURRENCY, :8 AS CHANNEL, :9 AS GEOLAT, :10 AS GEOLON, :11 AS IP_ADDR,
+                  :12 AS DEVICE_ID, :13 AS STATUS FROM dual) s
+    ON (t.EVENT_ID = s.EVENT_ID)
+    WHEN NOT MATCHED THEN INSERT
+    (EVENT_ID, EVENT_TS, ACCOUNT_ID, COUNTERPARTY_ACCT, MERCHANT_ID, AMOUNT, CURRENCY,
+     CHANNEL, GEOLAT, GEOLON, IP_ADDR, DEVICE_ID, STATUS, CREATED_AT)
+    VALUES (s.EVENT_ID, s.EVENT_TS, s.ACCOUNT_ID, s.COUNTERPARTY_ACCT, s.MERCHANT_ID, s.AMOUNT, s.CURRENCY,
+            s.CHANNEL, s.GEOLAT, s.GEOLON, s.IP_ADDR, s.DEVICE_ID, s.STATUS, SYSTIMESTAMP AT TIME ZONE 'UTC')
+"""
+
+def _insert_transactions(cur, evts: List[TransactionEvent]):
+    # Insert into fg_transaction table. Map optional/extra fields using evt.extra when needed.
+    cur.executemany(_SQL_INSERT_TRANSACTION, [_transaction_row(e) for e in evts])
+
+@timed
+def insert_transaction(evt: TransactionEvent):
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [
-                evt.event_id,
-                evt.timestamp,
-                evt.account_id,
-                counterparty,
-                evt.merchant_id,
-                evt.amount,
-                evt.currency,
-                evt.channel,
-                evt.lat,
-                evt.lon,
-                evt.ip,
-                evt.device_id,
-                status
-            ])
+            _insert_transactions(cur, [evt])
         con.commit()
 
+_SQL_UPSERT_DEVICE_SEEN = f"""
+    MERGE INTO {config.TBL_DEVICES_SEEN} d
+    USING (SELECT :account_id AS CUSTOMER_ID, :device_id AS DEVICE_FINGERPRINT FROM dual) s
+    ON (d.CUSTOMER_ID = s.CUSTOMER_ID AND d.DEVICE_FINGERPRINT = s.DEVICE_FINGERPRINT)
+    WHEN MATCHED THEN UPDATE SET LAST_SEEN_AT = SYSTIMESTAMP AT TIME ZONE 'UTC'
+    WHEN NOT MATCHED THEN INSERT (CUSTOMER_ID, DEVICE_ID, DEVICE_FINGERPRINT,LAST_SEEN_AT)
+    VALUES (s.CUSTOMER_ID, fg_device_seq.NEXTVAL ,s.DEVICE_FINGERPRINT, SYSTIMESTAMP AT TIME ZONE 'UTC')
+"""
+
+def _upsert_devices_seen(cur, pairs: List[Tuple[str, str]]):
+    cur.executemany(_SQL_UPSERT_DEVICE_SEEN, [dict(account_id=a, device_id=d) for a, d in pairs])
+
+@timed
 def upsert_device_seen(account_id: str, device_id: Optional[str]):
     try:
         if not device_id:
             return
-        sql = f"""
-            MERGE INTO {config.TBL_DEVICES_SEEN} d
-            USING (SELECT :account_id AS CUSTOMER_ID, :device_id AS DEVICE_FINGERPRINT FROM dual) s
-            ON (d.CUSTOMER_ID = s.CUSTOMER_ID AND d.DEVICE_FINGERPRINT = s.DEVICE_FINGERPRINT)
-            WHEN NOT MATCHED THEN INSERT (CUSTOMER_ID, DEVICE_ID, DEVICE_FINGERPRINT,LAST_SEEN_AT)
-            VALUES (s.CUSTOMER_ID, fg_device_seq.NEXTVAL ,s.DEVICE_FINGERPRINT, SYSTIMESTAMP AT TIME ZONE 'UTC')
-        """
-        print("upsert_device_seen:", account_id, device_id,sql)
         with get_connection() as con:
             with con.cursor() as cur:
-                cur.execute(sql, dict(account_id=account_id, device_id=device_id))
+                _upsert_devices_seen(cur, [(account_id, device_id)])
             con.commit()
-        print("upsert_device_seen completed:", account_id, device_id)
+    except Exception:
+        log.exception("upsert_device_seen failed", extra={"account_id": account_id, "device_id": device_id})
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
 
+@timed
+def upsert_devices_seen(pairs: List[Tuple[str, str]]):
+    # Bulk variant used by the device write-behind queue.
+    if not pairs:
+        return
+    with get_connection() as con:
+        with con.cursor() as cur:
+            _upsert_devices_seen(cur, pairs)
+        con.commit()
 
-        
+def is_device_seen(account_id: str, device_id: Optional[str]) -> bool:
+    return device_last_seen(account_id, device_id) is not None
 
+_SQL_DEVICE_LAST_SEEN = f"""
+    SELECT LAST_SEEN_AT FROM {config.TBL_DEVICES_SEEN}
+    WHERE CUSTOMER_ID=:1 AND DEVICE_FINGERPRINT=:2
+      AND LAST_SEEN_AT >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:3, 'DAY')
+    FETCH FIRST 1 ROWS ONLY
+"""
 
-def is_device_seen(account_id: str, device_id: Optional[str]) -> bool:
-    
+@timed
+def device_last_seen(account_id: str, device_id: Optional[str]) -> Optional[datetime]:
+    # LAST_SEEN_AT of the device for the account within DEVICE_WINDOW_DAYS, or None.
     try:
         if not device_id:
-            return False
-        sql = f"SELECT 1 FROM {config.TBL_DEVICES_SEEN} WHERE CUSTOMER_ID=:1 AND DEVICE_FINGERPRINT=:2 FETCH FIRST 1 ROWS ONLY"
+            return None
         with get_connection() as con:
             with con.cursor() as cur:
-                cur.execute(sql, [account_id, device_id])
-                return cur.fetchone() is not None
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        
+                tune_fetch(cur, 1)
+                cur.execute(_SQL_DEVICE_LAST_SEEN, [account_id, device_id, config.DEVICE_WINDOW_DAYS])
+                row = cur.fetchone()
+                return row[0] if row else None
+    except Exception:
+        log.exception("device_last_seen failed", extra={"account_id": account_id, "device_id": device_id})
+
+_SQL_DEVICES_SEEN_SINCE = f"""
+    SELECT CUSTOMER_ID, DEVICE_FINGERPRINT, LAST_SEEN_AT FROM {config.TBL_DEVICES_SEEN}
+    WHERE LAST_SEEN_AT >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:1, 'DAY')
+"""
+
+@timed
+def devices_seen_since(days: int) -> List[Tuple[str, str, datetime]]:
+    # Bulk read used to warm the known-device cache: (CUSTOMER_ID, DEVICE_FINGERPRINT, LAST_SEEN_AT)
+    with get_connection() as con:
+        with con.cursor() as cur:
+            tune_fetch(cur, config.DB_BULK_ARRAYSIZE)
+            cur.execute(_SQL_DEVICES_SEEN_SINCE, [int(days)])
+            return [tuple(r) for r in cur.fetchall()]
 
 def is_merchant_blacklisted(merchant_id: Optional[str]) -> bool:
-    if not merchant_id:
+    return is_blacklisted('MERCHANT', merchant_id)
+
+# fg_blacklist has columns: BL_ID, TYPE, VALUE, REASON, VALID_FROM, VALID_TO
+# A value is considered blacklisted if there's a row with TYPE=bl_type and VALUE=value
+# and the VALID_TO is null or in the future.
+_SQL_IS_BLACKLISTED = f"""
+    SELECT 1 FROM {config.TBL_MERCHANT_BLACKLIST}
+    WHERE TYPE = :1 AND VALUE = :2
+      AND (VALID_TO IS NULL OR VALID_TO > SYSTIMESTAMP AT TIME ZONE 'UTC')
+    FETCH FIRST 1 ROWS ONLY
+"""
+
+@timed
+def is_blacklisted(bl_type: str, value: Optional[str]) -> bool:
+    if not value:
         return False
-    # fg_blacklist has columns: BL_ID, TYPE, VALUE, REASON, VALID_FROM, VALID_TO
-    # A merchant is considered blacklisted if there's a row with TYPE='MERCHANT' and VALUE=merchant_id
-    # and the VALID_TO is null or in the future.
-    sql = f"""
-        SELECT 1 FROM {config.TBL_MERCHANT_BLACKLIST}
-        WHERE TYPE = 'MERCHANT' AND VALUE = :1
-          AND (VALID_TO IS NULL OR VALID_TO > SYSTIMESTAMP AT TIME ZONE 'UTC')
-        FETCH FIRST 1 ROWS ONLY
-    """
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [merchant_id])
+            tune_fetch(cur, 1)
+            cur.execute(_SQL_IS_BLACKLISTED, [bl_type, value])
             return cur.fetchone() is not None
 
-def recent_events(account_id: str, window: timedelta) -> List[Dict[str, Any]]:
-    # Select recent events using EVENT_TS (event timestamp). Also keep CREATED_AT for record insertion time.
-    sql = f"""
-        SELECT EVENT_TS AS CREATED_AT, AMOUNT, GEOLAT, GEOLON, DEVICE_ID, MERCHANT_ID, CHANNEL
-        FROM {config.TBL_TRANSACTIONS}
-        WHERE ACCOUNT_ID=:1 AND EVENT_TS >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:2, 'SECOND')
-        ORDER BY EVENT_TS
+_SQL_LOAD_BLACKLIST = f"SELECT BL_ID, TYPE, VALUE, VALID_FROM, VALID_TO FROM {config.TBL_MERCHANT_BLACKLIST}"
+# named binds (a repeated positional placeholder is bound per occurrence); `since` is read as UTC
+# explicitly so the comparison with the TIMESTAMP WITH TIME ZONE columns ignores the session time zone
+_SQL_LOAD_BLACKLIST_DELTA = _SQL_LOAD_BLACKLIST + (
+    " WHERE BL_ID > :min_id OR VALID_FROM >= FROM_TZ(CAST(:since AS TIMESTAMP), 'UTC')"
+    " OR VALID_TO >= FROM_TZ(CAST(:since AS TIMESTAMP), 'UTC')")
+
+@timed
+def load_blacklist(min_id: Optional[int] = None, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
     """
-    print('recent_events', sql, account_id, window)
+    All fg_blacklist rows, or with `min_id`/`since` only rows added after
+    BL_ID `min_id` or whose VALID_FROM/VALID_TO moved at or after `since`
+    (naive values are taken as UTC).
+    """
+    sql, params = _SQL_LOAD_BLACKLIST, {}
+    if min_id is not None and since is not None:
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        sql, params = _SQL_LOAD_BLACKLIST_DELTA, dict(min_id=min_id, since=since)
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [account_id, int(window.total_seconds())])
+            tune_fetch(cur, config.DB_BULK_ARRAYSIZE)
+            cur.execute(sql, params)
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+# Select recent events using EVENT_TS (event timestamp). Also keep CREATED_AT for record insertion time.
+_SQL_RECENT_EVENTS = f"""
+    SELECT EVENT_TS AS CREATED_AT, AMOUNT, GEOLAT, GEOLON, DEVICE_ID, MERCHANT_ID, CHANNEL
+    FROM {config.TBL_TRANSACTIONS}
+    WHERE ACCOUNT_ID=:1 AND EVENT_TS >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:2, 'SECOND')
+    ORDER BY EVENT_TS
+"""
+
+@timed
+def recent_events(account_id: str, window: timedelta) -> List[Dict[str, Any]]:
+    with get_connection() as con:
+        with con.cursor() as cur:
+            # one account's window is usually a handful of rows; 100 keeps it to a single round trip
+            tune_fetch(cur, 100)
+            cur.execute(_SQL_RECENT_EVENTS, [account_id, int(window.total_seconds())])
             rows = cur.fetchall()
             cols = [d[0] for d in cur.description]
             return [dict(zip(cols, r)) for r in rows]
 
+_SQL_TRANSACTIONS_SINCE = f"""
+    SELECT EVENT_TS, ACCOUNT_ID, AMOUNT, GEOLAT, GEOLON, DEVICE_ID, MERCHANT_ID, CHANNEL, IP_ADDR
+    FROM {config.TBL_TRANSACTIONS}
+    WHERE EVENT_TS >= (SYSTIMESTAMP AT TIME ZONE 'UTC') - NUMTODSINTERVAL(:1, 'SECOND')
+    ORDER BY EVENT_TS
+"""
+
+@timed
+def transactions_since(seconds: int) -> List[Dict[str, Any]]:
+    # Bulk read used to warm the in-memory velocity windows at startup.
+    with get_connection() as con:
+        with con.cursor() as cur:
+            tune_fetch(cur, config.DB_BULK_ARRAYSIZE)
+            cur.execute(_SQL_TRANSACTIONS_SINCE, [int(seconds)])
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+# rows: (key_scope, key_value, window_minutes, txn_count, total_amount)
+_SQL_UPSERT_VELOCITY_COUNTERS = f"""
+    MERGE INTO {config.TBL_VELOCITY_COUNTERS} v
+    USING (SELECT :1 AS KEY_SCOPE, :2 AS KEY_VALUE, :3 AS WINDOW_MINUTES, :4 AS TXN_COUNT, :5 AS TOTAL_AMOUNT FROM dual) s
+    ON (v.KEY_SCOPE = s.KEY_SCOPE AND v.KEY_VALUE = s.KEY_VALUE AND v.WINDOW_MINUTES = s.WINDOW_MINUTES)
+    WHEN MATCHED THEN UPDATE SET
+        TXN_COUNT = s.TXN_COUNT, TOTAL_AMOUNT = s.TOTAL_AMOUNT, UPDATED_AT = SYSTIMESTAMP AT TIME ZONE 'UTC'
+    WHEN NOT MATCHED THEN
+        INSERT (KEY_SCOPE, KEY_VALUE, WINDOW_MINUTES, TXN_COUNT, TOTAL_AMOUNT, UPDATED_AT)
+        VALUES (s.KEY_SCOPE, s.KEY_VALUE, s.WINDOW_MINUTES, s.TXN_COUNT, s.TOTAL_AMOUNT, SYSTIMESTAMP AT TIME ZONE 'UTC')
+"""
+
+@timed
+def upsert_velocity_counters(rows: List[Tuple[str, str, int, int, float]]):
+    with get_connection() as con:
+        with con.cursor() as cur:
+            cur.executemany(_SQL_UPSERT_VELOCITY_COUNTERS, [list(r) for r in rows])
+        con.commit()
+
+_SQL_INSERT_DECISION = f"""
+    INSERT INTO {config.TBL_DECISIONS}
+    (DECISION_ID, EVENT_ID, ACTION, RISK_SCORE, REASONS_JSON, CREATED_AT_UTC)
+    VALUES (fg_decision_seq.NEXTVAL, :1,:2,:3,:4,sysdate)
+"""
+
+def _insert_decisions(cur, decs: List[DecisionOutcome]):
+    import json as _json
+    cur.executemany(_SQL_INSERT_DECISION, [
+        [dec.event_id, dec.action, dec.risk_score, _json.dumps(dec.reasons)]
+        for dec in decs
+    ])
+
+@timed
 def insert_decision(dec: DecisionOutcome):
-    sql = f"""
-        INSERT INTO {config.TBL_DECISIONS}
-        (DECISION_ID, EVENT_ID, ACTION, RISK_SCORE, REASONS_JSON, CREATED_AT_UTC)
-        VALUES (fg_decision_seq.NEXTVAL, :1,:2,:3,:4,sysdate)
+    log.debug("insert_decision", extra={"event_id": dec.event_id, "action": dec.action})
+    with get_connection() as con:
+        with con.cursor() as cur:
+            _insert_decisions(cur, [dec])
+        con.commit()
+
+# REVISION_OF links to the stored DECISION_ID of the event's previous revision: DECISION_ID comes
+# from fg_decision_seq, so the decision_id carried on the decisions topic is never a row key
+_SQL_INSERT_DECISION_REVISION = f"""
+    INSERT INTO {config.TBL_DECISIONS}
+    (DECISION_ID, EVENT_ID, ACTION, RISK_SCORE, REASONS_JSON, CREATED_AT_UTC, REVISION, REVISION_OF)
+    VALUES (fg_decision_seq.NEXTVAL, :event_id, :action, :risk_score, :reasons, sysdate, :revision,
+            (SELECT TO_CHAR(MAX(DECISION_ID)) FROM {config.TBL_DECISIONS}
+              WHERE EVENT_ID = :event_id AND NVL(REVISION, 0) = :revision - 1))
+"""
+
+@timed
+def insert_decision_revision(dec: DecisionOutcome):
+    """
+    Insert an amended decision; the event's earlier FG_DECISIONS rows are
+    kept for audit. REVISION_OF is the stored DECISION_ID of revision
+    `dec.revision - 1` (NULL if that row is not committed yet);
+    `dec.revision_of` stays the published decision_id on the topic.
     """
-    print("insert_decision:", dec)
     import json as _json
+    log.debug("insert_decision_revision", extra={"event_id": dec.event_id, "revision": dec.revision, "action": dec.action})
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [
-                  dec.event_id, dec.action, dec.risk_score,
-                _json.dumps(dec.reasons)
-            ])
+            cur.execute(_SQL_INSERT_DECISION_REVISION, dict(event_id=dec.event_id, action=dec.action,
+                                                            risk_score=dec.risk_score, reasons=_json.dumps(dec.reasons),
+                                                            revision=dec.revision))
         con.commit()
 
-def insert_alerts(alerts: List[Alert]):
-    print(f"insert_alerts: {len(alerts)} alerts")
-    if not alerts:
-        return
-    sql = f"""
-        INSERT INTO {config.TBL_ALERTS}
-        (ALERT_ID, EVENT_ID, TITLE,RISK_SCORE, DECISION, REASON_SUMMARY,CREATED_AT, DECIDED_AT)
-        VALUES (fg_alerts_seq.NEXTVAL,:1,:2,:3,:4,:5,sysdate,sysdate)
-    """
- 
+_SQL_INSERT_ALERT = f"""
+    INSERT INTO {config.TBL_ALERTS}
+    (ALERT_ID, EVENT_ID, TITLE,RISK_SCORE, DECISION, REASON_SUMMARY,CREATED_AT, DECIDED_AT)
+    VALUES (fg_alerts_seq.NEXTVAL,:1,:2,:3,:4,:5,sysdate,sysdate)
+"""
+
+def _insert_alerts(cur, alerts: List[Alert]):
     data = [
         ( a.event_id,  a.title,a.risk_score,a.severity, a.description)
         for a in alerts
     ]
+    cur.executemany(_SQL_INSERT_ALERT, data)
+
+@timed
+def insert_alerts(alerts: List[Alert]):
+    if not alerts:
+        return
+    with get_connection() as con:
+        with con.cursor() as cur:
+            _insert_alerts(cur, alerts)
+        con.commit()
+    log.debug("insert_alerts", extra={"alerts": len(alerts)})
+
+_SQL_LOAD_ACTIVE_RULES = f"""
+    SELECT RULE_ID, RULE_CODE, NAME, SEVERITY, DEFINITION_JSON
+    FROM {config.TBL_RULES}
+    WHERE IS_ACTIVE = 'Y'
+"""
+
+@timed
+def load_active_rules() -> List[Dict[str, Any]]:
+    with get_connection() as con:
+        with con.cursor() as cur:
+            cur.execute(_SQL_LOAD_ACTIVE_RULES)
+            cols = [d[0] for d in cur.description]
+            rows = []
+            for r in cur.fetchall():
+                row = dict(zip(cols, r))
+                # DEFINITION_JSON is a CLOB; read it while the connection is open
+                if hasattr(row["DEFINITION_JSON"], "read"):
+                    row["DEFINITION_JSON"] = row["DEFINITION_JSON"].read()
+                rows.append(row)
+            return rows
+
+# Resolve TXN_ID/RULE_ID in the statement so hits need neither a round trip nor a cached rule_id
+_SQL_INSERT_RULE_HIT = f"""
+    INSERT INTO {config.TBL_RULE_HITS} (TXN_ID, RULE_ID, DETAILS_JSON, HIT_AT)
+    SELECT t.TXN_ID, r.RULE_ID, :3, SYSTIMESTAMP AT TIME ZONE 'UTC'
+    FROM {config.TBL_TRANSACTIONS} t, {config.TBL_RULES} r
+    WHERE t.EVENT_ID = :1 AND r.RULE_CODE = :2
+"""
+
+def _insert_rule_hits(cur, decs: List[DecisionOutcome]):
+    import json as _json
+    rows = [
+        [dec.event_id, h["rule_code"], _json.dumps(h.get("details") or {}, default=str)]
+        for dec in decs for h in dec.rule_hits
+    ]
+    if rows:
+        cur.executemany(_SQL_INSERT_RULE_HIT, rows)
+
+@timed
+def insert_rule_hits(dec: DecisionOutcome):
+    if not dec.rule_hits:
+        return
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.executemany(sql, data)
+            _insert_rule_hits(cur, [dec])
         con.commit()
-    print(f"insert_alerts: done")
-
-def upsert_blacklist(merchant_id: str, is_active: str = 'Y', reason: str = None):
-    # Use MERGE semantics but align to fg_blacklist schema (TYPE, VALUE, REASON, VALID_FROM, VALID_TO)
-    # When activating (is_active='Y'): ensure a row exists with VALID_FROM set and VALID_TO NULL.
-    # When deactivating (is_active!='Y'): set VALID_TO to now.
-    sql = f"""
-        MERGE INTO {config.TBL_MERCHANT_BLACKLIST} t
-        USING (SELECT :type AS TYPE, :value AS VALUE FROM dual) s
-        ON (t.TYPE = s.TYPE AND t.VALUE = s.VALUE)
-        WHEN MATCHED THEN UPDATE SET
-            REASON = :r,
-            VALID_FROM = NVL(t.VALID_FROM, SYSTIMESTAMP AT TIME ZONE 'UTC'),
-            VALID_TO = CASE WHEN :a = 'Y' THEN NULL ELSE SYSTIMESTAMP AT TIME ZONE 'UTC' END
-        WHEN NOT MATCHED THEN
-            INSERT (TYPE, VALUE, REASON, VALID_FROM, VALID_TO)
-            VALUES (:type, :value, :r, SYSTIMESTAMP AT TIME ZONE 'UTC', NULL)
+
+# ---- Stream offsets (exactly-once consumption) ----------------------------------
+_SQL_LOAD_STREAM_OFFSETS = (f"SELECT PARTITION_ID, LAST_OFFSET FROM {config.TBL_STREAM_OFFSETS} "
+                            f"WHERE CONSUMER_GROUP=:1 AND TOPIC=:2")
+
+# Only advances a partition whose stored offset is below the batch's first offset, so a batch
+# that overlaps work another consumer already made durable matches no row and is rejected.
+_SQL_UPSERT_STREAM_OFFSET = f"""
+    MERGE INTO {config.TBL_STREAM_OFFSETS} t
+    USING (SELECT :1 AS CONSUMER_GROUP, :2 AS TOPIC, :3 AS PARTITION_ID, :4 AS FIRST_OFFSET, :5 AS LAST_OFFSET
+           FROM dual) s
+    ON (t.CONSUMER_GROUP = s.CONSUMER_GROUP AND t.TOPIC = s.TOPIC AND t.PARTITION_ID = s.PARTITION_ID)
+    WHEN MATCHED THEN UPDATE SET LAST_OFFSET = s.LAST_OFFSET, UPDATED_AT = SYSTIMESTAMP AT TIME ZONE 'UTC'
+        WHERE t.LAST_OFFSET < s.FIRST_OFFSET
+    WHEN NOT MATCHED THEN INSERT (CONSUMER_GROUP, TOPIC, PARTITION_ID, LAST_OFFSET, UPDATED_AT)
+        VALUES (s.CONSUMER_GROUP, s.TOPIC, s.PARTITION_ID, s.LAST_OFFSET, SYSTIMESTAMP AT TIME ZONE 'UTC')
+"""
+
+@timed
+def load_stream_offsets(group_id: str, topic: str) -> Dict[int, int]:
+    """{partition: last durably processed offset} for a consumer group and topic."""
+    with get_connection() as con:
+        with con.cursor() as cur:
+            tune_fetch(cur, 100)
+            cur.execute(_SQL_LOAD_STREAM_OFFSETS, [group_id, topic])
+            return {int(p): int(o) for p, o in cur.fetchall()}
+
+def _upsert_stream_offsets(cur, rows: List[Tuple[str, str, int, int, int]]):
+    # rows: (consumer_group, topic, partition, first_offset, last_offset) of the batch
+    cur.executemany(_SQL_UPSERT_STREAM_OFFSET, [list(r) for r in rows])
+    if cur.rowcount < len(rows):
+        raise RuntimeError(f"stale stream offsets: {len(rows) - cur.rowcount} partition(s) already processed past this batch")
+
+@timed
+def persist_batch(events: List[TransactionEvent], decisions: List[DecisionOutcome], alerts: List[Alert],
+                  devices: Optional[List[Tuple[str, str]]] = None, scores: Optional[List[Tuple[Any, ...]]] = None,
+                  offsets: Optional[List[Tuple[str, str, int, int, int]]] = None):
     """
-    params = dict(type='MERCHANT', value=merchant_id, a=is_active, r=reason)
+    Write a micro-batch of transactions, device sightings, decisions, rule hits,
+    alerts and model scores as array DML on a single connection and commit once.
+    Any failure rolls the whole batch back so the caller can re-deliver it.
+    `devices` defaults to every (account, device) pair in `events`. `offsets`
+    (consumer_group, topic, partition, first_offset, last_offset) rows are
+    written first in the same transaction; if any partition was already
+    processed past its first offset the batch is rolled back.
+    """
+    if devices is None:
+        devices = [(e.account_id, e.device_id) for e in events if e.device_id]
+    devices = list(dict.fromkeys(devices))
+    with get_connection() as con:
+        try:
+            with con.cursor() as cur:
+                if offsets:
+                    # first, so the offset rows are locked before any other DML
+                    _upsert_stream_offsets(cur, offsets)
+                if events:
+                    _insert_transactions(cur, events)
+                if devices:
+                    _upsert_devices_seen(cur, devices)
+                if decisions:
+                    _insert_decisions(cur, decisions)
+                    _insert_rule_hits(cur, decisions)
+                if alerts:
+                    _insert_alerts(cur, alerts)
+                if scores:
+                    _insert_model_scores(cur, scores)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    log.debug("persist_batch", extra={"events": len(events), "devices": len(devices), "decisions": len(decisions),
+                                      "alerts": len(alerts), "scores": len(scores or []), "offsets": len(offsets or [])})
+
+# Use MERGE semantics but align to fg_blacklist schema (TYPE, VALUE, REASON, VALID_FROM, VALID_TO)
+# When activating (is_active='Y'): ensure a row exists with VALID_FROM set and VALID_TO NULL.
+#   Re-activating a closed entry restarts VALID_FROM so incremental snapshot refreshes see it.
+# When deactivating (is_active!='Y'): set VALID_TO to now.
+_SQL_UPSERT_BLACKLIST = f"""
+    MERGE INTO {config.TBL_MERCHANT_BLACKLIST} t
+    USING (SELECT :type AS TYPE, :value AS VALUE FROM dual) s
+    ON (t.TYPE = s.TYPE AND t.VALUE = s.VALUE)
+    WHEN MATCHED THEN UPDATE SET
+        REASON = :r,
+        VALID_FROM = CASE WHEN :a = 'Y' AND t.VALID_TO IS NOT NULL THEN SYSTIMESTAMP AT TIME ZONE 'UTC'
+                          ELSE NVL(t.VALID_FROM, SYSTIMESTAMP AT TIME ZONE 'UTC') END,
+        VALID_TO = CASE WHEN :a = 'Y' THEN NULL ELSE SYSTIMESTAMP AT TIME ZONE 'UTC' END
+    WHEN NOT MATCHED THEN
+        INSERT (TYPE, VALUE, REASON, VALID_FROM, VALID_TO)
+        VALUES (:type, :value, :r, SYSTIMESTAMP AT TIME ZONE 'UTC', NULL)
+"""
+
+@timed
+def upsert_blacklist(merchant_id: str, is_active: str = 'Y', reason: str = None, bl_type: str = 'MERCHANT'):
+    params = dict(type=bl_type, value=merchant_id, a=is_active, r=reason)
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, params)
+            cur.execute(_SQL_UPSERT_BLACKLIST, params)
         con.commit()
 
 
 # ---- Model registry / scores --------------------------------------------------
-def get_active_model_id(model_name: str) -> str:
+_SQL_ACTIVE_MODEL = (f"SELECT MODEL_ID, VERSION FROM {config.TBL_MODEL_VERSIONS} "
+                     f"WHERE MODEL_NAME=:1 AND IS_ACTIVE='Y' FETCH FIRST 1 ROWS ONLY")
+
+@timed
+def get_active_model(model_name: str) -> Dict[str, Any]:
     """
-    Return the active model_id for a model name from FG_MODEL_VERSIONS.
+    Return the active MODEL_ID and VERSION for a model name from FG_MODEL_VERSIONS.
     Expected columns: MODEL_ID, MODEL_NAME, VERSION, IS_ACTIVE ('Y'/'N').
     """
-    sql = f"SELECT MODEL_ID FROM {config.TBL_MODEL_VERSIONS} WHERE MODEL_NAME=:1 AND IS_ACTIVE='Y' FETCH FIRST 1 ROWS ONLY"
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [model_name])
+            tune_fetch(cur, 1)
+            cur.execute(_SQL_ACTIVE_MODEL, [model_name])
             row = cur.fetchone()
             if not row:
                 raise RuntimeError(f"No active model for {model_name}")
-            return row[0]
+            return {"MODEL_ID": row[0], "VERSION": row[1]}
 
-def insert_model_score(txn_id: str, model_id: str, risk_score: float, threshold_used: float, inference_ms: int, explain_json: dict):
-    sql = f"""
-        INSERT INTO {config.TBL_MODEL_SCORES}
-        (TXN_ID, MODEL_ID, RISK_SCORE, THRESHOLD_USED, INFERENCE_MS, EXPLAIN_JSON, CREATED_AT_UTC)
-        VALUES (:1,:2,:3,:4,:5,:6,SYSTIMESTAMP AT TIME ZONE 'UTC')
+def get_active_model_id(model_name: str) -> str:
+    """
+    Return the active model_id for a model name from FG_MODEL_VERSIONS.
     """
+    return get_active_model(model_name)["MODEL_ID"]
+
+_SQL_INSERT_MODEL_SCORE = f"""
+    INSERT INTO {config.TBL_MODEL_SCORES}
+    (TXN_ID, MODEL_ID, RISK_SCORE, THRESHOLD_USED, INFERENCE_MS, EXPLAIN_JSON, CREATED_AT_UTC)
+    VALUES (:1,:2,:3,:4,:5,:6,SYSTIMESTAMP AT TIME ZONE 'UTC')
+"""
+
+def _insert_model_scores(cur, rows: List[Tuple[Any, ...]]):
+    # rows: (txn_id, model_id, risk_score, threshold_used, inference_ms, explain_json)
     import json as _json
+    cur.executemany(_SQL_INSERT_MODEL_SCORE, [
+        [txn_id, model_id, float(risk_score), float(threshold_used), float(inference_ms), _json.dumps(explain_json or {})]
+        for txn_id, model_id, risk_score, threshold_used, inference_ms, explain_json in rows
+    ])
+
+@timed
+def insert_model_scores(rows: List[Tuple[Any, ...]]):
+    if not rows:
+        return
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [
-                txn_id, model_id, float(risk_score), float(threshold_used), int(inference_ms),
-                _json.dumps(explain_json or {})
-            ])
+            _insert_model_scores(cur, rows)
         con.commit()
 
+@timed
+def insert_model_score(txn_id: str, model_id: str, risk_score: float, threshold_used: float, inference_ms: int, explain_json: dict):
+    with get_connection() as con:
+        with con.cursor() as cur:
+            _insert_model_scores(cur, [(txn_id, model_id, risk_score, threshold_used, inference_ms, explain_json)])
+        con.commit()
+
+_SQL_LATEST_MODEL_SCORE = f"""
+    SELECT TXN_ID, MODEL_ID, RISK_SCORE, THRESHOLD_USED, INFERENCE_MS, EXPLAIN_JSON, CREATED_AT_UTC
+    FROM {config.TBL_MODEL_SCORES}
+    WHERE TXN_ID=:1
+    ORDER BY CREATED_AT_UTC DESC
+    FETCH FIRST 1 ROWS ONLY
+"""
+
+@timed
 def get_latest_model_score(txn_id: str):
-    sql = f"""
-        SELECT TXN_ID, MODEL_ID, RISK_SCORE, THRESHOLD_USED, INFERENCE_MS, EXPLAIN_JSON, CREATED_AT_UTC
-        FROM {config.TBL_MODEL_SCORES}
-        WHERE TXN_ID=:1
-        ORDER BY CREATED_AT_UTC DESC
-        FETCH FIRST 1 ROWS ONLY
-    """
     with get_connection() as con:
         with con.cursor() as cur:
-            cur.execute(sql, [txn_id])
+            tune_fetch(cur, 1)
+            cur.execute(_SQL_LATEST_MODEL_SCORE, [txn_id])
             row = cur.fetchone()
             if not row:
                 return None
@@ -219,3 +533,71 @@ def get_latest_model_score(txn_id: str):
             except Exception:
                 pass
             return rec
+
+
+# ---- Dashboard aggregates (rollup seeding / reconciliation) -------------------
+def _rows(sql: str, params=None, rows: int = 0) -> List[Dict[str, Any]]:
+    # `rows`: expected row count (page size), sizes the fetch; 0 means a bulk read
+    with get_connection() as con:
+        with con.cursor() as cur:
+            tune_fetch(cur, rows or config.DB_BULK_ARRAYSIZE)
+            cur.execute(sql, params or [])
+            cols = [d[0].lower() for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+_SQL_MODEL_SCORE_HISTOGRAM = f"""
+    SELECT LEAST(9, FLOOR(risk_score / 10)) AS bucket, COUNT(*) AS cnt
+    FROM {config.TBL_MODEL_SCORES} WHERE risk_score IS NOT NULL
+    GROUP BY LEAST(9, FLOOR(risk_score / 10))
+"""
+
+@timed
+def model_score_histogram() -> List[int]:
+    """FG_MODEL_SCORES counts in 10 buckets of 10 points, bucketed in the database."""
+    buckets = [0] * 10
+    for r in _rows(_SQL_MODEL_SCORE_HISTOGRAM, rows=10):
+        buckets[max(0, int(r["bucket"]))] += int(r["cnt"])
+    return buckets
+
+_SQL_CHANNEL_COUNTS = f"SELECT channel, COUNT(*) AS cnt FROM {config.TBL_TRANSACTIONS} GROUP BY channel"
+
+@timed
+def channel_counts() -> Dict[str, int]:
+    return {r["channel"]: int(r["cnt"]) for r in _rows(_SQL_CHANNEL_COUNTS, rows=20)}
+
+_SQL_NOTIFICATION_STATUS_COUNTS = f"SELECT status, COUNT(*) AS cnt FROM {config.TBL_NOTIFICATIONS} GROUP BY status"
+
+@timed
+def notification_status_counts() -> Dict[str, int]:
+    return {(r["status"] or "").upper(): int(r["cnt"]) for r in _rows(_SQL_NOTIFICATION_STATUS_COUNTS, rows=20)}
+
+_SQL_DAILY_RISK_ROLLUP = f"""
+    SELECT day_dt, txn_cnt, txn_amt, avg_risk, alert_cnt FROM {config.TBL_DAILY_RISK_ROLLUP}
+    ORDER BY day_dt DESC FETCH FIRST :1 ROWS ONLY
+"""
+
+@timed
+def daily_risk_rollup(days: int = 30) -> List[Dict[str, Any]]:
+    return _rows(_SQL_DAILY_RISK_ROLLUP, [int(days)], rows=int(days))
+
+_SQL_LATEST_TRANSACTIONS = f"""
+    SELECT t.event_id, t.amount, t.channel, d.action AS status, d.risk_score, t.event_ts, t.created_at
+    FROM {config.TBL_TRANSACTIONS} t
+    OUTER APPLY (
+        SELECT action, risk_score FROM {config.TBL_DECISIONS} x
+        WHERE x.event_id = t.event_id ORDER BY x.decision_id DESC FETCH FIRST 1 ROWS ONLY
+    ) d
+    WHERE (:ts IS NULL OR t.event_ts < :ts OR (t.event_ts = :ts AND t.event_id < :eid))
+    ORDER BY t.event_ts DESC, t.event_id DESC
+    FETCH FIRST :lim ROWS ONLY
+"""
+
+@timed
+def latest_transactions(limit: int, before: Optional[Tuple[datetime, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Newest transactions with their latest decision, keyset-paginated on
+    (EVENT_TS, EVENT_ID): pass the last row's pair as `before` for the next page.
+    """
+    ts, event_id = before if before else (None, None)
+    # named binds: a positional placeholder repeated in the text is bound once per occurrence
+    return _rows(_SQL_LATEST_TRANSACTIONS, dict(ts=ts, eid=event_id, lim=int(limit)), rows=int(limit))
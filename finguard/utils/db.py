@@ -1,21 +1,131 @@
+import threading
+import time
 import oracledb
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from ..config import settings as config
+from . import metrics
+from .log import get_logger
+
+log = get_logger(__name__)
 
 _pool: Optional[oracledb.ConnectionPool] = None
+_pool_lock = threading.Lock()
+# "server", "consumer" or "worker" (a process lane); decides the pool size, see pool_size()
+_role = "consumer"
+
+# acquire telemetry for pool_stats(); the histogram carries the distribution for /metrics
+_stats_lock = threading.Lock()
+_acquires = 0
+_failures = 0
+_wait_total = 0.0
+_wait_max = 0.0
+
+def pool_size(role: str) -> Tuple[int, int]:
+    """(min, max) connections for a process role: its concurrent DB users plus DB_POOL_BACKGROUND."""
+    if role == "server":
+        # handler threads, /decide workers and the workflow read threads they fan out to, plus the /decide writer
+        users = config.SERVER_THREADS + config.DECIDE_WORKERS + config.EXECUTOR_WORKERS + 1
+    elif role == "worker":
+        users = 1
+    else:
+        lanes = config.WORKER_COUNT if config.CONSUMER_MODE == "parallel" and config.WORKER_KIND == "thread" else 1
+        # lanes (or the poll thread), the write-behind writer and the retry scheduler
+        users = lanes + 2
+    hi = config.DB_POOL_MAX or users + config.DB_POOL_BACKGROUND
+    lo = config.DB_POOL_MIN or (1 if role == "worker" else max(2, hi // 2))
+    return min(lo, hi), hi
+
+def set_role(role: str):
+    """Size this process's pool for `role` ("server", "consumer" or "worker"); call before the pool exists."""
+    global _role
+    if _pool is not None and role != _role:
+        log.warning("Oracle pool already created; role change ignored", extra={"role": _role, "requested": role})
+        return
+    _role = role
 
 def get_pool() -> oracledb.ConnectionPool:
     global _pool
     if _pool is None:
-        _pool = oracledb.ConnectionPool(
-            user=config.ORACLE_USER,
-            password=config.ORACLE_PASSWORD,
-            dsn=config.ORACLE_DSN,
-            min=1, max=8, increment=1,
-            homogeneous=True,
-            timeout=60
-        )
+        with _pool_lock:
+            if _pool is None:
+                lo, hi = pool_size(_role)
+                log.info("creating Oracle pool", extra={"dsn": config.ORACLE_DSN, "user": config.ORACLE_USER,
+                                                        "role": _role, "min": lo, "max": hi})
+                _pool = oracledb.ConnectionPool(
+                    user=config.ORACLE_USER,
+                    password=config.ORACLE_PASSWORD,
+                    dsn=config.ORACLE_DSN,
+                    min=lo, max=hi, increment=config.DB_POOL_INCREMENT,
+                    homogeneous=True,
+                    timeout=config.DB_POOL_IDLE_TIMEOUT_SEC,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=config.DB_POOL_WAIT_TIMEOUT_MS,
+                    stmtcachesize=config.DB_STMT_CACHE_SIZE,
+                )
     return _pool
 
+def _record_acquire(waited: float, failed: bool):
+    global _acquires, _failures, _wait_total, _wait_max
+    with _stats_lock:
+        _acquires += 1
+        _wait_total += waited
+        if waited > _wait_max:
+            _wait_max = waited
+        if failed:
+            _failures += 1
+    metrics.DB_ACQUIRE_SECONDS.observe(waited)
+    if failed:
+        metrics.DB_ACQUIRE_FAILURES.inc()
+
 def get_connection():
-    return get_pool().acquire()
+    pool = get_pool()
+    t0 = time.perf_counter()
+    try:
+        con = pool.acquire()
+    except oracledb.Error:
+        _record_acquire(time.perf_counter() - t0, True)
+        raise
+    _record_acquire(time.perf_counter() - t0, False)
+    return con
+
+def warm_pool():
+    """Create the pool and hold its min connections at once so all of them are open before traffic arrives."""
+    pool = get_pool()
+    held = []
+    try:
+        for _ in range(pool.min):
+            held.append(pool.acquire())
+    finally:
+        for con in held:
+            pool.release(con)
+    log.info("Oracle pool warm", extra={"open": pool.opened, "min": pool.min, "max": pool.max})
+
+def tune_fetch(cur, rows: int):
+    """
+    Size a cursor's fetch for `rows` expected rows before execute: one round
+    trip brings them all, and the extra prefetched row detects end-of-fetch.
+    """
+    cur.arraysize = max(1, rows)
+    cur.prefetchrows = cur.arraysize + 1
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool sizing, occupancy and acquire wait times for capacity planning; {} before the pool exists."""
+    pool = _pool
+    if pool is None:
+        return {}
+    with _stats_lock:
+        acquires, failures, wait_total, wait_max = _acquires, _failures, _wait_total, _wait_max
+    return {
+        "role": _role,
+        "min": pool.min,
+        "max": pool.max,
+        "increment": pool.increment,
+        "open": pool.opened,
+        "busy": pool.busy,
+        "stmt_cache_size": pool.stmtcachesize,
+        "wait_timeout_ms": pool.wait_timeout,
+        "acquires": acquires,
+        "acquire_failures": failures,
+        "acquire_wait_avg_ms": round(wait_total / acquires * 1000, 3) if acquires else 0.0,
+        "acquire_wait_max_ms": round(wait_max * 1000, 3),
+    }
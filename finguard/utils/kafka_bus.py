@@ -1,16 +1,167 @@
 import json
-from typing import Callable, Optional
-from kafka import KafkaProducer, KafkaConsumer
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from kafka import KafkaProducer, KafkaConsumer, TopicPartition, ConsumerRebalanceListener
 from kafka.errors import NoBrokersAvailable
+from kafka.structs import OffsetAndMetadata
 from ..config import settings as config
+from . import metrics
+from .log import get_logger
+
+log = get_logger(__name__)
+
+# pause after seeking a partition back to a failed record before running it again
+REWIND_BACKOFF_SEC = 1.0
+
+class _LagReporter:
+    """Samples consumer lag into finguard_consumer_lag at most every METRICS_LAG_INTERVAL_SEC."""
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self._next = 0.0
+
+    def maybe_report(self):
+        now = time.monotonic()
+        if now < self._next:
+            return
+        self._next = now + config.METRICS_LAG_INTERVAL_SEC
+        try:
+            metrics.report_lag(self.consumer)
+        except Exception as e:
+            log.debug("lag sample failed", extra={"error": str(e)})
+
+def _offset_meta(offset: int) -> OffsetAndMetadata:
+    # kafka-python >= 2.1 added leader_epoch to OffsetAndMetadata
+    try:
+        return OffsetAndMetadata(offset, None, -1)
+    except TypeError:
+        return OffsetAndMetadata(offset, None)
+
+def _route(on_error, value: dict, exc: Exception, source: Optional[Dict[str, Any]]) -> bool:
+    """
+    Hand a failed record to `on_error(value, exc, source)` and wait for the
+    send future it returns (RetryRouter.fail). True only once the record is
+    on its retry tier or the DLQ, i.e. its offset may be released.
+    """
+    if on_error is None:
+        return False
+    try:
+        fut = on_error(value, exc, source)
+        if fut is not None:
+            fut.get(timeout=config.KAFKA_PUBLISH_TIMEOUT_SEC)
+        return True
+    except Exception:
+        log.exception("failed to route a failed record", extra=source or {})
+        return False
+
+class OffsetTracker:
+    """
+    Tracks in-flight offsets per partition when records complete out of order
+    and reports, per partition, the next offset that is safe to commit: one
+    past the highest offset below which every record has completed. A failed
+    record holds its partition's commit point until the partition is rewound
+    to it; records behind it that already completed are remembered so the
+    re-delivery skips them instead of running them twice. `forget` starts a
+    new generation of a partition: completions of records tracked before it
+    are ignored, so a straggler cannot settle a re-delivered copy.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # offset -> False while running, True once done, None if it failed
+        self._pending: Dict[TopicPartition, Dict[int, Optional[bool]]] = {}
+        self._committable: Dict[TopicPartition, int] = {}
+        self._skip: Dict[TopicPartition, set] = {}
+        self._gen: Dict[TopicPartition, int] = {}
+
+    def track(self, tp: TopicPartition, offset: int) -> int:
+        """Start tracking `offset`; returns the partition's generation to pass to `done` and `fail`."""
+        with self._lock:
+            self._pending.setdefault(tp, {})[offset] = False
+            return self._gen.get(tp, 0)
+
+    def current(self, tp: TopicPartition, gen: Optional[int]) -> bool:
+        """False for a record tracked before `tp` was last forgotten (revoked)."""
+        with self._lock:
+            return gen is None or gen == self._gen.get(tp, 0)
+
+    def done(self, tp: TopicPartition, offset: int, gen: Optional[int] = None):
+        with self._lock:
+            pending = self._pending.get(tp)
+            if pending is None or offset not in pending or (gen is not None and gen != self._gen.get(tp, 0)):
+                return
+            pending[offset] = True
+            # offsets are tracked in increasing order, so dict order is offset order
+            for off in list(pending):
+                if not pending[off]:
+                    break
+                del pending[off]
+                self._committable[tp] = off + 1
+
+    def fail(self, tp: TopicPartition, offset: int, gen: Optional[int] = None):
+        with self._lock:
+            if gen is not None and gen != self._gen.get(tp, 0):
+                return
+            pending = self._pending.get(tp)
+            if pending is not None and offset in pending:
+                pending[offset] = None
+
+    def settled(self, tp: TopicPartition) -> bool:
+        """True once no record of `tp` is still running."""
+        with self._lock:
+            return all(state is not False for state in self._pending.get(tp, {}).values())
+
+    def rewind(self, tp: TopicPartition) -> Optional[int]:
+        """
+        Drop `tp`'s pending state once it is settled and return its lowest
+        failed offset to seek back to (None if nothing failed). Records above
+        it that completed are skipped when they are delivered again.
+        """
+        with self._lock:
+            pending = self._pending.pop(tp, {})
+            failed = [off for off, state in pending.items() if state is None]
+            if not failed:
+                return None
+            low = min(failed)
+            self._skip.setdefault(tp, set()).update(off for off, state in pending.items() if state and off > low)
+            return low
+
+    def skip(self, tp: TopicPartition, offset: int) -> bool:
+        """True (once) if `offset` already completed before its partition was rewound."""
+        with self._lock:
+            done = self._skip.get(tp)
+            if not done or offset not in done:
+                return False
+            done.discard(offset)
+            return True
+
+    def in_flight(self, tps) -> int:
+        """Records of `tps` still running; failed ones are not waited for."""
+        with self._lock:
+            return sum(1 for tp in tps for state in self._pending.get(tp, {}).values() if state is False)
+
+    def pop_committable(self) -> Dict[TopicPartition, int]:
+        with self._lock:
+            out, self._committable = self._committable, {}
+            return out
+
+    def forget(self, tps):
+        with self._lock:
+            for tp in tps:
+                self._gen[tp] = self._gen.get(tp, 0) + 1
+                self._pending.pop(tp, None)
+                self._committable.pop(tp, None)
+                self._skip.pop(tp, None)
 
 class KafkaBus:
-    def __init__(self, bootstrap_servers: Optional[str] = None):
+    def __init__(self, bootstrap_servers: Optional[str] = None, max_inflight: Optional[int] = None):
         self.bootstrap_servers = bootstrap_servers or config.BOOTSTRAP_SERVERS
         try:
             self.producer = KafkaProducer(
                 bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+                # default=str so pydantic .dict() payloads with datetimes serialize
+                value_serializer=lambda v: json.dumps(v, default=str).encode("utf-8"),
                 key_serializer=lambda k: k.encode("utf-8") if isinstance(k, str) else k,
                 acks="all",
                 linger_ms=10,
@@ -18,23 +169,417 @@ class KafkaBus:
             )
         except NoBrokersAvailable as e:
             raise RuntimeError(f"Cannot connect to Kafka at {self.bootstrap_servers}. Ensure broker is up.") from e
+        self._slots = threading.BoundedSemaphore(max_inflight or config.KAFKA_MAX_INFLIGHT)
+        self.delivered = 0
+        self.failed = 0
 
-    def publish(self, topic: str, value: dict, key: Optional[str] = None):
-        self.producer.send(topic, value=value, key=key)
-        self.producer.flush()
+    def publish(self, topic: str, value: dict, key: Optional[str] = None,
+                on_delivery: Optional[Callable[[Any], None]] = None,
+                on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Queue a record and return its future (`.get(timeout)` blocks for the
+        RecordMetadata) without waiting for the broker, so linger_ms batching
+        applies. At most KAFKA_MAX_INFLIGHT records are unacknowledged per bus;
+        beyond that publish blocks until deliveries complete. Callbacks run on
+        the producer's I/O thread and must not block. Call `flush()` at batch
+        or shutdown boundaries when delivery must be confirmed.
+        """
+        if not self._slots.acquire(timeout=config.KAFKA_PUBLISH_TIMEOUT_SEC):
+            raise RuntimeError(f"Kafka publish to {topic} timed out: {config.KAFKA_MAX_INFLIGHT} records in flight")
+        try:
+            fut = self.producer.send(topic, value=value, key=key)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def _ok(metadata):
+            self._slots.release()
+            self.delivered += 1
+            metrics.BUS_RECORDS.inc(topic, "delivered")
+            if on_delivery is not None:
+                on_delivery(metadata)
+
+        def _err(exc):
+            self._slots.release()
+            self.failed += 1
+            metrics.BUS_RECORDS.inc(topic, "failed")
+            if on_error is not None:
+                on_error(exc)
+            else:
+                log.warning("delivery failed", extra={"topic": topic, "key": key, "error": str(exc)})
+
+        fut.add_callback(_ok)
+        fut.add_errback(_err)
+        return fut
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every queued record is acknowledged (or failed)."""
+        self.producer.flush(timeout=timeout)
 
-    def consume(self, topic: str, group_id: str, handler: Callable[[dict], None], auto_offset_reset: str = "latest"):
+    def close(self, timeout: Optional[float] = None):
+        self.producer.flush(timeout=timeout)
+        self.producer.close(timeout=timeout)
+
+    def consume(self, topic: str, group_id: str, handler: Callable[[dict], None], auto_offset_reset: str = "latest",
+                on_error: Optional[Callable[[dict, Exception, Dict[str, Any]], Any]] = None):
+        """
+        One record per handler call; offsets are committed after each poll,
+        up to the last record that was handled, once the producer is flushed:
+        if anything the handlers published failed, nothing is committed and
+        the poll's records are re-delivered. A record whose handler raises
+        is passed to `on_error(value, exc, source)` (e.g. RetryRouter.fail)
+        so it is retried off the partition; until that send is acknowledged,
+        or without `on_error`, the partition is seeked back to the record and
+        it is re-delivered after REWIND_BACKOFF_SEC.
+        """
         consumer = KafkaConsumer(
             topic,
             bootstrap_servers=self.bootstrap_servers,
             group_id=group_id,
             value_deserializer=lambda v: json.loads(v.decode("utf-8")),
             auto_offset_reset=auto_offset_reset,
-            enable_auto_commit=True,
+            enable_auto_commit=False,
         )
-        for msg in consumer:
+        lag = _LagReporter(consumer)
+        while True:
+            lag.maybe_report()
+            commits: Dict[TopicPartition, int] = {}
+            first: Dict[TopicPartition, int] = {}
+            rewound = False
+            failed = self.failed
+            for tp, msgs in consumer.poll(timeout_ms=500).items():
+                for msg in msgs:
+                    first.setdefault(tp, msg.offset)
+                    try:
+                        handler(msg.value)
+                    except Exception as e:
+                        source = {"topic": msg.topic, "partition": msg.partition, "offset": msg.offset}
+                        log.exception("handler error", extra=source)
+                        if not _route(on_error, msg.value, e, source):
+                            consumer.seek(tp, msg.offset)
+                            rewound = True
+                            break
+                    commits[tp] = msg.offset + 1
+            if commits and not self._delivered_since(failed):
+                # decisions or alerts of these records may be lost: run them again instead of committing
+                for tp, off in first.items():
+                    consumer.seek(tp, off)
+                commits, rewound = {}, True
+            if commits:
+                consumer.commit({tp: _offset_meta(off) for tp, off in commits.items()})
+            if rewound:
+                time.sleep(REWIND_BACKOFF_SEC)
+
+    def _delivered_since(self, failed: int) -> bool:
+        """Flush the producer; True if no delivery failed since `self.failed` read `failed`."""
+        try:
+            self.flush(config.KAFKA_PUBLISH_TIMEOUT_SEC)
+        except Exception as e:
+            log.error("producer flush failed", extra={"error": str(e)})
+            return False
+        if self.failed != failed:
+            log.error("deliveries failed; re-running the polled records", extra={"failed": self.failed - failed})
+            return False
+        return True
+
+    def follow(self, topics: List[str], handler: Callable[[str, dict], None], name: str = "finguard-follow") -> threading.Thread:
+        """
+        Broadcast subscription: every caller gets every message from the
+        latest offset (no consumer group), delivered as handler(topic, value)
+        on a daemon thread. Used for control/fan-out streams, not work queues.
+        """
+        def _loop():
+            consumer = KafkaConsumer(
+                *topics,
+                bootstrap_servers=self.bootstrap_servers,
+                group_id=None,
+                value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+                auto_offset_reset="latest",
+                enable_auto_commit=False,
+            )
+            for msg in consumer:
+                try:
+                    handler(msg.topic, msg.value)
+                except Exception:
+                    log.exception("follower error", extra={"topic": msg.topic})
+        t = threading.Thread(target=_loop, name=name, daemon=True)
+        t.start()
+        return t
+
+    def consume_batches(self, topic: str, group_id: str, handler: Callable[[List[dict]], None],
+                        max_records: int = 500, max_wait_ms: int = 200, auto_offset_reset: str = "latest"):
+        """
+        Micro-batch consumption: accumulate up to `max_records` messages or
+        `max_wait_ms` milliseconds, hand them to `handler` as one list, and
+        commit offsets only after the handler returns. If the handler raises
+        (e.g. the DB commit failed), the consumer seeks back to the start of
+        the batch so it is re-delivered.
+        """
+        consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=group_id,
+            value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+            auto_offset_reset=auto_offset_reset,
+            enable_auto_commit=False,
+            max_poll_records=max_records,
+        )
+        lag = _LagReporter(consumer)
+        while True:
+            lag.maybe_report()
+            records: List[dict] = []
+            first_offsets: Dict = {}
+            deadline = time.monotonic() + max_wait_ms / 1000.0
+            while len(records) < max_records:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                polled = consumer.poll(timeout_ms=remaining_ms, max_records=max_records - len(records))
+                for tp, msgs in polled.items():
+                    if msgs:
+                        first_offsets.setdefault(tp, msgs[0].offset)
+                        records.extend(m.value for m in msgs)
+            if not records:
+                continue
+            try:
+                handler(records)
+            except Exception:
+                log.exception("batch handler error, re-delivering", extra={"records": len(records)})
+                for tp, offset in first_offsets.items():
+                    consumer.seek(tp, offset)
+                time.sleep(1.0)
+                continue
+            consumer.commit()
+
+    def consume_transactional(self, topic: str, group_id: str,
+                              handler: Callable[[List[dict], List[Tuple[str, str, int, int, int]]], None],
+                              load_offsets: Callable[[str, str], Dict[int, int]],
+                              max_records: int = 500, max_wait_ms: int = 200, auto_offset_reset: str = "latest"):
+        """
+        Exactly-once micro-batches. `handler(records, offsets)` must write the
+        (group_id, topic, partition, first_offset, last_offset) rows in the same
+        database transaction as the batch's results. Partitions are positioned
+        from `load_offsets(group_id, topic)` ({partition: last_offset}) when
+        assigned and after a failed batch, so work is resumed from what is
+        durable, never re-done or skipped; partitions stay paused while the
+        offsets cannot be read. Kafka commits follow each batch for lag
+        monitoring only.
+        """
+        consumer = KafkaConsumer(
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=group_id,
+            value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+            auto_offset_reset=auto_offset_reset,
+            enable_auto_commit=False,
+            max_poll_records=max_records,
+        )
+        batch: Dict[TopicPartition, list] = {}
+        unpositioned: set = set()
+
+        def _position(tps, fallback: Optional[Dict[TopicPartition, int]] = None):
+            try:
+                stored = load_offsets(group_id, topic)
+            except Exception as e:
+                log.warning("stream offsets unavailable, partitions paused", extra={"error": str(e)})
+                consumer.pause(*tps)
+                unpositioned.update(tps)
+                return
+            for tp in tps:
+                if tp.partition in stored:
+                    consumer.seek(tp, stored[tp.partition] + 1)
+                elif fallback and tp in fallback:
+                    consumer.seek(tp, fallback[tp])
+                unpositioned.discard(tp)
+            consumer.resume(*tps)
+
+        class _Position(ConsumerRebalanceListener):
+            def on_partitions_revoked(self, revoked):
+                # records gathered for partitions that moved away are now another member's to process
+                for tp in revoked:
+                    batch.pop(tp, None)
+                    unpositioned.discard(tp)
+
+            def on_partitions_assigned(self, assigned):
+                if assigned:
+                    _position(list(assigned))
+
+        consumer.subscribe([topic], listener=_Position())
+        lag = _LagReporter(consumer)
+        while True:
+            lag.maybe_report()
+            if unpositioned:
+                _position(list(unpositioned))
+            batch.clear()
+            count = 0
+            deadline = time.monotonic() + max_wait_ms / 1000.0
+            while count < max_records:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                polled = consumer.poll(timeout_ms=remaining_ms, max_records=max_records - count)
+                for tp, msgs in polled.items():
+                    if msgs:
+                        batch.setdefault(tp, []).extend(msgs)
+                        count += len(msgs)
+            if not batch:
+                if unpositioned:
+                    time.sleep(1.0)
+                continue
+            first = {tp: msgs[0].offset for tp, msgs in batch.items()}
+            last = {tp: msgs[-1].offset for tp, msgs in batch.items()}
+            records = [m.value for msgs in batch.values() for m in msgs]
+            try:
+                handler(records, [(group_id, tp.topic, tp.partition, first[tp], last[tp]) for tp in batch])
+            except Exception:
+                log.exception("transactional batch failed, repositioning from stored offsets",
+                              extra={"records": len(records)})
+                time.sleep(1.0)
+                _position(list(first), fallback=first)
+                continue
             try:
-                handler(msg.value)
+                consumer.commit({tp: _offset_meta(off + 1) for tp, off in last.items()})
             except Exception as e:
-                # In production, log and route to a DLQ
-                print(f"[KafkaBus] Handler error: {e}")
+                log.warning("kafka offset commit failed; fg_stream_offsets is authoritative", extra={"error": str(e)})
+
+    def consume_parallel(self, topic: str, group_id: str, submit: Callable[[Optional[str], dict], Future],
+                         max_inflight: int = 1000, commit_interval_ms: int = 1000,
+                         auto_offset_reset: str = "latest",
+                         on_error: Optional[Callable[[dict, Exception, Dict[str, Any]], Any]] = None):
+        """
+        Poll on this thread and hand each record to `submit(key, value)`, which
+        returns a Future (typically from a KeyedWorkerPool). Offsets are
+        committed per partition, only up to the last contiguously completed
+        record, every `commit_interval_ms`. At most `max_inflight` records are
+        outstanding at any time. Handler errors are logged and passed to
+        `on_error` like in `consume`; a failed record counts as done only once
+        that send is acknowledged. Otherwise its partition is paused until its
+        other records settle, then seeked back to the lowest failed offset and
+        resumed after REWIND_BACKOFF_SEC.
+        """
+        consumer = KafkaConsumer(
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=group_id,
+            value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+            key_deserializer=lambda k: k.decode("utf-8") if k is not None else None,
+            auto_offset_reset=auto_offset_reset,
+            enable_auto_commit=False,
+        )
+        tracker = OffsetTracker()
+        slots = threading.BoundedSemaphore(max_inflight)
+        # failures are handled on the poll thread, the only one allowed to touch the consumer
+        failures: "queue.SimpleQueue[Tuple[TopicPartition, int, int, dict, BaseException]]" = queue.SimpleQueue()
+        rewinding: set = set()
+        resume_at: Dict[TopicPartition, float] = {}
+
+        def _commit():
+            offsets = tracker.pop_committable()
+            if offsets:
+                consumer.commit({tp: _offset_meta(off) for tp, off in offsets.items()})
+
+        class _Drain(ConsumerRebalanceListener):
+            def on_partitions_revoked(self, revoked):
+                # let in-flight work for revoked partitions finish, then commit it
+                deadline = time.monotonic() + config.WORKER_REVOKE_DRAIN_SEC
+                while tracker.in_flight(revoked) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                _commit()
+                running = tracker.in_flight(revoked)
+                if running:
+                    # their offsets stay uncommitted: the new owner runs them again, and when they finish
+                    # here the tracker's new generation keeps them from settling anything
+                    log.warning("revoked partitions still running after the drain; records will be re-delivered",
+                                extra={"running": running, "drain_sec": config.WORKER_REVOKE_DRAIN_SEC,
+                                       "partitions": sorted(f"{tp.topic}-{tp.partition}" for tp in revoked)})
+                tracker.forget(revoked)
+                for tp in revoked:
+                    rewinding.discard(tp)
+                    resume_at.pop(tp, None)
+
+            def on_partitions_assigned(self, assigned):
+                pass
+
+        def _on_done(tp: TopicPartition, offset: int, gen: int, value: dict, fut: Future):
+            slots.release()
+            exc = fut.exception()
+            if exc is None:
+                tracker.done(tp, offset, gen)
+                return
+            tracker.fail(tp, offset, gen)
+            failures.put((tp, offset, gen, value, exc))
+
+        def _handle_failures():
+            while True:
+                try:
+                    tp, offset, gen, value, exc = failures.get_nowait()
+                except queue.Empty:
+                    return
+                source = {"topic": tp.topic, "partition": tp.partition, "offset": offset}
+                log.error("handler error", extra={**source, "error": str(exc)})
+                if not tracker.current(tp, gen):
+                    # its partition was revoked before this ran; the new owner re-runs the record
+                    continue
+                if _route(on_error, value, exc, source):
+                    tracker.done(tp, offset, gen)
+                elif tp in consumer.assignment() and tp not in rewinding:
+                    consumer.pause(tp)
+                    rewinding.add(tp)
+
+        def _rewind():
+            now = time.monotonic()
+            for tp in [tp for tp in rewinding if tracker.settled(tp)]:
+                rewinding.discard(tp)
+                offset = tracker.rewind(tp)
+                if offset is not None:
+                    consumer.seek(tp, offset)
+                    log.warning("partition rewound", extra={"topic": tp.topic, "partition": tp.partition,
+                                                           "offset": offset})
+                resume_at[tp] = now + REWIND_BACKOFF_SEC
+            for tp in [tp for tp, at in resume_at.items() if at <= now]:
+                del resume_at[tp]
+                if tp in consumer.assignment():
+                    consumer.resume(tp)
+
+        consumer.subscribe([topic], listener=_Drain())
+        next_commit = time.monotonic() + commit_interval_ms / 1000.0
+        lag = _LagReporter(consumer)
+        while True:
+            lag.maybe_report()
+            _handle_failures()
+            _rewind()
+            polled = consumer.poll(timeout_ms=100)
+            for tp, msgs in polled.items():
+                for msg in msgs:
+                    if tp in rewinding:
+                        # fetched before the pause; the seek will deliver it again
+                        break
+                    gen = tracker.track(tp, msg.offset)
+                    if tracker.skip(tp, msg.offset):
+                        tracker.done(tp, msg.offset, gen)
+                        continue
+                    slots.acquire()
+                    key = msg.key or (msg.value or {}).get("account_id")
+                    fut = submit(key, msg.value)
+                    fut.add_done_callback(
+                        lambda f, tp=tp, off=msg.offset, g=gen, v=msg.value: _on_done(tp, off, g, v, f))
+            if time.monotonic() >= next_commit:
+                _commit()
+                next_commit = time.monotonic() + commit_interval_ms / 1000.0
+
+_shared_bus: Optional[KafkaBus] = None
+_shared_lock = threading.Lock()
+
+def get_shared_bus() -> KafkaBus:
+    """Process-wide producer for request handlers and tools; one connection and metadata fetch for its lifetime."""
+    global _shared_bus
+    if _shared_bus is None:
+        with _shared_lock:
+            if _shared_bus is None:
+                _shared_bus = KafkaBus()
+    return _shared_bus
+
+def close_shared_bus(timeout: Optional[float] = None):
+    global _shared_bus
+    with _shared_lock:
+        bus, _shared_bus = _shared_bus, None
+    if bus is not None:
+        bus.close(timeout)
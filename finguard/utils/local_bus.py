@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+from .kafka_bus import REWIND_BACKOFF_SEC, _route
+from .log import get_logger
+
+log = get_logger(__name__)
+
+class LocalRecord(Future):
+    """Completed delivery future shaped like kafka-python's (`get`, `add_callback`, `add_errback`)."""
+    def __init__(self, topic: str, offset: int):
+        super().__init__()
+        self.set_result({"topic": topic, "offset": offset})
+
+    def get(self, timeout: Optional[float] = None):
+        return self.result(timeout)
+
+    def add_callback(self, fn: Callable[[Any], None]):
+        fn(self.result())
+        return self
+
+    def add_errback(self, fn: Callable[[Exception], None]):
+        return self
+
+class LocalBus:
+    """
+    In-process stand-in for KafkaBus: one append-only log per topic with
+    per-group offsets, for load generation, benchmarks and tests without a
+    broker. Values are round-tripped through JSON like the real serializer,
+    so consumers see what they would see from Kafka. `publish`, `flush`,
+    `close`, `follow`, `consume` and `consume_batches` match KafkaBus, with
+    one partition per topic; `consume_parallel` and `consume_transactional`
+    need a broker. Consumers return once `close()` is called and the log is
+    drained.
+    """
+    def __init__(self, keep: bool = True):
+        # keep=False only counts records (a sink for generator throughput runs)
+        self.keep = keep
+        self._logs: Dict[str, List[dict]] = {}
+        self._counts: Dict[str, int] = {}
+        self._offsets: Dict[tuple, int] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.delivered = 0
+        self.failed = 0
+
+    def publish(self, topic: str, value: dict, key: Optional[str] = None,
+                on_delivery: Optional[Callable[[Any], None]] = None,
+                on_error: Optional[Callable[[Exception], None]] = None) -> LocalRecord:
+        value = json.loads(json.dumps(value, default=str))
+        with self._cond:
+            offset = self._counts.get(topic, 0)
+            self._counts[topic] = offset + 1
+            if self.keep:
+                self._logs.setdefault(topic, []).append(value)
+            self.delivered += 1
+            self._cond.notify_all()
+        rec = LocalRecord(topic, offset)
+        if on_delivery is not None:
+            on_delivery(rec.result())
+        return rec
+
+    def flush(self, timeout: Optional[float] = None):
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def count(self, topic: str) -> int:
+        return self._counts.get(topic, 0)
+
+    def records(self, topic: str) -> List[dict]:
+        with self._cond:
+            return list(self._logs.get(topic, []))
+
+    def poll(self, topic: str, group_id: str, max_records: int = 500, timeout: Optional[float] = None) -> List[dict]:
+        """Next records for `group_id` (committed on return); waits up to `timeout` for the first one."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                log = self._logs.get(topic, [])
+                pos = self._offsets.get((topic, group_id), 0)
+                if pos < len(log) or self._closed:
+                    out = log[pos:pos + max_records]
+                    self._offsets[(topic, group_id)] = pos + len(out)
+                    return out
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+    def consume(self, topic: str, group_id: str, handler: Callable[[dict], None], auto_offset_reset: str = "earliest",
+                on_error: Optional[Callable[[dict, Exception, Dict[str, Any]], Any]] = None):
+        """
+        One record per handler call. Like KafkaBus.consume, a record whose
+        handler raises goes to `on_error(value, exc, source)`; until that is
+        acknowledged it is re-delivered after REWIND_BACKOFF_SEC. Once the
+        bus is closed a failed record is dropped instead.
+        """
+        while True:
+            with self._cond:
+                pos = self._offsets.get((topic, group_id), 0)
+            batch = self.poll(topic, group_id, max_records=1)
+            if not batch:
+                return
+            try:
+                handler(batch[0])
+            except Exception as e:
+                log.exception("handler error")
+                source = {"topic": topic, "partition": 0, "offset": pos}
+                if not _route(on_error, batch[0], e, source) and not self._closed:
+                    with self._cond:
+                        self._offsets[(topic, group_id)] = pos
+                    time.sleep(REWIND_BACKOFF_SEC)
+
+    def consume_batches(self, topic: str, group_id: str, handler: Callable[[List[dict]], None],
+                        max_records: int = 500, max_wait_ms: int = 200, auto_offset_reset: str = "earliest"):
+        while True:
+            batch = self.poll(topic, group_id, max_records=max_records, timeout=max_wait_ms / 1000.0)
+            if batch:
+                handler(batch)
+            elif self._closed:
+                return
+
+    def follow(self, topics: List[str], handler: Callable[[str, dict], None], name: str = "finguard-follow") -> threading.Thread:
+        group = f"{name}-{id(handler)}"
+        with self._cond:
+            # broadcast from the current end, like KafkaBus.follow
+            for topic in topics:
+                self._offsets[(topic, group)] = len(self._logs.get(topic, []))
+
+        def _loop():
+            while not self._closed:
+                for topic in topics:
+                    for msg in self.poll(topic, group, timeout=0.05):
+                        try:
+                            handler(topic, msg)
+                        except Exception:
+                            log.exception("follower error", extra={"topic": topic})
+        t = threading.Thread(target=_loop, name=name, daemon=True)
+        t.start()
+        return t
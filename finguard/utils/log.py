@@ -0,0 +1,63 @@
+import json
+import logging
+import sys
+import threading
+from datetime import datetime, timezone
+from ..config import settings as config
+
+# LogRecord attributes; anything else on a record came from `extra=` and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_configured = False
+_lock = threading.Lock()
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, then the record's `extra` fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        out.update(_fields(record))
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+class TextFormatter(logging.Formatter):
+    """`ts LEVEL logger msg key=value ...` for terminals."""
+    def format(self, record: logging.LogRecord) -> str:
+        ts = datetime.fromtimestamp(record.created, timezone.utc).strftime("%H:%M:%S.%f")[:-3]
+        line = f"{ts} {record.levelname:<7} {record.name} {record.getMessage()}"
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+def configure(level: str = None, fmt: str = None):
+    """(Re)configure the `finguard` logger tree: one stderr handler, FINGUARD_LOG_LEVEL / FINGUARD_LOG_FORMAT."""
+    global _configured
+    with _lock:
+        root = logging.getLogger("finguard")
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if (fmt or config.LOG_FORMAT) == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.setLevel((level or config.LOG_LEVEL).upper())
+        root.propagate = False
+        _configured = True
+
+def set_level(level: str):
+    logging.getLogger("finguard").setLevel(level.upper())
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under `finguard` (pass __name__); the tree is configured on first use."""
+    if not _configured:
+        configure()
+    return logging.getLogger(name if name.startswith("finguard") else f"finguard.{name}")
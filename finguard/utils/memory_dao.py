@@ -0,0 +1,210 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from ..utils.schemas import TransactionEvent, DecisionOutcome, Alert
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class MemoryDAO:
+    """
+    Dict-backed stand-in for the `dao` module's hot-path functions, returning
+    the same shapes (upper-case column keys) as the Oracle queries. Used by
+    the benchmark harness via `installed()`, which swaps it into `dao` so every
+    caller (memory stores, dispatcher, persistence, model registry) runs
+    unchanged without a database. Not for production use: nothing is durable.
+    """
+    def __init__(self, blacklist: Optional[List[Tuple[str, str]]] = None, rules: Optional[List[Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self.transactions: List[Dict[str, Any]] = []
+        self._event_ids: set = set()
+        self._by_account: Dict[str, List[Dict[str, Any]]] = {}
+        self.devices: Dict[Tuple[str, str], datetime] = {}
+        self.blacklist: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.decisions: List[DecisionOutcome] = []
+        self.alerts: List[Alert] = []
+        self.rule_hits = 0
+        self.scores: Dict[str, Dict[str, Any]] = {}
+        self.velocity_counters: Dict[Tuple[str, str, int], Tuple[int, float]] = {}
+        self.offsets: Dict[Tuple[str, str, int], int] = {}
+        self.rules = list(rules or [])
+        self.commits = 0
+        for bl_type, value in blacklist or []:
+            self.upsert_blacklist(value, "Y", None, bl_type)
+
+    # --- transactions / devices -------------------------------------------------
+    def _add_transactions(self, evts: List[TransactionEvent]):
+        # insert-if-absent on event_id, like the Oracle MERGE
+        for e in evts:
+            if e.event_id in self._event_ids:
+                continue
+            self._event_ids.add(e.event_id)
+            row = {"EVENT_ID": e.event_id, "EVENT_TS": _utc(e.timestamp), "ACCOUNT_ID": e.account_id,
+                   "AMOUNT": e.amount, "GEOLAT": e.lat, "GEOLON": e.lon, "DEVICE_ID": e.device_id,
+                   "MERCHANT_ID": e.merchant_id, "CHANNEL": e.channel, "IP_ADDR": e.ip}
+            self.transactions.append(row)
+            self._by_account.setdefault(e.account_id, []).append(row)
+
+    def insert_transaction(self, evt: TransactionEvent):
+        with self._lock:
+            self._add_transactions([evt])
+            self.commits += 1
+
+    def upsert_device_seen(self, account_id: str, device_id: Optional[str]):
+        if device_id:
+            self.upsert_devices_seen([(account_id, device_id)])
+
+    def upsert_devices_seen(self, pairs: List[Tuple[str, str]]):
+        with self._lock:
+            for pair in pairs:
+                self.devices[pair] = _now()
+            self.commits += 1
+
+    def device_last_seen(self, account_id: str, device_id: Optional[str]) -> Optional[datetime]:
+        from ..config import settings as config
+        seen = self.devices.get((account_id, device_id)) if device_id else None
+        if seen is None or seen < _now() - timedelta(days=config.DEVICE_WINDOW_DAYS):
+            return None
+        return seen
+
+    def is_device_seen(self, account_id: str, device_id: Optional[str]) -> bool:
+        return self.device_last_seen(account_id, device_id) is not None
+
+    def devices_seen_since(self, days: int) -> List[Tuple[str, str, datetime]]:
+        cutoff = _now() - timedelta(days=days)
+        return [(a, d, ts) for (a, d), ts in list(self.devices.items()) if ts >= cutoff]
+
+    def recent_events(self, account_id: str, window: timedelta) -> List[Dict[str, Any]]:
+        cutoff = _now() - window
+        rows = [r for r in self._by_account.get(account_id, []) if r["EVENT_TS"] >= cutoff]
+        return [{"CREATED_AT": r["EVENT_TS"], **{k: r[k] for k in ("AMOUNT", "GEOLAT", "GEOLON", "DEVICE_ID",
+                                                                    "MERCHANT_ID", "CHANNEL")}}
+                for r in sorted(rows, key=lambda r: r["EVENT_TS"])]
+
+    def transactions_since(self, seconds: int) -> List[Dict[str, Any]]:
+        cutoff = _now() - timedelta(seconds=seconds)
+        return sorted((dict(r) for r in self.transactions if r["EVENT_TS"] >= cutoff), key=lambda r: r["EVENT_TS"])
+
+    def upsert_velocity_counters(self, rows: List[Tuple[str, str, int, int, float]]):
+        with self._lock:
+            for scope, key, minutes, count, total in rows:
+                self.velocity_counters[(scope, key, minutes)] = (count, total)
+
+    # --- blacklist ---------------------------------------------------------------
+    def is_blacklisted(self, bl_type: str, value: Optional[str]) -> bool:
+        row = self.blacklist.get((bl_type, value)) if value else None
+        return row is not None and (row["VALID_TO"] is None or row["VALID_TO"] > _now())
+
+    def is_merchant_blacklisted(self, merchant_id: Optional[str]) -> bool:
+        return self.is_blacklisted("MERCHANT", merchant_id)
+
+    def load_blacklist(self, min_id: Optional[int] = None, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        rows = list(self.blacklist.values())
+        if min_id is not None and since is not None:
+            since = _utc(since)
+            rows = [r for r in rows if r["BL_ID"] > min_id or r["VALID_FROM"] >= since
+                    or (r["VALID_TO"] is not None and r["VALID_TO"] >= since)]
+        return [dict(r) for r in rows]
+
+    def upsert_blacklist(self, merchant_id: str, is_active: str = 'Y', reason: str = None, bl_type: str = 'MERCHANT'):
+        with self._lock:
+            row = self.blacklist.get((bl_type, merchant_id))
+            if row is None:
+                row = self.blacklist[(bl_type, merchant_id)] = {
+                    "BL_ID": len(self.blacklist) + 1, "TYPE": bl_type, "VALUE": merchant_id,
+                    "VALID_FROM": _now(), "VALID_TO": None}
+            row["VALID_TO"] = None if is_active == 'Y' else _now()
+
+    # --- decisions / alerts ------------------------------------------------------
+    def insert_decision(self, dec: DecisionOutcome):
+        with self._lock:
+            self.decisions.append(dec)
+            self.commits += 1
+
+    def insert_decision_revision(self, dec: DecisionOutcome):
+        self.insert_decision(dec)
+
+    def insert_rule_hits(self, dec: DecisionOutcome):
+        with self._lock:
+            self.rule_hits += len(dec.rule_hits)
+
+    def insert_alerts(self, alerts: List[Alert]):
+        with self._lock:
+            self.alerts.extend(alerts)
+            self.commits += 1
+
+    def load_active_rules(self) -> List[Dict[str, Any]]:
+        return list(self.rules)
+
+    def load_stream_offsets(self, group_id: str, topic: str) -> Dict[int, int]:
+        with self._lock:
+            return {p: o for (g, t, p), o in self.offsets.items() if g == group_id and t == topic}
+
+    def persist_batch(self, events: List[TransactionEvent], decisions: List[DecisionOutcome], alerts: List[Alert],
+                      devices: Optional[List[Tuple[str, str]]] = None, scores: Optional[List[Tuple[Any, ...]]] = None,
+                      offsets: Optional[List[Tuple[str, str, int, int, int]]] = None):
+        if devices is None:
+            devices = [(e.account_id, e.device_id) for e in events if e.device_id]
+        with self._lock:
+            for group_id, topic, partition, first, _ in offsets or []:
+                if self.offsets.get((group_id, topic, partition), -1) >= first:
+                    raise RuntimeError(f"stale stream offsets for {topic}[{partition}]")
+            for group_id, topic, partition, _, last in offsets or []:
+                self.offsets[(group_id, topic, partition)] = last
+            self._add_transactions(events)
+            for pair in devices:
+                self.devices[pair] = _now()
+            self.decisions.extend(decisions)
+            self.rule_hits += sum(len(d.rule_hits) for d in decisions)
+            self.alerts.extend(alerts)
+            self._add_scores(scores or [])
+            self.commits += 1
+
+    # --- model registry / scores -------------------------------------------------
+    def get_active_model(self, model_name: str) -> Dict[str, Any]:
+        return {"MODEL_ID": f"{model_name}-bench", "VERSION": None}
+
+    def get_active_model_id(self, model_name: str) -> str:
+        return self.get_active_model(model_name)["MODEL_ID"]
+
+    def _add_scores(self, rows: List[Tuple[Any, ...]]):
+        for txn_id, model_id, risk_score, threshold_used, inference_ms, explain_json in rows:
+            self.scores[txn_id] = {"TXN_ID": txn_id, "MODEL_ID": model_id, "RISK_SCORE": float(risk_score),
+                                   "THRESHOLD_USED": float(threshold_used), "INFERENCE_MS": float(inference_ms),
+                                   "EXPLAIN_JSON": explain_json or {}, "CREATED_AT_UTC": _now()}
+
+    def insert_model_scores(self, rows: List[Tuple[Any, ...]]):
+        with self._lock:
+            self._add_scores(rows)
+            self.commits += 1
+
+    def insert_model_score(self, txn_id: str, model_id: str, risk_score: float, threshold_used: float,
+                           inference_ms: int, explain_json: dict):
+        self.insert_model_scores([(txn_id, model_id, risk_score, threshold_used, inference_ms, explain_json)])
+
+    def get_latest_model_score(self, txn_id: str):
+        rec = self.scores.get(txn_id)
+        return dict(rec) if rec else None
+
+    def counts(self) -> Dict[str, int]:
+        return {"transactions": len(self.transactions), "devices": len(self.devices), "decisions": len(self.decisions),
+                "alerts": len(self.alerts), "rule_hits": self.rule_hits, "model_scores": len(self.scores),
+                "commits": self.commits}
+
+    @contextmanager
+    def installed(self):
+        """Swap this store in for the `dao` module functions it implements; restored on exit."""
+        from . import dao
+        names = [n for n in dir(self) if not n.startswith("_") and hasattr(dao, n) and callable(getattr(dao, n))]
+        saved = {n: getattr(dao, n) for n in names}
+        try:
+            for n in names:
+                setattr(dao, n, getattr(self, n))
+            yield self
+        finally:
+            for n, fn in saved.items():
+                setattr(dao, n, fn)
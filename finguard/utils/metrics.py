@@ -0,0 +1,204 @@
+"""
+Pipeline metrics on prometheus_client. Instruments are module-level and
+take positional label values; `span()` and `timed()` record stage and DAO
+latencies into histograms. The MCP server exposes `render()` at /metrics;
+the consumer can serve it from a sidecar thread (`serve`,
+FINGUARD_METRICS_PORT).
+
+With process workers each lane counts in its own process. Set
+PROMETHEUS_MULTIPROC_DIR (an empty, writable directory, wiped before each
+start) and every process writes its samples there; `render()` in the parent
+then sums them across processes. Callback gauges (pool occupancy, stream
+stats) always describe the scraping process only.
+"""
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+import prometheus_client
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# seconds; stage and DAO latencies span ~50 µs (in-memory lookups) to seconds (LLM, commits)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+# samples of every process are aggregated from this directory (process workers); see the module docstring
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+prometheus_client.disable_created_metrics()
+# callback gauges, plus the instruments themselves unless they are collected from the multiprocess directory
+_registry = CollectorRegistry()
+_instruments = None if MULTIPROCESS else _registry
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.label_names = tuple(labels)
+        self._metric = prometheus_client.Counter(name, doc, self.label_names, registry=_instruments)
+
+    def _child(self, labels: Tuple[str, ...]):
+        return self._metric.labels(*labels) if self.label_names else self._metric
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._child(labels).inc(amount)
+
+    def value(self, *labels: str) -> float:
+        """This process's count for `labels`."""
+        return _sample(self, labels, "_total")
+
+class Gauge:
+    """Set directly, or computed at scrape time by `fn` returning {label values: value}."""
+
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (),
+                 fn: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.fn = fn
+        if fn is None:
+            self._metric = prometheus_client.Gauge(name, doc, self.label_names, registry=_instruments,
+                                                   multiprocess_mode="livesum")
+        else:
+            self._metric = None
+            _registry.register(self)
+
+    def set(self, value: float, *labels: str):
+        (self._metric.labels(*labels) if self.label_names else self._metric).set(value)
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.doc, labels=self.label_names)
+        try:
+            for key, value in self.fn().items():
+                family.add_metric([str(x) for x in key], value)
+        except Exception:
+            # a failing source (e.g. pool not created yet) must not break the scrape
+            pass
+        yield family
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.label_names = tuple(labels)
+        self._metric = prometheus_client.Histogram(name, doc, self.label_names, registry=_instruments,
+                                                   buckets=tuple(sorted(buckets)))
+
+    def observe(self, value: float, *labels: str):
+        (self._metric.labels(*labels) if self.label_names else self._metric).observe(value)
+
+    def count(self, *labels: str) -> int:
+        """This process's observation count for `labels`."""
+        return int(_sample(self, labels, "_count"))
+
+def _sample(instrument, labels: Tuple[str, ...], suffix: str) -> float:
+    if len(labels) != len(instrument.label_names):
+        raise ValueError(f"{instrument.name} expects labels {instrument.label_names}")
+    want = {n: str(v) for n, v in zip(instrument.label_names, labels)}
+    for family in instrument._metric.collect():
+        for s in family.samples:
+            if s.name.endswith(suffix) and s.labels == want:
+                return s.value
+    return 0.0
+
+def render() -> str:
+    if MULTIPROCESS:
+        merged = CollectorRegistry()
+        multiprocess.MultiProcessCollector(merged)
+        return (generate_latest(merged) + generate_latest(_registry)).decode("utf-8")
+    return generate_latest(_registry).decode("utf-8")
+
+# ---- pipeline instruments -------------------------------------------------------
+STAGE_SECONDS = Histogram("finguard_stage_seconds", "Latency of each pipeline stage.", ("stage",))
+DAO_SECONDS = Histogram("finguard_dao_seconds", "Latency of each DAO call (connection acquire to commit).", ("call",))
+DAO_ERRORS = Counter("finguard_dao_errors_total", "DAO calls that raised.", ("call",))
+EVENTS = Counter("finguard_events_total", "Transaction events handled, by result (decided, skipped, failed).", ("result",))
+DECISIONS = Counter("finguard_decisions_total", "Decisions by action.", ("action",))
+ALERTS = Counter("finguard_alerts_total", "Alerts raised, by severity.", ("severity",))
+E2E_SECONDS = Histogram("finguard_e2e_seconds", "Send-to-decision latency of events carrying extra.sent_at.")
+BUS_RECORDS = Counter("finguard_bus_records_total", "Records published, by topic and delivery result.", ("topic", "result"))
+CONSUMER_LAG = Gauge("finguard_consumer_lag", "Records behind the partition high watermark, per consumer.",
+                     ("topic", "partition"))
+LLM_CALLS = Counter("finguard_llm_calls_total", "LLM client calls by kind and result (ok, error, timeout, cache_hit, rejected).",
+                    ("kind", "result"))
+LLM_SECONDS = Histogram("finguard_llm_seconds", "Provider latency of LLM calls.", ("kind",))
+RETRY_ROUTED = Counter("finguard_retry_routed_total", "Failed events routed to a retry tier topic or the DLQ.",
+                       ("destination",))
+RETRY_RUNS = Counter("finguard_retry_runs_total", "Re-runs of retried (retry) and replayed (dlq) events, by result.",
+                     ("source", "result"))
+
+def _pool_stats() -> Dict[Tuple[str, ...], float]:
+    from . import db
+    stats = db.pool_stats()
+    return {(state,): stats[state] for state in ("busy", "open", "min", "max") if state in stats}
+
+DB_POOL = Gauge("finguard_db_pool_connections", "Oracle pool connections (busy, open, min, max).", ("state",),
+                fn=_pool_stats)
+DB_ACQUIRE_SECONDS = Histogram("finguard_db_acquire_seconds", "Time spent waiting for a pooled Oracle connection.")
+DB_ACQUIRE_FAILURES = Counter("finguard_db_acquire_failures_total",
+                              "Pool acquires that failed (wait_timeout exceeded or connect error).")
+
+class span:
+    """`with span("perceive"):` records the block's wall time in finguard_stage_seconds."""
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.t0, self.stage)
+        return False
+
+def timed(fn: Callable) -> Callable:
+    """Decorator for DAO functions: latency in finguard_dao_seconds, failures in finguard_dao_errors_total."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def _wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            DAO_ERRORS.inc(name)
+            raise
+        finally:
+            DAO_SECONDS.observe(time.perf_counter() - t0, name)
+    return _wrapper
+
+def report_lag(consumer) -> int:
+    """Set finguard_consumer_lag from a KafkaConsumer's positions and fetched high watermarks; returns the total."""
+    total = 0
+    for tp in consumer.assignment():
+        high = consumer.highwater(tp)
+        if high is None:
+            continue
+        lag = max(0, high - consumer.position(tp))
+        CONSUMER_LAG.set(lag, tp.topic, tp.partition)
+        total += lag
+    return total
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Sidecar /metrics endpoint on a daemon thread (for the consumer, which has no HTTP server)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="finguard-metrics", daemon=True).start()
+    return server
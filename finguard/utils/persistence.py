@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+from ..utils.schemas import TransactionEvent, DecisionOutcome, Alert
+from ..utils import dao
+from .log import get_logger
+
+log = get_logger(__name__)
+
+@dataclass
+class WriteUnit:
+    """
+    Records that must become durable together (e.g. everything one event
+    produced). Rule hits travel on `decisions`; `scores` are FG_MODEL_SCORES
+    rows as (txn_id, model_id, risk_score, threshold_used, inference_ms, explain).
+    """
+    events: List[TransactionEvent] = field(default_factory=list)
+    devices: List[Tuple[str, str]] = field(default_factory=list)
+    decisions: List[DecisionOutcome] = field(default_factory=list)
+    alerts: List[Alert] = field(default_factory=list)
+    scores: List[Tuple[Any, ...]] = field(default_factory=list)
+
+    def size(self) -> int:
+        return (len(self.events) + len(self.devices) + len(self.decisions)
+                + sum(len(d.rule_hits) for d in self.decisions) + len(self.alerts) + len(self.scores))
+
+class PersistenceWriter:
+    """
+    Single write-behind stage for the consumer. Units are queued (bounded, so
+    a slow database applies backpressure to the caller) and coalesced by a
+    background thread into one `dao.persist_batch` call - per-table array DML
+    on one connection with one commit - once `max_records` records are pending
+    or `flush_ms` has passed. A unit is never split across commits.
+
+    `submit` returns a Future that resolves when the unit is committed, so
+    the caller can acknowledge (commit the Kafka offset of) durable work
+    only. If a coalesced batch fails, its units are retried one by one and
+    only the failing ones get the exception.
+    """
+    def __init__(self, max_records: int = 2000, flush_ms: int = 200, max_queue: int = 10_000):
+        self.max_records = max_records
+        self.flush_sec = flush_ms / 1000.0
+        self._q: "queue.Queue[Tuple[Optional[WriteUnit], Optional[Future]]]" = queue.Queue(maxsize=max_queue)
+        self.commits = 0
+        self.failures = 0
+        self._thread = threading.Thread(target=self._run, name="finguard-persistence", daemon=True)
+        self._thread.start()
+
+    def submit(self, unit: WriteUnit) -> Future:
+        fut: Future = Future()
+        self._q.put((unit, fut))
+        return fut
+
+    def enqueue(self, account_id: str, device_id: str, on_dropped: Optional[Callable[[str, str], None]] = None):
+        """Device sighting from KnownDeviceCache; nothing waits on it, `on_dropped` runs if it fails."""
+        fut: Future = Future()
+        if on_dropped is not None:
+            def _done(f: Future):
+                if f.exception() is not None:
+                    on_dropped(account_id, device_id)
+            fut.add_done_callback(_done)
+        self._q.put((WriteUnit(devices=[(account_id, device_id)]), fut))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every unit submitted before this call is committed (or failed)."""
+        marker: Future = Future()
+        self._q.put((None, marker))
+        marker.result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch: List[Tuple[WriteUnit, Optional[Future]]] = []
+            markers: List[Future] = []
+            records = 0
+            deadline = None
+            while records < self.max_records:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    unit, fut = self._q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if unit is None:
+                    # flush marker: write what we have now
+                    markers.append(fut)
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_sec
+                batch.append((unit, fut))
+                records += unit.size()
+            if batch:
+                self._write(batch)
+            for m in markers:
+                m.set_result(None)
+
+    def _write(self, batch: List[Tuple[WriteUnit, Optional[Future]]]):
+        try:
+            self._persist([u for u, _ in batch])
+            self.commits += 1
+            for _, fut in batch:
+                if fut is not None:
+                    fut.set_result(None)
+            return
+        except Exception as e:
+            log.warning("write batch failed, retrying units individually", extra={"units": len(batch), "error": str(e)})
+        for unit, fut in batch:
+            try:
+                self._persist([unit])
+                self.commits += 1
+                if fut is not None:
+                    fut.set_result(None)
+            except Exception as e:
+                self.failures += 1
+                log.error("write unit failed", extra={"error": str(e)})
+                if fut is not None:
+                    fut.set_exception(e)
+
+    @staticmethod
+    def _persist(units: List[WriteUnit]):
+        dao.persist_batch(
+            [e for u in units for e in u.events],
+            [d for u in units for d in u.decisions],
+            [a for u in units for a in u.alerts],
+            devices=[p for u in units for p in u.devices],
+            scores=[s for u in units for s in u.scores],
+        )
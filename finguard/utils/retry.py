@@ -0,0 +1,195 @@
+"""
+Tiered retries and a dead-letter topic for events whose handler raised.
+
+A failed event is wrapped in an envelope (attempt count, due time, error
+history, source offset) and published to the first retry tier; each tier is a
+topic with one fixed delay (RETRY_DELAYS_SEC). `RetryScheduler` re-runs due
+envelopes on its own consumer group, so the main partitions keep moving while
+records wait. A failure moves the envelope up a tier; after the last tier, or
+for errors no retry can fix (malformed payloads), it lands on DLQ_TOPIC with
+the traceback. `replay_dlq` re-runs DLQ records in bulk once the cause is
+fixed.
+"""
+import functools
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from kafka import KafkaConsumer, TopicPartition
+from ..config import settings as config
+from . import metrics
+from .kafka_bus import REWIND_BACKOFF_SEC, KafkaBus, _offset_meta, _route
+from .log import get_logger
+
+log = get_logger(__name__)
+
+# validation and shape errors fail the same way on every attempt: straight to the DLQ
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError)
+
+def retry_topics() -> List[str]:
+    return [f"{config.TRANSACTIONS_TOPIC}.retry.{d}s" for d in config.RETRY_DELAYS_SEC]
+
+def _run(handler: Callable[[dict], Any], event: dict):
+    # handlers may return the Future of a write-behind unit; the event only counts once it is durable
+    res = handler(event)
+    if isinstance(res, Future):
+        res.result()
+
+class RetryRouter:
+    """Publishes a failed event, or a retry envelope that failed again, to its next tier or the DLQ."""
+    def __init__(self, bus: KafkaBus):
+        self.bus = bus
+        self.topics = retry_topics()
+
+    def fail(self, value: dict, exc: BaseException, source: Optional[Dict[str, Any]] = None, dead: bool = False):
+        """
+        `value` is the raw event (first failure) or the envelope read from a
+        retry tier or the DLQ; `source` is its topic/partition/offset. With
+        `dead` the envelope goes to the DLQ regardless of remaining tiers.
+        Returns the send future: the source record may only be released once
+        it resolves.
+        """
+        env = dict(value) if "event" in value and "attempt" in value else {
+            "event": value, "attempt": 0, "errors": [], "first_failed_at": datetime.now(timezone.utc).isoformat()}
+        env["attempt"] += 1
+        env["errors"] = list(env.get("errors") or []) + [{
+            "attempt": env["attempt"], "error_type": type(exc).__name__, "error": str(exc)[:1000],
+            "at": datetime.now(timezone.utc).isoformat(), "source": source}]
+        tier = env["attempt"] - 1
+        if dead or isinstance(exc, PERMANENT_ERRORS) or tier >= len(self.topics):
+            topic = config.DLQ_TOPIC
+            env["traceback"] = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))[-4000:]
+            env.pop("not_before", None)
+        else:
+            topic = self.topics[tier]
+            env["not_before"] = time.time() + config.RETRY_DELAYS_SEC[tier]
+        event = env["event"] if isinstance(env["event"], dict) else {}
+        fut = self.bus.publish(topic, env, key=event.get("account_id"))
+        metrics.RETRY_ROUTED.inc(topic)
+        log.warning("event routed", extra={"event_id": event.get("event_id"), "topic": topic,
+                                           "attempt": env["attempt"], "error": str(exc)})
+        return fut
+
+class RetryScheduler:
+    """
+    Consumes every retry tier on RETRY_GROUP and runs due envelopes through
+    `handler(event)`. A partition whose head record is not due yet is paused
+    and re-seeked to it until its due time; a tier has one delay, so nothing
+    behind the head is due earlier. An offset is committed only once a failed
+    envelope's next tier has acknowledged it; if that send fails the partition
+    is seeked back to the envelope and it runs again after REWIND_BACKOFF_SEC.
+    """
+    def __init__(self, bus: KafkaBus, handler: Callable[[dict], Any], router: Optional[RetryRouter] = None):
+        self.bus = bus
+        self.handler = handler
+        self.router = router or RetryRouter(bus)
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.run, name="finguard-retry", daemon=True)
+        t.start()
+        return t
+
+    def run(self):
+        consumer = KafkaConsumer(
+            *self.router.topics,
+            bootstrap_servers=self.bus.bootstrap_servers,
+            group_id=config.RETRY_GROUP,
+            value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+            auto_offset_reset="earliest",
+            enable_auto_commit=False,
+        )
+        waiting: Dict[TopicPartition, float] = {}
+        while True:
+            assigned = consumer.assignment()
+            now = time.time()
+            due = [tp for tp, at in waiting.items() if at <= now or tp not in assigned]
+            for tp in due:
+                del waiting[tp]
+            due = [tp for tp in due if tp in assigned]
+            if due:
+                consumer.resume(*due)
+            commits: Dict[TopicPartition, int] = {}
+            rewound = False
+            for tp, msgs in consumer.poll(timeout_ms=500).items():
+                for msg in msgs:
+                    env = msg.value
+                    not_before = float(env.get("not_before") or 0)
+                    if not_before > time.time():
+                        consumer.seek(tp, msg.offset)
+                        consumer.pause(tp)
+                        waiting[tp] = not_before
+                        break
+                    try:
+                        _run(self.handler, env["event"])
+                        metrics.RETRY_RUNS.inc("retry", "ok")
+                    except Exception as e:
+                        metrics.RETRY_RUNS.inc("retry", "failed")
+                        source = {"topic": msg.topic, "partition": msg.partition, "offset": msg.offset}
+                        # re-routed envelopes must be on their next topic before this one lets go of them
+                        if not _route(self.router.fail, env, e, source):
+                            consumer.seek(tp, msg.offset)
+                            rewound = True
+                            break
+                    commits[tp] = msg.offset + 1
+            if commits:
+                consumer.commit({tp: _offset_meta(off) for tp, off in commits.items()})
+            if rewound:
+                time.sleep(REWIND_BACKOFF_SEC)
+
+def replay_dlq(bus: KafkaBus, handler: Callable[[dict], Any], max_records: int = 500,
+               timeout_sec: float = 10.0) -> Dict[str, int]:
+    """
+    Re-run up to `max_records` DLQ records through `handler(event)` (e.g.
+    app.handle_event) once the cause is fixed. The DLQ is read on
+    DLQ_REPLAY_GROUP, so each record is replayed once; records that fail
+    again go back to the DLQ with the new error appended; if that send fails
+    the record stays uncommitted and the replay stops. Stops when the DLQ is
+    drained, `max_records` were read or `timeout_sec` passed.
+    """
+    to_dlq = functools.partial(RetryRouter(bus).fail, dead=True)
+    stats = {"read": 0, "replayed": 0, "failed": 0}
+    consumer = KafkaConsumer(
+        config.DLQ_TOPIC,
+        bootstrap_servers=bus.bootstrap_servers,
+        group_id=config.DLQ_REPLAY_GROUP,
+        value_deserializer=lambda v: json.loads(v.decode("utf-8")),
+        auto_offset_reset="earliest",
+        enable_auto_commit=False,
+    )
+    try:
+        deadline = time.monotonic() + timeout_sec
+        stopped = False
+        while not stopped and stats["read"] < max_records and time.monotonic() < deadline:
+            polled = consumer.poll(timeout_ms=500, max_records=max_records - stats["read"])
+            if not polled:
+                if stats["read"]:
+                    break
+                continue
+            commits: Dict[TopicPartition, int] = {}
+            for tp, msgs in polled.items():
+                for msg in msgs:
+                    stats["read"] += 1
+                    env = msg.value
+                    try:
+                        _run(handler, env.get("event", env))
+                        stats["replayed"] += 1
+                        metrics.RETRY_RUNS.inc("dlq", "ok")
+                    except Exception as e:
+                        stats["failed"] += 1
+                        metrics.RETRY_RUNS.inc("dlq", "failed")
+                        source = {"topic": msg.topic, "partition": msg.partition, "offset": msg.offset}
+                        if not _route(to_dlq, env, e, source):
+                            stopped = True
+                            break
+                    commits[tp] = msg.offset + 1
+                if stopped:
+                    break
+            if commits:
+                consumer.commit({tp: _offset_meta(off) for tp, off in commits.items()})
+    finally:
+        consumer.close()
+    log.info("dlq replay", extra=stats)
+    return stats
@@ -32,6 +32,16 @@ class DecisionOutcome(BaseModel):
     risk_score: float
     reasons: List[str] = Field(default_factory=list)
     created_at: datetime
+    rule_hits: List[Dict[str, Any]] = Field(default_factory=list)
+    # > 0 for an amended decision (e.g. from the async LLM lane); revision_of is the decision_id it supersedes
+    revision: int = 0
+    revision_of: Optional[str] = None
+    # transaction channel, carried so decision consumers can filter without a lookup
+    channel: Optional[str] = None
+    # model risk score when the pipeline scored the event alongside the rules
+    model_score: Optional[float] = None
+    # True when /decide answered with the default action because the latency budget ran out
+    degraded: bool = False
     #workflow_plan: Optional[Dict[str, Any]] = None
 
 class Alert(BaseModel):
@@ -43,3 +53,4 @@ class Alert(BaseModel):
     created_at: Optional[datetime] = None
     tags: Optional[List[str]] = None
     risk_score: Optional[float] = None
+    channel: Optional[str] = None
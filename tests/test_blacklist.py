@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta, timezone
+from finguard.memory.blacklist import BlacklistSnapshot
+from finguard.utils.memory_dao import MemoryDAO
+
+NOW = datetime.now(timezone.utc)
+
+def _row(bl_id, bl_type, value, valid_from=None, valid_to=None):
+    return {"BL_ID": bl_id, "TYPE": bl_type, "VALUE": value, "VALID_FROM": valid_from, "VALID_TO": valid_to}
+
+def test_lookups_cover_every_type():
+    snap = BlacklistSnapshot()
+    snap._apply_rows([_row(1, "MERCHANT", "m1"), _row(2, "device", "d1"), _row(3, "IP", "10.0.0.1")], replace=True)
+    assert snap.is_listed("MERCHANT", "m1")
+    assert snap.is_listed("DEVICE", "d1")
+    assert snap.is_listed("ip", "10.0.0.1")
+    assert not snap.is_listed("DEVICE", "m1")
+    assert not snap.is_listed("MERCHANT", None)
+
+def test_validity_window_is_checked_at_lookup():
+    snap = BlacklistSnapshot()
+    snap._apply_rows([
+        _row(1, "MERCHANT", "future", valid_from=NOW + timedelta(hours=1)),
+        _row(2, "MERCHANT", "expired", valid_to=NOW - timedelta(hours=1)),
+        _row(3, "MERCHANT", "ending", valid_from=NOW - timedelta(days=1), valid_to=NOW + timedelta(hours=1)),
+    ], replace=True)
+    assert not snap.is_listed("MERCHANT", "future")
+    assert snap.is_listed("MERCHANT", "future", at=(NOW + timedelta(hours=2)).timestamp())
+    assert not snap.is_listed("MERCHANT", "expired")
+    assert snap.is_listed("MERCHANT", "ending")
+    assert not snap.is_listed("MERCHANT", "ending", at=(NOW + timedelta(hours=2)).timestamp())
+
+def test_pushed_changes_apply_immediately():
+    snap = BlacklistSnapshot()
+    version = snap.version
+    snap.apply_message({"value": "m1"})
+    assert snap.is_listed("MERCHANT", "m1", at=time.time() + 1)
+    snap.apply("MERCHANT", "m1", active=False)
+    assert not snap.is_listed("MERCHANT", "m1", at=time.time() + 1)
+    assert snap.version == version + 2
+    snap.apply_message({"type": "CARD"})
+    assert snap.version == version + 2
+
+def test_refresh_is_incremental_until_the_full_reload_is_due():
+    store = MemoryDAO(blacklist=[("MERCHANT", "m1")])
+    with store.installed():
+        snap = BlacklistSnapshot(full_refresh_sec=3600)
+        snap.load()
+        assert snap.is_listed("MERCHANT", "m1")
+        store.upsert_blacklist("d9", bl_type="DEVICE")
+        store.upsert_blacklist("m1", is_active="N")
+        snap.refresh()
+        assert snap.is_listed("DEVICE", "d9")
+        assert not snap.is_listed("MERCHANT", "m1", at=time.time() + 1)
+        assert len(snap) == 2
@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from finguard.memory.device_cache import DeviceWriteBehind, KnownDeviceCache
+from finguard.utils import dao
+from finguard.utils.memory_dao import MemoryDAO
+
+class _Writer:
+    def __init__(self):
+        self.queued = []
+
+    def enqueue(self, account_id, device_id, on_dropped=None):
+        self.queued.append((account_id, device_id, on_dropped))
+
+def _no_read(*args):
+    raise AssertionError("unexpected FG_DEVICES_SEEN read")
+
+def _cache(writer=None, **kw):
+    kw.setdefault("max_entries", 100)
+    return KnownDeviceCache(window_days=90, touch_interval_sec=3600, writer=writer or _Writer(), **kw)
+
+def test_only_new_devices_are_written():
+    writer = _Writer()
+    cache = _cache(writer)
+    cache.observe("a1", "d1")
+    cache.observe("a1", "d1")
+    cache.observe("a1", None)
+    assert [(a, d) for a, d, _ in writer.queued] == [("a1", "d1")]
+    assert cache.is_seen("a1", "d1")
+
+def test_dropped_write_is_forgotten_and_written_again():
+    writer = _Writer()
+    cache = _cache(writer)
+    cache.observe("a1", "d1")
+    _, _, on_dropped = writer.queued[0]
+    on_dropped("a1", "d1")
+    cache.observe("a1", "d1")
+    assert len(writer.queued) == 2
+
+def test_miss_reads_the_table_and_caches_the_answer(monkeypatch):
+    store = MemoryDAO()
+    store.upsert_devices_seen([("a1", "d1")])
+    with store.installed():
+        cache = _cache()
+        assert cache.is_seen("a1", "d1")
+        assert not cache.is_seen("a1", "d2")
+        monkeypatch.setattr(dao, "device_last_seen", _no_read)
+        assert cache.is_seen("a1", "d1")
+
+def test_complete_warm_answers_misses_until_it_expires(monkeypatch):
+    store = MemoryDAO()
+    store.upsert_devices_seen([("a1", "d1")])
+    reads = []
+    with store.installed():
+        monkeypatch.setattr(dao, "device_last_seen", lambda a, d: reads.append((a, d)))
+        cache = _cache(complete_ttl_sec=60)
+        cache.warm()
+        assert cache.is_seen("a1", "d1")
+        assert not cache.is_seen("a1", "d2")
+        assert reads == []
+        expired = _cache(complete_ttl_sec=0)
+        expired.warm()
+        assert not expired.is_seen("a1", "d2")
+        assert reads == [("a1", "d2")]
+
+def test_devices_outside_the_window_are_not_seen():
+    cache = _cache()
+    cache.remember("a1", "d1", datetime.now(timezone.utc) - timedelta(days=91))
+    assert not cache.is_seen("a1", "d1")
+
+def test_least_recent_accounts_are_evicted(monkeypatch):
+    monkeypatch.setattr(dao, "device_last_seen", lambda *a: None)
+    cache = _cache(max_entries=2)
+    cache.remember("a1", "d1")
+    cache.remember("a2", "d2")
+    cache.is_seen("a1", "d1")
+    cache.remember("a3", "d3")
+    assert cache.is_seen("a1", "d1")
+    assert not cache.is_seen("a2", "d2")
+
+def test_write_behind_retries_then_reports_drops(monkeypatch):
+    calls = []
+    def _fail(pairs):
+        calls.append(pairs)
+        raise RuntimeError("db down")
+    monkeypatch.setattr(dao, "upsert_devices_seen", _fail)
+    dropped = threading.Event()
+    writer = DeviceWriteBehind(flush_ms=10, attempts=2)
+    writer.enqueue("a1", "d1", on_dropped=lambda a, d: dropped.set())
+    assert dropped.wait(2)
+    assert calls == [[("a1", "d1")], [("a1", "d1")]]
+
+def test_write_behind_coalesces_pairs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dao, "upsert_devices_seen", calls.append)
+    writer = DeviceWriteBehind(flush_ms=50)
+    for _ in range(3):
+        writer.enqueue("a1", "d1")
+    writer.enqueue("a1", "d2")
+    deadline = time.monotonic() + 2
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls[0] == [("a1", "d1"), ("a1", "d2")]
@@ -0,0 +1,87 @@
+import threading
+import time
+from datetime import datetime, timezone
+from finguard import app
+from finguard.config import settings as config
+from finguard.decision import realtime
+from finguard.decision.realtime import InlineDecider
+from finguard.utils.local_bus import LocalBus
+from finguard.utils.memory_dao import MemoryDAO
+
+def _payload(event_id, account_id="a1", amount=120.0):
+    return {"event_id": event_id, "account_id": account_id, "amount": amount, "channel": "UPI",
+            "timestamp": datetime.now(timezone.utc).isoformat(), "device_id": "d1", "merchant_id": "m1"}
+
+def _decider(monkeypatch, budget_ms=2000.0):
+    monkeypatch.setattr(config, "LLM_ENABLED", False)
+    monkeypatch.setattr(config, "RULE_ENGINE_ENABLED", False)
+    bus, writer = LocalBus(), app._new_writer()
+    memory = app._build_memory(bus, writer, checkpoint=False)
+    return InlineDecider(memory, bus, writer, budget_ms, "ALLOW", workers=2), bus, writer
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_decision_within_budget_is_persisted_then_published(monkeypatch):
+    store = MemoryDAO()
+    with store.installed():
+        decider, bus, writer = _decider(monkeypatch)
+        out = decider.decide(_payload("e1"))
+        writer.flush(timeout=5)
+    assert not out.get("degraded")
+    assert out["event_id"] == "e1" and "latency_ms" in out
+    assert store.counts()["transactions"] == 1
+    assert [d["event_id"] for d in bus.records(config.DECISIONS_TOPIC)] == ["e1"]
+    assert decider.decided == 1 and decider.degraded == 0
+
+def test_over_budget_answers_default_then_amends(monkeypatch):
+    store = MemoryDAO()
+    release = threading.Event()
+    full = realtime.decide
+
+    def _slow_block(p, memory):
+        release.wait(5)
+        outcome = full(p, memory)
+        outcome.action = "BLOCK"
+        return outcome
+
+    with store.installed():
+        decider, bus, writer = _decider(monkeypatch, budget_ms=10)
+        monkeypatch.setattr(realtime, "decide", _slow_block)
+        out = decider.decide(_payload("e1"))
+        assert out["degraded"] and out["action"] == "ALLOW"
+        release.set()
+        assert _wait_for(lambda: store.counts()["transactions"] == 1)
+        writer.flush(timeout=5)
+        assert _wait_for(lambda: len(bus.records(config.DECISIONS_TOPIC)) == 2)
+    first, amended = bus.records(config.DECISIONS_TOPIC)
+    assert (first["action"], first["degraded"]) == ("ALLOW", True)
+    assert amended["action"] == "BLOCK" and amended["revision_of"] == first["decision_id"]
+    assert decider.degraded == 1
+
+def test_failed_evaluation_persists_the_degraded_decision(monkeypatch):
+    store = MemoryDAO()
+
+    def _fail(p, memory):
+        raise RuntimeError("rules unavailable")
+
+    with store.installed():
+        decider, bus, writer = _decider(monkeypatch)
+        monkeypatch.setattr(realtime, "decide", _fail)
+        out = decider.decide(_payload("e1"))
+        writer.flush(timeout=5)
+    assert out["degraded"] and "evaluation failed" in out["reasons"][0]
+    assert store.counts()["transactions"] == 1
+    assert [d["event_id"] for d in bus.records(config.DECISIONS_TOPIC)] == ["e1"]
+
+def test_observe_feeds_velocity_and_devices(monkeypatch):
+    with MemoryDAO().installed():
+        decider, _, _ = _decider(monkeypatch)
+        for i in range(3):
+            decider.observe(_payload(f"o{i}"))
+        decider.observe({"event_id": "bad"})
+    assert decider.memory.velocity.stats("ACCOUNT", "a1", 3600)[0] == 3
+    assert decider.memory.devices is None or decider.memory.devices.is_seen("a1", "d1")
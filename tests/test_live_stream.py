@@ -0,0 +1,40 @@
+from finguard.mcp_server.stream import LiveStream
+
+def _publish(live, n):
+    for i in range(n):
+        live.publish("decision", {"event_id": f"e{i}", "action": "ALLOW", "risk_score": i})
+
+def test_read_from_cursor():
+    live = LiveStream(capacity=10)
+    _publish(live, 4)
+    entries, cursor = live.read(1)
+    assert [e[0] for e in entries] == [2, 3, 4]
+    assert cursor == 4
+    assert live.read(cursor) == ([], 4)
+
+def test_read_honours_limit():
+    live = LiveStream(capacity=10)
+    _publish(live, 5)
+    entries, cursor = live.read(0, limit=2)
+    assert [e[0] for e in entries] == [1, 2]
+    assert cursor == 2
+
+def test_read_behind_the_ring_is_dropped():
+    live = LiveStream(capacity=3)
+    _publish(live, 5)
+    assert live.read(0) == (None, 0)
+    entries, cursor = live.read(2)
+    assert [e[0] for e in entries] == [3, 4, 5]
+    assert cursor == 5
+
+def test_resume_from():
+    live = LiveStream(capacity=3)
+    assert live.resume_from(None) == (0, False)
+    _publish(live, 5)
+    assert live.resume_from(None) == (5, False)
+    assert live.resume_from(3) == (3, False)
+    assert live.resume_from(2) == (2, False)
+    # the ring holds 3..5: anything older was missed
+    assert live.resume_from(1) == (2, True)
+    # an id from before a server restart continues live
+    assert live.resume_from(99) == (5, False)
@@ -0,0 +1,105 @@
+import json
+import threading
+from datetime import datetime, timezone
+import pytest
+from finguard.config import settings as config
+from finguard.llm import planner
+from finguard.llm.client import LLMClient, LLMOverloaded, LLMTimeout, ResponseCache, StubProvider, in_gray_zone
+from finguard.utils.schemas import PerceivedEvent, TransactionEvent
+
+def _perceived(amount=100.0):
+    evt = TransactionEvent(event_id="e1", account_id="a1", amount=amount, channel="UPI",
+                           timestamp=datetime(2024, 1, 6, 12, 0, tzinfo=timezone.utc))
+    return PerceivedEvent(event=evt, features={"amount": amount})
+
+def _call(client, key="k1", fallback=None):
+    return client.call_async("adjust", key, "sys", "prompt", json.loads,
+                             fallback or (lambda e: {"fallback": type(e).__name__})).result(timeout=5)
+
+class _Failing:
+    def generate(self, kind, system, prompt, temperature):
+        raise RuntimeError("provider down")
+
+class _Blocking:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate(self, kind, system, prompt, temperature):
+        self.release.wait(5)
+        return "{}"
+
+def _raise(exc):
+    raise ValueError("no fallback")
+
+def test_cache_hit_skips_provider():
+    provider = StubProvider()
+    client = LLMClient(provider, timeout_ms=1000)
+    assert _call(client) == StubProvider.RESPONSES["adjust"]
+    assert _call(client) == StubProvider.RESPONSES["adjust"]
+    assert provider.calls == 1
+    assert client.stats()["cache_hits"] == 1
+
+def test_cache_expires_and_evicts(monkeypatch):
+    cache = ResponseCache(max_entries=1, ttl_sec=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    monkeypatch.setattr("finguard.llm.client.time.monotonic", lambda: 1e12)
+    assert cache.get("b") == (False, None)
+    assert len(cache) == 0
+
+def test_timeout_resolves_to_fallback():
+    client = LLMClient(StubProvider(latency_ms=300), timeout_ms=20)
+    assert _call(client) == {"fallback": LLMTimeout.__name__}
+    assert client.stats()["timeouts"] == 1
+
+def test_provider_error_resolves_to_fallback():
+    client = LLMClient(_Failing(), timeout_ms=1000)
+    assert _call(client) == {"fallback": "RuntimeError"}
+    assert client.stats()["errors"] == 1
+
+def test_rejects_beyond_max_pending():
+    provider = _Blocking()
+    client = LLMClient(provider, timeout_ms=5000, max_concurrency=1, max_pending=1)
+    first = client.call_async("adjust", None, "sys", "prompt", json.loads, lambda e: None)
+    assert _call(client, key=None) == {"fallback": LLMOverloaded.__name__}
+    assert client.stats()["rejected"] == 1
+    provider.release.set()
+    assert first.result(timeout=5) == {}
+
+def test_fallback_that_raises_fails_the_future():
+    client = LLMClient(_Failing(), timeout_ms=1000)
+    with pytest.raises(ValueError):
+        _call(client, fallback=_raise)
+
+def test_gray_zone_bounds(monkeypatch):
+    monkeypatch.setattr(config, "LLM_GRAY_ZONE_ONLY", True)
+    assert in_gray_zone(None)
+    assert in_gray_zone(config.CHALLENGE_THRESHOLD)
+    assert not in_gray_zone(config.BLOCK_THRESHOLD)
+    assert not in_gray_zone(config.CHALLENGE_THRESHOLD - 1)
+    monkeypatch.setattr(config, "LLM_GRAY_ZONE_ONLY", False)
+    assert in_gray_zone(config.BLOCK_THRESHOLD)
+
+def test_plan_deterministic_when_llm_disabled(monkeypatch):
+    monkeypatch.setattr(config, "LLM_ENABLED", False)
+    plan = planner.plan_workflow(_perceived(amount=200000))
+    assert plan["expected_action"] == "CHALLENGE"
+    assert plan["workflow"]
+
+def test_plan_empty_without_remote_client_or_outside_gray_zone(monkeypatch):
+    monkeypatch.setattr(config, "LLM_ENABLED", True)
+    monkeypatch.setattr(config, "LLM_GRAY_ZONE_ONLY", True)
+    monkeypatch.setattr(planner, "get_llm_client", lambda: None)
+    assert planner.plan_workflow(_perceived(amount=200000), config.CHALLENGE_THRESHOLD)["workflow"] == []
+    monkeypatch.setattr(planner, "get_llm_client", lambda: LLMClient(_Failing()))
+    plan = planner.plan_workflow(_perceived(amount=200000), config.BLOCK_THRESHOLD)
+    assert plan["workflow"] == [] and plan["expected_action"] == "ALLOW"
+
+def test_plan_empty_on_llm_error(monkeypatch):
+    monkeypatch.setattr(config, "LLM_ENABLED", True)
+    monkeypatch.setattr(planner, "get_llm_client", lambda: LLMClient(_Failing(), timeout_ms=1000))
+    plan = planner.plan_workflow(_perceived(amount=200000), None)
+    assert plan["workflow"] == [] and plan["expected_action"] == "ALLOW"
+    assert "provider down" in plan["rationale"]
@@ -0,0 +1,73 @@
+from kafka import TopicPartition
+from finguard.utils.kafka_bus import OffsetTracker
+
+TP = TopicPartition("finguard.transactions", 0)
+
+def _track(tracker, *offsets):
+    return [tracker.track(TP, off) for off in offsets]
+
+def test_commits_only_contiguous_completions():
+    tracker = OffsetTracker()
+    _track(tracker, 10, 11, 12)
+    tracker.done(TP, 12)
+    assert tracker.pop_committable() == {}
+    tracker.done(TP, 10)
+    assert tracker.pop_committable() == {TP: 11}
+    tracker.done(TP, 11)
+    assert tracker.pop_committable() == {TP: 13}
+    assert tracker.pop_committable() == {}
+
+def test_in_flight_counts_running_records_only():
+    tracker = OffsetTracker()
+    _track(tracker, 0, 1, 2)
+    tracker.done(TP, 1)
+    tracker.fail(TP, 2)
+    assert tracker.in_flight([TP]) == 1
+    assert not tracker.settled(TP)
+    tracker.done(TP, 0)
+    assert tracker.in_flight([TP]) == 0
+    assert tracker.settled(TP)
+
+def test_failed_record_holds_commit_and_rewinds_to_it():
+    tracker = OffsetTracker()
+    _track(tracker, 0, 1, 2, 3)
+    tracker.done(TP, 0)
+    tracker.fail(TP, 1)
+    tracker.done(TP, 3)
+    tracker.fail(TP, 2)
+    assert tracker.pop_committable() == {TP: 1}
+    assert tracker.rewind(TP) == 1
+    # re-delivered records that already completed run once only
+    assert not tracker.skip(TP, 1)
+    assert not tracker.skip(TP, 2)
+    assert tracker.skip(TP, 3)
+    assert not tracker.skip(TP, 3)
+
+def test_rewind_without_failures():
+    tracker = OffsetTracker()
+    _track(tracker, 0)
+    tracker.done(TP, 0)
+    assert tracker.rewind(TP) is None
+
+def test_forget_drops_partition_state():
+    tracker = OffsetTracker()
+    _track(tracker, 0, 1)
+    tracker.done(TP, 0)
+    tracker.forget([TP])
+    assert tracker.pop_committable() == {}
+    assert tracker.in_flight([TP]) == 0
+
+def test_stragglers_from_before_a_revoke_are_ignored():
+    tracker = OffsetTracker()
+    (old,) = _track(tracker, 5)
+    tracker.forget([TP])
+    # the partition comes back and offset 5 is delivered again while the first run is still going
+    (new,) = _track(tracker, 5)
+    assert new != old
+    assert not tracker.current(TP, old)
+    tracker.done(TP, 5, old)
+    tracker.fail(TP, 5, old)
+    assert tracker.pop_committable() == {}
+    assert tracker.in_flight([TP]) == 1
+    tracker.done(TP, 5, new)
+    assert tracker.pop_committable() == {TP: 6}
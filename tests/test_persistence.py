@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+import pytest
+from finguard.utils import dao
+from finguard.utils.memory_dao import MemoryDAO
+from finguard.utils.persistence import PersistenceWriter, WriteUnit
+from finguard.utils.schemas import Alert, DecisionOutcome, TransactionEvent
+
+NOW = datetime.now(timezone.utc)
+
+def _unit(event_id, hits=0):
+    evt = TransactionEvent(event_id=event_id, account_id="a1", amount=10.0, channel="UPI", timestamp=NOW,
+                           device_id="d1")
+    dec = DecisionOutcome(decision_id=f"dec-{event_id}", event_id=event_id, action="BLOCK", risk_score=90,
+                          created_at=NOW, rule_hits=[{"rule_code": f"R{i}"} for i in range(hits)])
+    alert = Alert(event_id=event_id, severity="HIGH", title="t", description="d")
+    return WriteUnit(events=[evt], devices=[("a1", "d1")], decisions=[dec], alerts=[alert])
+
+def test_unit_size_counts_every_row():
+    assert _unit("e1", hits=3).size() == 1 + 1 + 1 + 3 + 1
+    assert WriteUnit().size() == 0
+
+def test_units_are_coalesced_into_one_commit():
+    store = MemoryDAO()
+    with store.installed():
+        writer = PersistenceWriter(max_records=1000, flush_ms=200)
+        futs = [writer.submit(_unit(f"e{i}")) for i in range(5)]
+        writer.flush(timeout=5)
+        assert all(f.done() and f.exception() is None for f in futs)
+    assert store.counts()["transactions"] == 5
+    assert store.counts()["alerts"] == 5
+    assert writer.commits == 1
+
+def test_a_failing_unit_fails_alone(monkeypatch):
+    store = MemoryDAO()
+    with store.installed():
+        persist = dao.persist_batch
+
+        def _persist(events, *args, **kw):
+            if any(e.event_id == "bad" for e in events):
+                raise RuntimeError("ORA-00001")
+            return persist(events, *args, **kw)
+        monkeypatch.setattr(dao, "persist_batch", _persist)
+        writer = PersistenceWriter(flush_ms=200)
+        good, bad, other = (writer.submit(_unit(e)) for e in ("good", "bad", "other"))
+        writer.flush(timeout=5)
+    assert good.result(0) is None and other.result(0) is None
+    with pytest.raises(RuntimeError):
+        bad.result(0)
+    assert writer.failures == 1
+    assert [t["EVENT_ID"] for t in store.transactions] == ["good", "other"]
+
+def test_dropped_device_sighting_is_reported(monkeypatch):
+    def _down(*args, **kw):
+        raise RuntimeError("down")
+    monkeypatch.setattr(dao, "persist_batch", _down)
+    dropped = []
+    writer = PersistenceWriter(flush_ms=10)
+    writer.enqueue("a1", "d1", on_dropped=lambda a, d: dropped.append((a, d)))
+    writer.flush(timeout=5)
+    assert dropped == [("a1", "d1")]
+
+def test_max_records_bounds_a_commit():
+    store = MemoryDAO()
+    with store.installed():
+        writer = PersistenceWriter(max_records=5, flush_ms=1000)
+        futs = [writer.submit(_unit(f"e{i}")) for i in range(4)]
+        for f in futs:
+            f.result(timeout=5)
+    # 4 records per unit: a commit closes once a second unit takes it to 5 or more
+    assert writer.commits == 2
@@ -0,0 +1,21 @@
+from finguard.orchestrator.executor import plan_levels
+
+def _steps(*tools):
+    return [{"tool": t, "args": {}} for t in tools]
+
+def test_empty_workflow():
+    assert plan_levels([]) == []
+
+def test_reads_share_a_level():
+    assert plan_levels(_steps("recent_events", "device_seen", "merchant_blacklist")) == [[0, 1, 2]]
+
+def test_writes_follow_reads_and_are_coalesced():
+    steps = _steps("recent_events", "device_seen", "persist_decision", "create_alert")
+    assert plan_levels(steps) == [[0, 1], [2, 3]]
+
+def test_read_after_write_waits_for_it():
+    assert plan_levels(_steps("recent_events", "persist_decision", "device_seen")) == [[0], [1], [2]]
+
+def test_publish_follows_every_earlier_step():
+    steps = _steps("recent_events", "merchant_blacklist", "persist_decision", "publish_kafka")
+    assert plan_levels(steps) == [[0, 1], [2], [3]]
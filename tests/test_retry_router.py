@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+import pytest
+from finguard import app
+from finguard.config import settings as config
+from finguard.utils import dao
+from finguard.utils.local_bus import LocalBus
+from finguard.utils.memory_dao import MemoryDAO
+from finguard.utils.retry import RetryRouter, retry_topics
+
+EVENT = {"event_id": "e1", "account_id": "a1"}
+
+def _payload(event_id, amount=120.0):
+    return {"event_id": event_id, "account_id": "a1", "amount": amount, "channel": "UPI",
+            "timestamp": datetime.now(timezone.utc).isoformat(), "device_id": "d1"}
+
+def _memory(monkeypatch, bus):
+    monkeypatch.setattr(config, "LLM_ENABLED", False)
+    monkeypatch.setattr(config, "RULE_ENGINE_ENABLED", False)
+    return app._build_memory(bus, checkpoint=False)
+
+def _last(bus, topic):
+    return bus.records(topic)[-1]
+
+def test_first_failure_goes_to_first_tier():
+    bus = LocalBus()
+    fut = RetryRouter(bus).fail(EVENT, RuntimeError("db down"), {"topic": "t", "partition": 0, "offset": 7})
+    assert fut.get(timeout=1)["topic"] == retry_topics()[0]
+    env = _last(bus, retry_topics()[0])
+    assert env["event"] == EVENT
+    assert env["attempt"] == 1
+    assert env["not_before"] > 0
+    assert env["errors"][0]["error_type"] == "RuntimeError"
+    assert env["errors"][0]["source"]["offset"] == 7
+
+def test_envelope_moves_up_a_tier_then_to_dlq():
+    bus = LocalBus()
+    router = RetryRouter(bus)
+    env = EVENT
+    for tier in retry_topics():
+        router.fail(env, RuntimeError("still down"))
+        env = _last(bus, tier)
+    assert env["attempt"] == len(config.RETRY_DELAYS_SEC)
+    router.fail(env, RuntimeError("still down"))
+    dead = _last(bus, config.DLQ_TOPIC)
+    assert dead["attempt"] == len(config.RETRY_DELAYS_SEC) + 1
+    assert len(dead["errors"]) == dead["attempt"]
+    assert "not_before" not in dead
+    assert "RuntimeError" in dead["traceback"]
+
+def test_permanent_errors_skip_the_tiers():
+    bus = LocalBus()
+    RetryRouter(bus).fail(EVENT, ValueError("bad amount"))
+    assert bus.count(config.DLQ_TOPIC) == 1
+    assert all(bus.count(t) == 0 for t in retry_topics())
+
+def test_dead_goes_to_dlq_regardless_of_tiers():
+    bus = LocalBus()
+    RetryRouter(bus).fail(EVENT, RuntimeError("replay failed"), dead=True)
+    assert _last(bus, config.DLQ_TOPIC)["attempt"] == 1
+
+def test_retry_of_a_partly_persisted_event_succeeds(monkeypatch):
+    store = MemoryDAO()
+    with store.installed():
+        bus = LocalBus()
+        memory = _memory(monkeypatch, bus)
+        insert_decision = dao.insert_decision
+
+        def _down(dec):
+            raise RuntimeError("ORA-03113")
+
+        monkeypatch.setattr("finguard.utils.dao.insert_decision", _down)
+        with pytest.raises(RuntimeError):
+            app.handle_event(_payload("e1"), memory, bus)
+        assert store.counts()["transactions"] == 1 and store.counts()["decisions"] == 0
+        monkeypatch.setattr("finguard.utils.dao.insert_decision", insert_decision)
+        app.handle_event(_payload("e1"), memory, bus)
+    assert store.counts()["transactions"] == 1 and store.counts()["decisions"] == 1
+    assert [d["event_id"] for d in bus.records(config.DECISIONS_TOPIC)] == ["e1"]
+
+def test_batch_routes_failed_events_before_committing(monkeypatch):
+    store = MemoryDAO()
+    with store.installed():
+        bus = LocalBus()
+        memory = _memory(monkeypatch, bus)
+        router = RetryRouter(bus)
+        app.handle_batch([_payload("ok1"), {"event_id": "bad"}], memory, bus, on_failed=router.fail)
+    assert store.counts()["transactions"] == 1
+    assert _last(bus, config.DLQ_TOPIC)["event"] == {"event_id": "bad"}
+
+def test_batch_is_not_committed_when_routing_fails(monkeypatch):
+    def _unroutable(value, exc, source):
+        raise RuntimeError("retry topic unavailable")
+
+    store = MemoryDAO()
+    with store.installed():
+        bus = LocalBus()
+        memory = _memory(monkeypatch, bus)
+        with pytest.raises(RuntimeError):
+            app.handle_batch([_payload("ok1"), {"event_id": "bad"}], memory, bus, on_failed=_unroutable)
+    assert store.counts()["transactions"] == 0 and store.counts()["decisions"] == 0
+    assert bus.count(config.DECISIONS_TOPIC) == 0
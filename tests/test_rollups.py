@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from finguard.mcp_server.rollups import DashboardRollups
+
+T0 = datetime(2024, 1, 6, 12, 0)
+
+def _txn(event_id, minutes=0, channel="UPI"):
+    return {"event_id": event_id, "amount": 10.0, "channel": channel, "timestamp": (T0 + timedelta(minutes=minutes)).isoformat()}
+
+def _seed(monkeypatch, notifications=None, channels=None, buckets=None, latest=None):
+    monkeypatch.setattr("finguard.utils.dao.notification_status_counts", lambda: dict(notifications or {}))
+    monkeypatch.setattr("finguard.utils.dao.channel_counts", lambda: dict(channels or {}))
+    monkeypatch.setattr("finguard.utils.dao.model_score_histogram", lambda: list(buckets or [0] * 10))
+    monkeypatch.setattr("finguard.utils.dao.daily_risk_rollup", lambda days=30: [])
+    monkeypatch.setattr("finguard.utils.dao.latest_transactions", lambda limit, before=None: list(latest or []))
+
+def test_latest_ring_keeps_newest_in_event_order(monkeypatch):
+    _seed(monkeypatch)
+    r = DashboardRollups(latest_size=3)
+    r.seed_latest()
+    for i, m in enumerate([5, 1, 9, 3, 7]):
+        r.observe("transaction", _txn(f"e{i}", m))
+    r.observe("decision", {"event_id": "e2", "action": "BLOCK", "risk_score": 91.0})
+    rows = r.latest(3)
+    assert [row["event_id"] for row in rows] == ["e2", "e4", "e0"]
+    assert rows[0]["status"] == "BLOCK"
+    # older than the ring holds: the caller pages in Oracle
+    assert r.latest(2, before=(T0 + timedelta(minutes=7), "e4")) is None
+
+def test_latest_defers_to_oracle_until_seeded():
+    r = DashboardRollups(latest_size=10)
+    r.observe("transaction", _txn("e1"))
+    assert r.latest(5) is None
+    assert r.latest(1) == [r._latest["e1"]]
+
+def test_counters_follow_events():
+    r = DashboardRollups()
+    r.observe("transaction", _txn("e1", channel="CARD"))
+    r.observe("transaction", _txn("e2", channel="CARD"))
+    r.observe("decision", {"event_id": "e1", "action": "ALLOW", "model_score": 42.0})
+    # an amended revision re-announces the same score
+    r.observe("decision", {"event_id": "e1", "action": "BLOCK", "model_score": 42.0, "revision": 1})
+    r.observe_scores([99.0])
+    snap = r.snapshot()
+    assert snap["channels"] == {"CARD": 2}
+    assert snap["buckets"][4] == 1 and snap["buckets"][9] == 1
+
+def test_notification_status_changes_move_counts():
+    r = DashboardRollups()
+    r.observe("notification", {"notification_id": 1, "status": "sent"})
+    r.observe("notification", {"notification_id": 2, "status": "SENT"})
+    r.observe("notification", {"notification_id": 1, "status": "DELIVERED", "previous_status": "SENT"})
+    r.observe("notification", {"notification_id": 1, "status": "ACKED", "previous_status": "DELIVERED"})
+    assert r.snapshot()["notifications"] == {"SENT": 1, "DELIVERED": 0, "ACKED": 1}
+
+def test_reconcile_replaces_counters_and_records_drift(monkeypatch):
+    r = DashboardRollups()
+    _seed(monkeypatch, notifications={"SENT": 2}, channels={"UPI": 1})
+    r.reconcile()
+    r.observe("transaction", _txn("e1"))
+    r.observe("notification", {"notification_id": 3, "status": "SENT"})
+    _seed(monkeypatch, notifications={"SENT": 2}, channels={"UPI": 1})
+    r.reconcile()
+    snap = r.snapshot()
+    assert snap["drift"] == {"transactions": 1, "scores": 0, "notifications": 1}
+    assert snap["notifications"] == {"SENT": 2} and snap["channels"] == {"UPI": 1}
+
+def test_live_rows_take_created_at_from_first_decision(monkeypatch):
+    seeded = {"event_id": "old", "amount": 1.0, "channel": "UPI", "status": "ALLOW", "risk_score": 3.0,
+              "event_ts": T0 - timedelta(days=1), "created_at": T0 - timedelta(hours=20)}
+    _seed(monkeypatch, latest=[seeded])
+    r = DashboardRollups()
+    r.seed_latest()
+    r.observe("transaction", _txn("e1"))
+    assert r.latest(2)[0]["created_at"] is None
+    r.observe("decision", {"event_id": "e1", "action": "ALLOW", "created_at": (T0 + timedelta(seconds=1)).isoformat()})
+    r.observe("decision", {"event_id": "e1", "action": "BLOCK", "revision": 1, "created_at": (T0 + timedelta(hours=1)).isoformat()})
+    new, old = r.latest(2)
+    assert (new["status"], new["created_at"]) == ("BLOCK", T0 + timedelta(seconds=1))
+    assert (old["event_ts"], old["created_at"]) == (seeded["event_ts"], seeded["created_at"])
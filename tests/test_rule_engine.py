@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from finguard.decision.engine import COMPUTED_FEATURES, Condition, RuleEngine, compile_definition, compile_rule
+from finguard.utils.schemas import PerceivedEvent, TransactionEvent
+
+CATALOG = "documents/FinGuard_Rule_Catalog__tabular_.csv"
+
+def _perceived(channel="UPI", amount=100.0, extra=None, **features):
+    evt = TransactionEvent(event_id="e1", account_id="a1", amount=amount, channel=channel,
+                           timestamp=datetime(2024, 1, 6, 23, 30, tzinfo=timezone.utc), extra=extra or {})
+    return PerceivedEvent(event=evt, features={"amount": amount, **features})
+
+def _row(code, definition, severity="HIGH"):
+    return {"RULE_ID": None, "RULE_CODE": code, "NAME": code, "SEVERITY": severity, "DEFINITION_JSON": definition}
+
+def test_compile_operator_suffixes():
+    conds = compile_definition({"amount_gte": 5000, "mcc_in": ["7995", "4829"], "channel": "UPI"})
+    assert conds == (Condition("amount", "gte", 5000), Condition("mcc", "in", ("7995", "4829")),
+                     Condition("channel", "eq", "UPI"))
+
+def test_compile_velocity_and_time_shapes():
+    conds = compile_definition({"category": "VELOCITY", "scope": "DEVICE", "window_minutes": 30, "txn_count_gt": 5})
+    assert conds == (Condition("velocity_device_30m_count", "gt", 5),)
+    conds = compile_definition({"category": "TIME_OF_DAY", "hour_from": 23, "hour_to": 4, "days": "WEEKEND"})
+    assert conds == (Condition("hour", "hour_between", (23, 4)), Condition("is_weekend", "eq", True))
+
+def test_severity_points_and_score_override():
+    assert compile_rule(1, "R1", "r", "critical", {"amount_gt": 1}).points == 60.0
+    assert compile_rule(2, "R2", "r", "LOW", '{"amount_gt": 1, "score": 7}').points == 7.0
+
+def test_evaluate_scores_hits_and_skips_missing_features():
+    engine = RuleEngine()
+    engine.load_rows([
+        _row("BIG", '{"category": "AMOUNT", "amount_gte": 1000}'),
+        _row("NIGHT_UPI", '{"category": "TIME_OF_DAY", "channel": "UPI", "hour_from": 22, "hour_to": 5}', "MEDIUM"),
+        _row("CARD_ONLY", '{"category": "CHANNEL", "channel": "CARD", "amount_gte": 1}'),
+        _row("KYC", '{"category": "KYC_LIFECYCLE", "account_age_days_lt": 30}'),
+    ])
+    score, reasons, hits = engine.evaluate(_perceived(amount=5000), None)
+    assert score == 35.0 + 20.0
+    assert sorted(h["rule_code"] for h in hits) == ["BIG", "NIGHT_UPI"]
+    assert len(reasons) == 2
+    # a producer that sends the field makes the KYC rule live
+    score, _, hits = engine.evaluate(_perceived(amount=10, extra={"account_age_days": 3}), None)
+    assert sorted(h["rule_code"] for h in hits) == ["KYC", "NIGHT_UPI"]
+
+def test_unchanged_rule_set_is_not_reloaded():
+    engine = RuleEngine()
+    rows = [_row("BIG", '{"amount_gte": 1000}')]
+    assert engine.load_rows(rows)
+    version = engine.version
+    assert not engine.load_rows(rows)
+    assert engine.load_rows(rows + [_row("SMALL", '{"amount_lt": 1}')])
+    assert engine.version != version
+
+def test_rules_without_a_feature_source_are_reported():
+    engine = RuleEngine()
+    engine.load_rows([_row("BIG", '{"amount_gte": 1000}'),
+                      _row("KYC", '{"account_age_days_lt": 30, "amount_gte": 10}')])
+    assert engine.inert == {"KYC": frozenset({"account_age_days"})}
+
+def test_catalog_inert_families():
+    engine = RuleEngine()
+    engine.load_csv(CATALOG)
+    assert len(engine) == 120
+    live = {r.category for r in engine._rules if r.rule_code not in engine.inert}
+    assert {"VELOCITY", "TIME_OF_DAY"} <= live
+    assert all(r.rule_code in engine.inert for r in engine._rules if r.category == "CHANNEL")
+    assert all(r.features <= COMPUTED_FEATURES for r in engine._rules if r.category in ("VELOCITY", "TIME_OF_DAY"))
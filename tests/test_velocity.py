@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+from finguard.memory.velocity import VelocityStore, feature_name
+from finguard.utils.schemas import TransactionEvent
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+def _evt(event_id, account_id="a1", at=NOW, amount=100.0, **kw):
+    return TransactionEvent(event_id=event_id, account_id=account_id, amount=amount, channel="UPI",
+                            timestamp=at, **kw)
+
+def _account(feats, agg="count"):
+    return feats[feature_name("ACCOUNT", 15, agg)]
+
+def test_features_include_the_event_itself():
+    store = VelocityStore()
+    store.record(_evt("e1", at=NOW - timedelta(minutes=5), amount=40))
+    feats = store.features(_evt("e2", amount=60))
+    assert _account(feats) == 2
+    assert _account(feats, "sum") == 100.0
+    # a recorded event is not counted twice
+    store.record(_evt("e2", amount=60))
+    assert _account(store.features(_evt("e2", amount=60))) == 2
+
+def test_duplicate_delivery_counts_once():
+    store = VelocityStore()
+    store.record(_evt("e1"))
+    store.record(_evt("e1"))
+    assert store.stats("ACCOUNT", "a1", 900, now=NOW) == (1, 100.0)
+
+def test_window_boundaries_follow_event_time():
+    store = VelocityStore()
+    store.record(_evt("old", at=NOW - timedelta(minutes=20)))
+    store.record(_evt("new", at=NOW - timedelta(minutes=1)))
+    assert _account(store.features(_evt("e3"))) == 2
+    assert store.stats("ACCOUNT", "a1", 3600, now=NOW)[0] == 2
+
+def test_scopes_are_keyed_independently():
+    store = VelocityStore()
+    store.record(_evt("e1", device_id="d1", merchant_id="m1"))
+    store.record(_evt("e2", account_id="a2", device_id="d1", merchant_id="m2"))
+    feats = store.features(_evt("e3", account_id="a3", device_id="d1", merchant_id="m1"))
+    assert _account(feats) == 1
+    assert feats[feature_name("DEVICE", 30, "count")] == 3
+    assert feats[feature_name("MERCHANT", 120, "count")] == 2
+
+def test_future_dated_event_does_not_expire_other_windows():
+    store = VelocityStore()
+    store.record(_evt("e1"))
+    store.record(_evt("e2", at=NOW - timedelta(minutes=2)))
+    store.record(_evt("skewed", account_id="a2", at=NOW + timedelta(days=3)))
+    assert store.stats("ACCOUNT", "a1", 900, now=NOW) == (2, 200.0)
+    assert _account(store.features(_evt("e3"))) == 3